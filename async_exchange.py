@@ -0,0 +1,165 @@
+"""
+异步 REST 执行层：把同步 ccxt 调用放到有界线程池中执行，避免阻塞事件循环；发出前按交易所限额在本地限速（rate_limit）。
+
+相同的读请求（方法和参数都相同）合并成一次：并发的调用方共用同一个在途请求，完成后 READ_FRESHNESS 秒内
+再来的调用方直接拿这次的结果。任何下单、撤单、改单都会让已有的读结果失效，之后的读请求重新发出。
+共用的结果是同一个对象，调用方不要修改。
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ccxt
+from requests.adapters import HTTPAdapter
+
+import latency
+from metrics import ORDER_REJECTS, READS_SHARED, REST_REQUESTS, registry
+from rate_limit import HIGH_PRIORITY_METHODS, RATE_LIMITS, RateLimiter, retry_after
+
+logger = logging.getLogger()
+
+REST_MAX_WORKERS = 4  # REST 线程池大小（同时在途的请求数上限）
+ORDER_METHODS = {"create_order", "create_orders", "edit_order"}  # 失败时计入下单拒绝
+READ_FRESHNESS = 0.3  # 相同读请求完成后多久内直接复用结果（秒），0 为只合并在途请求
+SHARED_READS = {"fetch_open_orders", "fetch_positions", "fetch_balance", "fetch_position_mode", "fetch_order",
+                "fetch_ticker"}  # 可以合并的读请求
+
+
+class AsyncExchange:
+    """同步 ccxt 实例的异步包装
+
+    用法: ``await rest.fetch_open_orders(symbol)``，任何 ccxt 方法都可以直接 await。
+    选择线程池而不是 ccxt.async_support，是为了保留各脚本里重写了 fetch 的 CustomGate 子类。
+    """
+
+    def __init__(self, exchange, max_workers=REST_MAX_WORKERS, rate_limit=True, read_freshness=READ_FRESHNESS):
+        """rate_limit=True 时对 RATE_LIMITS 里有的交易所做本地限速，代替 ccxt 自带的固定间隔限速；
+        read_freshness 为 None 时不合并读请求"""
+        self.exchange = exchange
+        self.max_workers = max_workers
+        self.limiter = None
+        self.read_freshness = read_freshness
+        self.reads = {}  # (方法, 参数) -> [请求 task, 完成时间]，完成时间为 None 表示在途
+        self.reads_sent = 0  # 实际发出的可合并读请求
+        self.reads_shared = 0  # 共用了别人结果的读请求
+        if max_workers == 0:
+            # 同步模式（回测用）：直接在事件循环里调用，不建线程池，也不限速、不合并读请求（回放时间不是真实时间）
+            self.executor = None
+            self.read_freshness = None
+            return
+        if rate_limit and exchange.id in RATE_LIMITS:
+            self.limiter = RateLimiter(exchange.id)
+            # ccxt 的固定间隔在工作线程里排队，分不出优先级，交给 limiter
+            exchange.enableRateLimit = False
+            registry.register(self.limiter.metric_samples)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rest")
+        # 复用 HTTP 连接：连接池大小与线程数一致，避免每个线程重新握手
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        exchange.session.mount("https://", adapter)
+        exchange.session.mount("http://", adapter)
+
+    async def run(self, func, *args, **kwargs):
+        """在线程池中执行任意同步函数并等待结果"""
+        if self.executor is None:
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def call(self, method, *args, **kwargs):
+        """执行 ccxt 方法：可合并的读请求走 shared_read，下单撤单改单让已有的读结果失效"""
+        if self.read_freshness is not None:
+            if method in SHARED_READS:
+                return await self.shared_read(method, args, kwargs)
+            if method in HIGH_PRIORITY_METHODS:
+                self.reads.clear()
+                try:
+                    return await self.send(method, *args, **kwargs)
+                finally:
+                    self.reads.clear()  # 下单期间发出的读请求可能是下单前的状态
+        return await self.send(method, *args, **kwargs)
+
+    async def shared_read(self, method, args, kwargs):
+        """相同的读请求在途或刚完成时共用结果，否则发出新请求"""
+        key = self.read_key(method, args, kwargs)
+        entry = self.reads.get(key)
+        if entry is not None and (entry[1] is None or time.monotonic() - entry[1] <= self.read_freshness):
+            self.reads_shared += 1
+            READS_SHARED.inc(method)
+            return await asyncio.shield(entry[0])  # 一个调用方被取消不影响其他调用方
+
+        self.prune_reads()
+        task = asyncio.ensure_future(self.send(method, *args, **kwargs))
+        entry = [task, None]
+        self.reads[key] = entry
+        self.reads_sent += 1
+
+        def done(task):
+            if self.reads.get(key) is not entry:
+                return  # 已失效或被更新的请求替换
+            if task.cancelled() or task.exception() is not None:
+                del self.reads[key]  # 失败的结果不复用
+            else:
+                entry[1] = time.monotonic()
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    def read_key(self, method, args, kwargs):
+        """合并读请求用的键：按方法签名绑定参数并补上默认值，位置参数、关键字参数和省略默认值的写法得到同一个键"""
+        try:
+            bound = inspect.signature(getattr(self.exchange, method)).bind(*args, **kwargs)
+        except (TypeError, ValueError):
+            return method, repr(args), repr(kwargs)  # 签名不匹配或拿不到签名，按原样区分，调用时自然报错
+        bound.apply_defaults()
+        return method, repr(tuple(bound.arguments.items()))
+
+    def prune_reads(self):
+        """丢掉超过复用时间的结果"""
+        now = time.monotonic()
+        expired = [key for key, (_, done_at) in self.reads.items()
+                   if done_at is not None and now - done_at > self.read_freshness]
+        for key in expired:
+            del self.reads[key]
+
+    async def send(self, method, *args, **kwargs):
+        """在线程池中执行 ccxt 方法并等待结果，耗时按方法名记入 rest.<方法> 延迟直方图，结果计入调用次数指标
+
+        有 limiter 时先按限额排队，下单撤单优先，延迟直方图不含排队时间。
+        """
+        return await self.run_as(method, getattr(self.exchange, method), *args, **kwargs)
+
+    async def run_as(self, method, func, *args, **kwargs):
+        """像 send 一样执行一个包装了 REST 请求的同步函数（如取 listenKey 后再校验结果），按 method 限速和记指标"""
+        if self.limiter is not None:
+            await self.limiter.acquire(method, args)
+        started = time.perf_counter()
+        try:
+            result = await self.run(func, *args, **kwargs)
+        except Exception as e:
+            reason = type(e).__name__
+            REST_REQUESTS.inc(method, reason)
+            if self.limiter is not None and isinstance(e, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+                # 限速响应头在 ccxt 实例上（工作线程共用，只有 429/418 会带 Retry-After）
+                wait = retry_after(getattr(self.exchange, "last_response_headers", None))
+                self.limiter.on_rate_limited(method, wait, e)
+            # 网络错误和超时时订单状态未知，不算拒绝
+            if method in ORDER_METHODS and isinstance(e, ccxt.ExchangeError):
+                ORDER_REJECTS.inc(method, reason)
+            raise
+        finally:
+            latency.record("rest." + method, time.perf_counter() - started)
+        REST_REQUESTS.inc(method, "ok")
+        return result
+
+    def __getattr__(self, name):
+        # 只代理 ccxt 的方法，属性（如 markets）直接从 self.exchange 读取
+        if not callable(getattr(self.exchange, name)):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    def close(self):
+        """关闭线程池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,422 @@
+"""
+离线回测：用模拟撮合替换交易所，驱动 grid_BN_XRP 里真实的网格策略逻辑回放历史盘口。
+
+运行: python backtest.py ticks.csv [--spacing 0.001 --quantity 3 --threshold 500 --limit 100]
+tick 文件为 CSV，列为 ts(毫秒),bid,ask；只有成交价的 ticker 数据用 ts,price 两列。
+也可以直接传 tick_recorder.py 录制的 .tick 文件（memmap 读取，不解析文本）。
+
+策略只在“有成交”或“定时条件到期”时才可能动作，回放时用 numpy 直接跳到下一个会成交的 tick，
+中间没有动作的 tick 不逐个驱动策略，所以几个月的数据几分钟就能跑完。
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import time
+
+import ccxt
+import numpy as np
+
+import grid_BN_XRP as grid
+from log_setup import setup_logging
+from quantize import MarketSpec
+from tick_recorder import read_ticks
+from ws_events import OrderUpdate
+
+# ==================== 回测配置 ====================
+MAKER_FEE = 0.0002  # 挂单手续费率
+TAKER_FEE = 0.0005  # 吃单手续费率
+FUNDING_RATE = 0.0001  # 每个资金费周期的费率（正数为多头付给空头）
+FUNDING_INTERVAL = 8 * 3600  # 资金费周期（秒）
+THROTTLE = 0.5  # 策略有动作后到下一次执行的间隔（秒），近似下单回执和推流的往返
+PRICE_TICK = 0.0001  # 价格最小变动
+AMOUNT_STEP = 0.1  # 数量最小变动
+MIN_AMOUNT = 0.1  # 最小下单数量
+
+logger = logging.getLogger()
+
+
+def load_ticks(path):
+    """读取 tick CSV 或 tick_recorder 录制的 .tick 文件，返回 (ts 毫秒 int64, bid float64, ask float64)"""
+    if path.endswith(".tick"):
+        ticks = read_ticks(path)
+        return np.asarray(ticks["ts"]), np.asarray(ticks["bid"]), np.asarray(ticks["ask"])
+    data = np.loadtxt(path, delimiter=",", ndmin=2, comments="#")
+    if data.shape[1] == 2:  # ts,price 的成交价数据，买卖价都用成交价
+        return data[:, 0].astype(np.int64), data[:, 1].copy(), data[:, 1].copy()
+    return data[:, 0].astype(np.int64), data[:, 1].copy(), data[:, 2].copy()
+
+
+class SimOrder:
+    __slots__ = ("id", "side", "position_side", "reduce_only", "price", "ticks", "amount", "filled", "ts")
+
+    def __init__(self, order_id, side, position_side, reduce_only, price, ticks, amount, ts):
+        self.id = order_id
+        self.side = side
+        self.position_side = position_side
+        self.reduce_only = reduce_only
+        self.price = price
+        self.ticks = ticks  # 价格的整数 tick，撮合只比较整数
+        self.amount = amount
+        self.filled = 0.0
+        self.ts = ts
+
+
+class SimExchange:
+    """按 ccxt binance 的接口形状模拟 USDC-M 合约双向持仓账户
+
+    限价买单在卖一价 <= 挂单价时按挂单价成交（maker），下单时已可成交的限价单和市价单按对手价成交（taker）。
+    盘口和挂单价格都换成整数 tick 撮合；不在 tick / step 上或低于最小下单量的订单像交易所一样拒单。
+    成交、撤单以 ORDER_TRADE_UPDATE 同样的 OrderUpdate 事件放入 events，由回测循环推给机器人。
+    """
+    id = "binance"
+    has = {"createOrders": True, "cancelOrders": True, "editOrder": True}
+
+    def __init__(self, ts, bid, ask, coin_name, contract_type, maker_fee=MAKER_FEE, taker_fee=TAKER_FEE,
+                 funding_rate=FUNDING_RATE, funding_interval=FUNDING_INTERVAL):
+        self.ts = ts
+        self.bid = bid
+        self.ask = ask
+        self.symbol = f"{coin_name}/{contract_type}:{contract_type}"
+        self.market_id = f"{coin_name}{contract_type}"
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.funding_rate = funding_rate
+        self.funding_interval_ms = int(funding_interval * 1000)
+        self.markets = {self.symbol: {
+            "symbol": self.symbol, "id": self.market_id,
+            "precision": {"price": PRICE_TICK, "amount": AMOUNT_STEP},
+            "limits": {"amount": {"min": MIN_AMOUNT}},
+        }}
+        self.spec = MarketSpec.from_market(self.markets[self.symbol])
+        self.bid_ticks = np.rint(bid / self.spec.tick).astype(np.int64)
+        self.ask_ticks = np.rint(ask / self.spec.tick).astype(np.int64)
+
+        self.i = 0
+        self.ids = itertools.count(1)
+        self.orders = {}  # order_id -> SimOrder
+        self.best_buy = -np.inf  # 挂着的买单最高价（tick）
+        self.best_sell = np.inf  # 挂着的卖单最低价（tick）
+        self.events = []
+        self.version = 0  # 每次下单/撤单/改单/成交加一，用来判断策略本轮有没有动作
+        self.next_funding = (int(ts[0]) // self.funding_interval_ms + 1) * self.funding_interval_ms if len(ts) else 0
+
+        # 账户
+        self.positions = {"long": 0.0, "short": 0.0}
+        self.cash = 0.0
+        self.fees = 0.0
+        self.funding = 0.0
+        self.volume = 0.0
+        self.maker_fills = 0
+        self.taker_fills = 0
+        self.peak_long = 0.0
+        self.peak_short = 0.0
+        self.peak_net = 0.0
+        self.equity_peak = 0.0
+        self.max_drawdown = 0.0
+
+    # ==================== 回放 ====================
+    def now(self):
+        """当前回放时间（秒）"""
+        return self.ts[self.i] / 1000
+
+    def mid(self):
+        return (self.bid[self.i] + self.ask[self.i]) / 2
+
+    def equity(self):
+        return self.cash + (self.positions["long"] - self.positions["short"]) * self.mid()
+
+    def advance(self, i):
+        """走到第 i 个 tick：结算资金费、撮合挂单、更新权益回撤"""
+        self.i = i
+        ts = self.ts[i]
+        while ts >= self.next_funding:
+            # 跳过的区间里没有成交，持仓不变，用当前价格结算
+            payment = (self.positions["long"] - self.positions["short"]) * self.mid() * self.funding_rate
+            self.cash -= payment
+            self.funding += payment
+            self.next_funding += self.funding_interval_ms
+        if self.ask_ticks[i] <= self.best_buy or self.bid_ticks[i] >= self.best_sell:
+            bid, ask = self.bid_ticks[i], self.ask_ticks[i]
+            for order in list(self.orders.values()):
+                if (order.side == "buy" and ask <= order.ticks) or (order.side == "sell" and bid >= order.ticks):
+                    self._fill(order, order.price, True)
+            self._refresh_extremes()
+        equity = self.equity()
+        self.equity_peak = max(self.equity_peak, equity)
+        self.max_drawdown = max(self.max_drawdown, self.equity_peak - equity)
+
+    def next_index(self, i, wake_at):
+        """下一个需要处理的 tick：wake_at（秒）之前第一个会让挂单成交的 tick，否则 wake_at 对应的 tick"""
+        end = int(np.searchsorted(self.ts, int(wake_at * 1000), side="left"))
+        end = min(max(end, i + 1), len(self.ts))
+        if self.orders and end > i + 1:
+            hits = (self.ask_ticks[i + 1:end] <= self.best_buy) | (self.bid_ticks[i + 1:end] >= self.best_sell)
+            if hits.any():
+                return i + 1 + int(hits.argmax())
+        return end
+
+    def _refresh_extremes(self):
+        self.best_buy = max((o.ticks for o in self.orders.values() if o.side == "buy"), default=-np.inf)
+        self.best_sell = min((o.ticks for o in self.orders.values() if o.side == "sell"), default=np.inf)
+
+    def _fill(self, order, price, maker):
+        quantity = order.amount - order.filled
+        side = order.position_side
+        opening = (order.side == "buy") == (side == "long")
+        if not opening:
+            quantity = min(quantity, self.positions[side])  # 只减仓单不能超过持仓
+        self.orders.pop(order.id, None)
+        self.version += 1
+        if quantity <= 0:
+            self._emit(order, "canceled")
+            return
+        self.positions[side] += quantity if opening else -quantity
+        notional = price * quantity
+        fee = notional * (self.maker_fee if maker else self.taker_fee)
+        self.cash += (-notional if order.side == "buy" else notional) - fee
+        self.fees += fee
+        self.volume += notional
+        if maker:
+            self.maker_fills += 1
+        else:
+            self.taker_fills += 1
+        self.peak_long = max(self.peak_long, self.positions["long"])
+        self.peak_short = max(self.peak_short, self.positions["short"])
+        self.peak_net = max(self.peak_net, abs(self.positions["long"] - self.positions["short"]))
+        order.filled += quantity
+        self._emit(order, "filled")
+
+    def _emit(self, order, status):
+        self.events.append(OrderUpdate(self.market_id, order.id, order.side, order.position_side, order.reduce_only,
+                                       status, order.price, order.amount, order.filled, int(self.ts[self.i])))
+
+    def _place(self, order):
+        """挂单；已可成交的按对手价吃单"""
+        if order.side == "buy" and order.ticks >= self.ask_ticks[self.i]:
+            self._fill(order, self.ask[self.i], False)
+        elif order.side == "sell" and order.ticks <= self.bid_ticks[self.i]:
+            self._fill(order, self.bid[self.i], False)
+        else:
+            self.orders[order.id] = order
+            self._refresh_extremes()
+
+    def _check(self, price, amount):
+        """按交易所规则校验价格和数量"""
+        spec = self.spec
+        if price is not None and not spec.on_tick(price):
+            raise ccxt.InvalidOrder(f"price {price} is not a multiple of tick size {spec.tick}")
+        if not spec.on_step(amount) or amount < spec.min_amount:
+            raise ccxt.InvalidOrder(f"amount {amount} violates step {spec.step} / min {spec.min_amount}")
+
+    def _order_info(self, order):
+        return {
+            "id": order.id, "symbol": self.symbol, "side": order.side, "price": order.price,
+            "amount": order.amount, "filled": order.filled, "reduceOnly": order.reduce_only,
+            "timestamp": order.ts, "status": "open" if order.id in self.orders else "closed",
+            "info": {"symbol": self.market_id, "positionSide": order.position_side.upper()},
+        }
+
+    # ==================== ccxt 接口 ====================
+    def load_markets(self, reload=False):
+        return self.markets
+
+    def fetch_markets(self):
+        return list(self.markets.values())
+
+    def uuid22(self):
+        return str(next(self.ids))
+
+    def fapiPrivatePostListenKey(self, params=None):
+        return {"listenKey": "backtest"}
+
+    def fapiPrivatePutListenKey(self, params=None):
+        return {}
+
+    def fetch_position_mode(self, symbol=None, params=None):
+        return {"hedged": True}
+
+    def fetch_positions(self, symbols=None, params=None):
+        return [{"symbol": self.symbol, "side": side, "contracts": size} for side, size in self.positions.items()]
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        return [self._order_info(order) for order in self.orders.values()]
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        reduce_only = bool(params.get("reduce_only") or params.get("reduceOnly"))
+        position_side = params.get("positionSide", "BOTH").lower()
+        self._check(None if type == "market" else price, amount)
+        if type == "market":
+            price = self.ask[self.i] if side == "buy" else self.bid[self.i]
+        order = SimOrder(str(next(self.ids)), side, position_side, reduce_only, price,
+                         self.spec.price_to_ticks(price), amount, int(self.ts[self.i]))
+        self.version += 1
+        if type == "market":
+            self._fill(order, price, False)
+        else:
+            self._place(order)
+        return self._order_info(order)
+
+    def create_orders(self, orders, params=None):
+        return [self.create_order(o["symbol"], o["type"], o["side"], o["amount"], o["price"], o.get("params"))
+                for o in orders]
+
+    def cancel_order(self, id, symbol=None, params=None):
+        order = self.orders.pop(id, None)
+        if order is None:
+            raise ccxt.OrderNotFound(f"{id} Unknown order sent.")
+        self.version += 1
+        self._refresh_extremes()
+        self._emit(order, "canceled")
+        return self._order_info(order)
+
+    def cancel_orders(self, ids, symbol=None, params=None):
+        results = []
+        for order_id in ids:
+            try:
+                results.append(self.cancel_order(order_id, symbol))
+            except ccxt.OrderNotFound:
+                results.append({"id": None, "status": "rejected", "info": {"code": -2011}})
+        return results
+
+    def edit_order(self, id, symbol, type, side, amount=None, price=None, params=None):
+        if id not in self.orders:
+            raise ccxt.OrderNotFound(f"{id} Unknown order sent.")
+        self._check(price, amount if amount is not None else self.orders[id].amount)
+        order = self.orders.pop(id)
+        self.version += 1
+        order.amount = amount if amount is not None else order.amount
+        if price is not None:
+            order.price = price
+            order.ticks = self.spec.price_to_ticks(price)
+        self._refresh_extremes()
+        self._place(order)
+        return self._order_info(order)
+
+
+class ReplayScheduler:
+    """回放时由回测循环决定何时执行策略，推流事件里的触发只计数"""
+
+    def __init__(self):
+        self.requests = 0
+
+    def request(self, reason):
+        self.requests += 1
+
+    def skip(self):
+        pass
+
+
+class Backtest:
+    """把 SimExchange 接到真实的 GridTradingBot 上回放"""
+
+    def __init__(self, ts, bid, ask, coin_name=grid.COIN_NAME, contract_type=grid.CONTRACT_TYPE,
+                 grid_spacing=grid.GRID_SPACING, initial_quantity=grid.INITIAL_QUANTITY, leverage=grid.LEVERAGE,
+                 **sim_options):
+        self.sim = SimExchange(ts, bid, ask, coin_name, contract_type, **sim_options)
+        self.bot = grid.GridTradingBot("", "", coin_name, contract_type, grid_spacing, initial_quantity, leverage,
+                                       exchange=self.sim, rest_workers=0)
+        self.bot.now = self.sim.now
+        self.bot.scheduler = ReplayScheduler()
+        self.processed = 0  # 实际驱动策略的 tick 数
+
+    def next_wakeup(self, now):
+        """没有动作时下一次唤醒：策略自己的定时条件（首单间隔、锁仓冷却），不早于 THROTTLE"""
+        return now + max(self.bot.next_wakeup_delay(), THROTTLE)
+
+    async def deliver_events(self):
+        events, self.sim.events = self.sim.events, []
+        for event in events:
+            await self.bot.handle_order_update(event)
+
+    async def replay(self):
+        sim, bot = self.sim, self.bot
+        n = len(sim.ts)
+        i = 0
+        while i < n:
+            sim.advance(i)
+            await self.deliver_events()
+            bot.best_bid_price = float(sim.bid[i])
+            bot.best_ask_price = float(sim.ask[i])
+            bot.latest_price = (bot.best_bid_price + bot.best_ask_price) / 2
+            version = sim.version
+            await bot.run_strategy()
+            await self.deliver_events()
+            self.processed += 1
+            now = sim.now()
+            # 本轮有动作时按限速走下一个 tick，否则一直跳到下一次成交或定时条件
+            wake_at = now + THROTTLE if sim.version != version else self.next_wakeup(now)
+            i = sim.next_index(i, wake_at)
+
+    def run(self, quiet=True):
+        """执行回放并返回统计结果"""
+        started = time.perf_counter()
+        level = logger.level
+        with contextlib.ExitStack() as stack:
+            if quiet:
+                # 策略里的 print 和 INFO 日志在回放时没有意义，还会拖慢速度
+                stack.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))
+                logger.setLevel(logging.WARNING)
+            try:
+                asyncio.run(self.replay())
+            finally:
+                logger.setLevel(level)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        sim, bot = self.sim, self.bot
+        return {
+            "ticks": len(sim.ts),
+            "processed_ticks": self.processed,
+            "elapsed": round(elapsed, 3),
+            "pnl": sim.equity() if len(sim.ts) else 0.0,
+            "fees": sim.fees,
+            "funding": sim.funding,
+            "volume": sim.volume,
+            "fills": sim.maker_fills + sim.taker_fills,
+            "maker_fills": sim.maker_fills,
+            "taker_fills": sim.taker_fills,
+            "max_drawdown": sim.max_drawdown,
+            "peak_long": sim.peak_long,
+            "peak_short": sim.peak_short,
+            "peak_net": sim.peak_net,
+            "final_long": sim.positions["long"],
+            "final_short": sim.positions["short"],
+            "lock_hits_long": bot.lock_hits["long"],
+            "lock_hits_short": bot.lock_hits["short"],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网格策略离线回测")
+    parser.add_argument("ticks", help="tick CSV: ts,bid,ask 或 ts,price")
+    parser.add_argument("--coin", default=grid.COIN_NAME)
+    parser.add_argument("--contract", default=grid.CONTRACT_TYPE)
+    parser.add_argument("--spacing", type=float, default=grid.GRID_SPACING)
+    parser.add_argument("--quantity", type=float, default=grid.INITIAL_QUANTITY)
+    parser.add_argument("--threshold", type=float, default=grid.POSITION_THRESHOLD)
+    parser.add_argument("--limit", type=float, default=grid.POSITION_LIMIT)
+    parser.add_argument("--first-time", type=float, default=grid.ORDER_FIRST_TIME)
+    parser.add_argument("--maker-fee", type=float, default=MAKER_FEE)
+    parser.add_argument("--taker-fee", type=float, default=TAKER_FEE)
+    parser.add_argument("--funding-rate", type=float, default=FUNDING_RATE)
+    args = parser.parse_args()
+    setup_logging("backtest")
+
+    # 策略阈值是模块级配置，直接覆盖
+    grid.POSITION_THRESHOLD = args.threshold
+    grid.POSITION_LIMIT = args.limit
+    grid.ORDER_FIRST_TIME = args.first_time
+
+    ts, bid, ask = load_ticks(args.ticks)
+    backtest = Backtest(ts, bid, ask, args.coin, args.contract, args.spacing, args.quantity,
+                        maker_fee=args.maker_fee, taker_fee=args.taker_fee, funding_rate=args.funding_rate)
+    for key, value in backtest.run().items():
+        print(f"{key:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
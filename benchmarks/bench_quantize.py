@@ -0,0 +1,68 @@
+"""
+价格/数量量化微基准：旧的 round(x, 小数位) 对比 quantize.MarketSpec 的整数 tick 运算。
+
+除了耗时，还统计旧路径在 tick 不是 10 的整数次幂时产生的无效价格比例。
+
+运行: python benchmarks/bench_quantize.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantize import MarketSpec, tick_digits  # noqa: E402
+
+SPECS = {
+    "tick 0.0001 (XRP)": MarketSpec("XRP/USDC:USDC", 0.0001, 0.1, 0.1, 5.0),
+    "tick 0.0005": MarketSpec("X/USDT:USDT", 0.0005, 1.0, 1.0, 5.0),
+    "tick 0.01 x10 contract": MarketSpec("X/USDT:USDT", 0.01, 1.0, 1.0, 5.0, contract_size=10.0),
+}
+
+
+def legacy_round(price, quantity, price_digits, amount_digits, min_amount):
+    """旧路径：按小数位取整，数量只和最小下单量比较"""
+    return round(price, price_digits), max(round(quantity, amount_digits), min_amount)
+
+
+def main(number=200000):
+    random.seed(7)
+    for name, spec in SPECS.items():
+        prices = [random.uniform(0.4, 0.6) * (1 + random.uniform(-0.01, 0.01)) for _ in range(1000)]
+        quantities = [random.uniform(0.5, 5.0) for _ in range(1000)]
+        # ccxt 给 Binance 的精度是 tickSize 的小数位数，旧路径按它取整
+        price_digits = tick_digits(spec.tick)
+        amount_digits = tick_digits(spec.step)
+        pairs = list(zip(prices, quantities))
+
+        def legacy():
+            for price, quantity in pairs:
+                legacy_round(price, quantity, price_digits, amount_digits, spec.min_amount)
+
+        def quantized():
+            for price, quantity in pairs:
+                price = spec.round_price(price)
+                spec.round_amount(quantity, price)
+
+        def ticks_only():
+            for price, quantity in pairs:
+                spec.price_to_ticks(price)
+                spec.amount_to_steps(quantity)
+
+        invalid = sum(not spec.on_tick(legacy_round(p, q, price_digits, amount_digits, spec.min_amount)[0])
+                      for p, q in pairs)
+        below_notional = sum(
+            spec.notional(*legacy_round(p, q, price_digits, amount_digits, spec.min_amount)) < spec.min_notional
+            for p, q in pairs)
+        loops = number // len(pairs)
+        print(name)
+        for label, fn in (("legacy round()", legacy), ("MarketSpec round", quantized), ("to int ticks", ticks_only)):
+            total = timeit.timeit(fn, number=loops)
+            print(f"  {label:<20} {total / (loops * len(pairs)) * 1e9:8.0f} ns/order")
+        print(f"  legacy off-tick prices      {invalid / len(pairs):6.1%}")
+        print(f"  legacy below min notional   {below_notional / len(pairs):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
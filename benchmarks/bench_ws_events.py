@@ -0,0 +1,56 @@
+"""
+ws 帧解析微基准：旧的“路由解析一次 + handler 再解析一次”对比 decode-once 分发。
+
+运行: python benchmarks/bench_ws_events.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws_events import get_json_loads, orjson, parse_binance, parse_gate, parse_okx  # noqa: E402
+
+FRAMES = {
+    "binance bookTicker": (parse_binance, json.dumps({
+        "e": "bookTicker", "u": 400900217, "E": 1568014460893, "T": 1568014460891, "s": "XRPUSDC",
+        "b": "0.52140", "B": "31021", "a": "0.52150", "A": "40066"})),
+    "okx tickers": (parse_okx, json.dumps({
+        "arg": {"channel": "tickers", "instId": "XRP-USDT-SWAP"},
+        "data": [{"instType": "SWAP", "instId": "XRP-USDT-SWAP", "last": "0.5214", "lastSz": "3",
+                  "askPx": "0.5215", "askSz": "120", "bidPx": "0.5214", "bidSz": "88", "open24h": "0.51",
+                  "high24h": "0.53", "low24h": "0.50", "volCcy24h": "1000", "vol24h": "10", "sodUtc0": "0.51",
+                  "sodUtc8": "0.51", "ts": "1597026383085"}]})),
+    "gate book_ticker": (parse_gate, json.dumps({
+        "time": 1615366379, "time_ms": 1615366379123, "channel": "futures.book_ticker", "event": "update",
+        "result": {"t": 1615366379123, "u": 2517661076, "s": "X_USDT", "b": "0.52140", "B": 37,
+                   "a": "0.52150", "A": 47061}})),
+}
+
+
+def legacy_binance(message):
+    """旧路径：连接循环解析一次用于路由，handler 再解析一次"""
+    data = json.loads(message)
+    if data.get("e") == "bookTicker":
+        data = json.loads(message)
+        return float(data.get("b")), float(data.get("a"))
+
+
+def main(number=200000):
+    for name, (parser, frame) in FRAMES.items():
+        results = {}
+        if parser is parse_binance:
+            results["legacy 2x json"] = timeit.timeit(lambda: legacy_binance(frame), number=number)
+        for backend in ("json", "orjson"):
+            if backend == "orjson" and orjson is None:
+                continue
+            loads = get_json_loads(backend)
+            results[f"decode-once {backend}"] = timeit.timeit(lambda: parser(loads(frame)), number=number)
+        print(name)
+        for label, total in results.items():
+            print(f"  {label:<20} {total / number * 1e9:8.0f} ns/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+交易所适配层：Binance / OKX / Gate 的差异（交易对格式、下单参数、持仓和挂单快照、账户检查、推流连接与订阅）
+都收在这里，grid_core.GridCore 只面对统一的事件类型（ws_events）和异步 REST 接口（AsyncExchange）。
+
+一个适配器对应一个交易对；多个交易对可以共用同一个 ccxt 实例和 AsyncExchange，推流连接由其中一个适配器
+按交易对列表一次订阅（见 multi_grid.py）。
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+
+import ccxt
+import websockets
+
+import latency
+from async_exchange import REST_MAX_WORKERS, AsyncExchange
+from market_cache import load_markets
+from quantize import market_spec
+from user_stream import UserStreamManager
+from ws_events import (binance_order_from_ccxt, gate_order_from_ccxt, okx_order_from_ccxt, parse_binance, parse_gate,
+                       parse_okx)
+from ws_supervisor import ConnectionWatchdog, MarketLink, StreamStats
+
+logger = logging.getLogger()
+
+
+def _add_position(sizes, symbol, side, size):
+    if side in ('long', 'short'):
+        sizes.setdefault(symbol, {'long': 0, 'short': 0})[side] = abs(size or 0)
+
+
+class ExchangeAdapter:
+    """适配器基类，子类按交易所实现下单参数、快照和推流"""
+    parser = None  # ws 消息解析函数
+    price_from_ticker = False  # True 时策略由成交价 ticker 驱动，book ticker 只更新买卖价
+    heartbeat = None  # 返回应用层心跳消息的方法，None 表示只靠协议层 ping
+    heartbeat_reply = None  # 应用层心跳的回复（不是 JSON，不交给解析函数）
+    STANDBY_URLS = []  # 热备行情连接轮流使用的地址
+
+    def __init__(self, exchange, coin_name, contract_type, rest=None, rest_workers=REST_MAX_WORKERS, standby_links=0):
+        """standby_links 为额外的热备行情连接数，>0 时行情先到先用，重复的丢弃"""
+        self.exchange = exchange
+        self.rest = rest or AsyncExchange(exchange, rest_workers)  # REST 调用放到线程池执行，不阻塞事件循环
+        self.coin_name = coin_name
+        self.contract_type = contract_type
+        self.ccxt_symbol = None  # 下单用的交易对
+        self.ws_symbol = None  # 推送事件里的交易对
+        self.websocket = None  # 当前推流连接
+        self.on_gap = None  # 连接没断但可能漏了私有事件时调用的对账协程函数，由 StreamSupervisor 设置
+        self.live = asyncio.Event()  # 当前连接已收到消息
+        self.stream_stats = StreamStats()  # 心跳、假死断开、重连统计
+        self.standby_links = [MarketLink(self.STANDBY_URLS[i % len(self.STANDBY_URLS)])
+                              for i in range(standby_links)]
+
+    # ==================== 市场与账户 ====================
+    def market(self):
+        return self.exchange.load_markets()[self.ccxt_symbol]
+
+    def market_spec(self):
+        """交易对的下单规格（tick、step、最小下单量、最小名义价值、合约乘数），用已加载的市场数据，不重复请求"""
+        return market_spec(self.exchange, self.market())
+
+    def check_account(self):
+        """启动时的账户级检查（持仓模式等），不满足时抛出异常"""
+
+    # ==================== REST ====================
+    def order_params(self, is_reduce_only, position_side):
+        raise NotImplementedError
+
+    def order_from_ccxt(self, order):
+        raise NotImplementedError
+
+    async def position_sizes(self):
+        """账户全部持仓: {ccxt_symbol: {'long': 数量, 'short': 数量}}，没有持仓的交易对不出现"""
+        raise NotImplementedError
+
+    async def open_orders(self):
+        """当前交易对的挂单，转换成 OrderUpdate"""
+        orders = await self.rest.fetch_open_orders(symbol=self.ccxt_symbol)
+        return [self.order_from_ccxt(order) for order in orders]
+
+    # ==================== 推流 ====================
+    async def stream(self, dispatcher, ws_symbols):
+        """建立推流连接、订阅 ws_symbols 并持续分发，连接断开时抛出异常，由调用方重连"""
+        raise NotImplementedError
+
+    async def public_stream(self, dispatcher, ws_symbols, link):
+        """热备行情连接：连到 link.url 只订阅公共行情频道"""
+        raise NotImplementedError
+
+    def background_tasks(self):
+        """需要和推流一起运行的后台协程"""
+        return []
+
+    def health(self):
+        """交易所特有的推流健康指标，合并进 stream_stats"""
+        return {}
+
+    async def pump(self, websocket, dispatcher, link=None):
+        """持续读取并分发消息，同时由 watchdog 发心跳、检查假死；link 为公共行情连接，默认是主连接"""
+        link = link or self
+        link.websocket = websocket
+        watchdog = ConnectionWatchdog(websocket, link.stream_stats, self.heartbeat)
+        watch = asyncio.create_task(watchdog.run())
+        try:
+            while True:
+                message = await websocket.recv()
+                received = time.perf_counter()
+                watchdog.touch()
+                link.live.set()
+                if message == self.heartbeat_reply:
+                    continue
+                try:
+                    await dispatcher.dispatch(message)
+                except Exception as e:
+                    logger.error(f"WebSocket 消息处理失败: {e}")
+                latency.record("frame", time.perf_counter() - received)  # 收到到处理完（解析和全部处理函数）
+        finally:
+            watch.cancel()
+            link.websocket = None
+
+
+# ==================== Binance ====================
+class BinanceClient(ccxt.binance):
+    def fetch(self, url, method='GET', headers=None, body=None):
+        if headers is None:
+            headers = {}
+        return super().fetch(url, method, headers, body)
+
+
+class BinanceAdapter(ExchangeAdapter):
+    """Binance U 本位/USDC 合约，双向持仓"""
+    parser = staticmethod(parse_binance)
+    STREAM_URL = "wss://fstream.binance.com/stream?streams="  # 组合流 URL
+    STANDBY_URLS = ["wss://fstream.binance.com/stream?streams="]
+
+    def __init__(self, exchange, coin_name, contract_type, rest=None, rest_workers=REST_MAX_WORKERS, standby_links=0):
+        super().__init__(exchange, coin_name, contract_type, rest, rest_workers, standby_links)
+        self.ccxt_symbol = f"{coin_name}/{contract_type}:{contract_type}"
+        self.ws_symbol = f"{coin_name}{contract_type}"
+        self.user_stream = UserStreamManager(self)  # listenKey 续期、过期和更换
+        self.parser = self.parse
+
+    @staticmethod
+    def create_exchange(api_key, api_secret):
+        exchange = BinanceClient({
+            "apiKey": api_key,
+            "secret": api_secret,
+            "options": {
+                "defaultType": "future",  # 使用永续合约
+            },
+        })
+        # 加载市场数据（优先用磁盘缓存）
+        load_markets(exchange)
+        return exchange
+
+    def check_account(self):
+        """检查并启用双向持仓模式，如果切换失败则停止程序"""
+        position_mode = self.exchange.fetch_position_mode(symbol=self.ccxt_symbol)
+        if position_mode['hedged']:
+            logger.info("当前已是双向持仓模式，程序继续运行。")
+            return
+        logger.info("当前不是双向持仓模式，尝试自动启用双向持仓模式...")
+        response = self.exchange.fapiPrivatePostPositionSideDual({'dualSidePosition': 'true'})
+        logger.info(f"启用双向持仓模式: {response}")
+        if not self.exchange.fetch_position_mode(symbol=self.ccxt_symbol)['hedged']:
+            logger.error("启用双向持仓模式失败，请手动启用双向持仓模式后再运行程序。")
+            raise Exception("启用双向持仓模式失败，请手动启用双向持仓模式后再运行程序。")
+        logger.info("双向持仓模式已成功启用，程序继续运行。")
+
+    def order_params(self, is_reduce_only, position_side):
+        params = {
+            # 同一批次内 clientOrderId 不能重复，保留渠道前缀加随机后缀
+            'newClientOrderId': 'x-TBzTen1X' + self.exchange.uuid22(),
+            'reduce_only': is_reduce_only,
+        }
+        if position_side is not None:
+            params['positionSide'] = position_side.upper()  # Binance 要求大写：LONG 或 SHORT
+        return params
+
+    def order_from_ccxt(self, order):
+        return binance_order_from_ccxt(order)
+
+    async def position_sizes(self):
+        positions = await self.rest.fetch_positions(params={'type': 'future'})
+        sizes = {}
+        for position in positions:
+            _add_position(sizes, position['symbol'], position.get('side'), position.get('contracts', 0))
+        return sizes
+
+    def parse(self, data):
+        """组合流里用户数据帧的 stream 字段是 listenKey，交给 user_stream 记录私有事件时间、处理过期"""
+        if data.get("stream") == self.user_stream.listen_key:
+            self.user_stream.on_frame(data["data"])
+        return parse_binance(data)
+
+    def background_tasks(self):
+        return [self.user_stream.keepalive_loop()]
+
+    def health(self):
+        return {"user_stream": self.user_stream.stats()}
+
+    async def stream(self, dispatcher, ws_symbols):
+        """一条组合流同时订阅所有交易对的 bookTicker 和用户数据"""
+        listen_key = await self.user_stream.current_key()
+        streams = [f"{symbol.lower()}@bookTicker" for symbol in ws_symbols] + [listen_key]
+        async with websockets.connect(self.STREAM_URL + "/".join(streams)) as websocket:
+            logger.info(f"已订阅组合流: {streams[:-1]} + 用户数据")
+            await self.pump(websocket, dispatcher)
+
+    async def public_stream(self, dispatcher, ws_symbols, link):
+        streams = [f"{symbol.lower()}@bookTicker" for symbol in ws_symbols]
+        async with websockets.connect(link.url + "/".join(streams)) as websocket:
+            logger.info(f"热备行情已订阅: {streams}")
+            await self.pump(websocket, dispatcher, link)
+
+
+# ==================== OKX ====================
+class OkxClient(ccxt.okx):
+    def fetch(self, url, method='GET', headers=None, body=None):
+        if headers is None:
+            headers = {}
+        return super().fetch(url, method, headers, body)
+
+
+class OkxAdapter(ExchangeAdapter):
+    """OKX 永续合约，双向持仓、全仓"""
+    parser = staticmethod(parse_okx)
+    PUBLIC_URL = "wss://ws.okx.com:8443/ws/v5/public"  # 公共频道 URL
+    PRIVATE_URL = "wss://ws.okx.com:8443/ws/v5/private"  # 私有频道 URL
+    STANDBY_URLS = ["wss://wsaws.okx.com:8443/ws/v5/public", "wss://ws.okx.com:8443/ws/v5/public"]
+    LOGIN_TIMEOUT = 10  # 等待登录回执的超时（秒）
+    heartbeat_reply = "pong"
+
+    def __init__(self, exchange, coin_name, contract_type, rest=None, rest_workers=REST_MAX_WORKERS, standby_links=0):
+        super().__init__(exchange, coin_name, contract_type, rest, rest_workers, standby_links)
+        # OKX 的合约 instId 同时用于下单和推送
+        self.ccxt_symbol = f"{coin_name}-{contract_type}-SWAP"
+        self.ws_symbol = self.ccxt_symbol
+        # 主连接里的公共连接单独一个 link：adapter.live / websocket 只跟私有连接，登录订阅完成才算连上并触发对账；
+        # 统计和私有连接记在一起
+        self.public_link = MarketLink(self.PUBLIC_URL, self.stream_stats)
+
+    @staticmethod
+    def create_exchange(api_key, api_secret, passphrase):
+        exchange = OkxClient({
+            "apiKey": api_key,
+            "secret": api_secret,
+            "password": passphrase,  # Passphrase
+        })
+        # 加载市场数据（优先用磁盘缓存）
+        load_markets(exchange)
+        return exchange
+
+    def market(self):
+        """ccxt_symbol 是 instId，按市场 id 查找"""
+        self.exchange.load_markets()
+        try:
+            return self.exchange.market(self.ccxt_symbol)
+        except ccxt.BadSymbol:
+            raise ValueError(f"未找到交易对 {self.ccxt_symbol} 的市场数据，请检查合约名称")
+
+    def check_account(self):
+        """检查并启用双向持仓模式，如果切换失败则停止程序"""
+        position_mode = self.exchange.fetch_position_mode(symbol=self.ccxt_symbol)
+        if position_mode['hedged']:
+            logger.info("当前已是双向持仓模式，程序继续运行。")
+            return
+        logger.info("当前不是双向持仓模式，尝试自动启用双向持仓模式...")
+        response = self.exchange.set_position_mode(hedged=True)
+        logger.info(f"启用双向持仓模式: {response}")
+        if not self.exchange.fetch_position_mode(symbol=self.ccxt_symbol)['hedged']:
+            logger.error("启用双向持仓模式失败，请手动启用双向持仓模式后再运行程序。")
+            raise Exception("启用双向持仓模式失败，请手动启用双向持仓模式后再运行程序。")
+        logger.info("双向持仓模式已成功启用，程序继续运行。")
+
+    def order_params(self, is_reduce_only, position_side):
+        return {
+            'tdMode': 'cross',  # 全仓模式
+            'reduceOnly': is_reduce_only,
+            'tag': 'f1ee03b510d5SUDE',
+            'posSide': position_side,
+        }
+
+    def order_from_ccxt(self, order):
+        return okx_order_from_ccxt(order)
+
+    async def position_sizes(self):
+        positions = await self.rest.fetch_positions(params={'instType': 'SWAP'})
+        sizes = {}
+        for position in positions:
+            info = position.get('info', {})
+            # 用 info 里的原始 instId / posSide / pos 字段，空仓记录的 pos 为 0
+            _add_position(sizes, info.get('instId'), info.get('posSide', '').lower(), float(info.get('pos') or 0))
+        return sizes
+
+    def generate_signature(self, timestamp):
+        message = timestamp + "GET" + "/users/self/verify"  # 拼接字符串
+        signature = hmac.new(self.exchange.secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).digest()
+        return base64.b64encode(signature).decode("utf-8")  # Base64编码
+
+    async def login_websocket(self, websocket):
+        timestamp = str(int(time.time()))
+        await websocket.send(json.dumps({
+            "op": "login",
+            "args": [{
+                "apiKey": self.exchange.apiKey,
+                "passphrase": self.exchange.password,
+                "timestamp": timestamp,
+                "sign": self.generate_signature(timestamp),
+            }]
+        }))
+        response = await asyncio.wait_for(websocket.recv(), self.LOGIN_TIMEOUT)
+        logger.info(f"登录响应: {response}")
+        if json.loads(response).get("code") != "0":
+            raise ConnectionError(f"OKX 登录失败: {response}")
+
+    def heartbeat(self):
+        return "ping"
+
+    async def public_stream(self, dispatcher, ws_symbols, link):
+        async with websockets.connect(link.url) as websocket:
+            payload = {"op": "subscribe", "args": [{"channel": "tickers", "instId": symbol} for symbol in ws_symbols]}
+            await websocket.send(json.dumps(payload))
+            logger.info(f"已发送 ticker 订阅请求: {payload}")
+            await self.pump(websocket, dispatcher, link)
+
+    async def private_stream(self, dispatcher, ws_symbols):
+        async with websockets.connect(self.PRIVATE_URL) as websocket:
+            # 先登录，再订阅私有频道
+            await self.login_websocket(websocket)
+            args = [{"channel": "positions", "instType": "SWAP"}]
+            args += [{"channel": "orders", "instType": "SWAP", "instId": symbol} for symbol in ws_symbols]
+            await websocket.send(json.dumps({"op": "subscribe", "args": args}))
+            logger.info(f"已订阅持仓和订单数据: {ws_symbols}")
+            await self.pump(websocket, dispatcher)
+
+    async def stream(self, dispatcher, ws_symbols):
+        """公共、私有两条连接，任一断开时两条一起重连；私有连接收到登录订阅后的消息才算连接恢复"""
+        self.public_link.live.clear()
+        tasks = [asyncio.create_task(self.public_stream(dispatcher, ws_symbols, self.public_link)),
+                 asyncio.create_task(self.private_stream(dispatcher, ws_symbols))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+# ==================== Gate ====================
+class GateClient(ccxt.gate):
+    def fetch(self, url, method='GET', headers=None, body=None):
+        if headers is None:
+            headers = {}
+        headers['X-Gate-Channel-Id'] = 'laohuoji'
+        headers['Accept'] = 'application/json'
+        headers['Content-Type'] = 'application/json'
+        return super().fetch(url, method, headers, body)
+
+
+class GateAdapter(ExchangeAdapter):
+    """Gate USDT 永续合约，双仓模式下方向由 reduce_only 决定"""
+    parser = staticmethod(parse_gate)
+    price_from_ticker = True
+    STREAM_URL = "wss://fx-ws.gateio.ws/v4/ws/usdt"  # WebSocket URL
+    STANDBY_URLS = ["wss://fx-ws.gateio.ws/v4/ws/usdt"]
+
+    def __init__(self, exchange, coin_name, contract_type="USDT", rest=None, rest_workers=REST_MAX_WORKERS,
+                 standby_links=0):
+        super().__init__(exchange, coin_name, contract_type, rest, rest_workers, standby_links)
+        self.ccxt_symbol = f"{coin_name}/USDT:USDT"  # CCXT 格式的交易对
+        self.ws_symbol = f"{coin_name}_USDT"  # WebSocket 格式的交易对
+
+    @staticmethod
+    def create_exchange(api_key, api_secret):
+        exchange = GateClient({
+            "apiKey": api_key,
+            "secret": api_secret,
+            "options": {
+                "defaultType": "future",  # 使用永续合约
+            },
+        })
+        # 加载市场数据（优先用磁盘缓存）
+        load_markets(exchange)
+        return exchange
+
+    def order_params(self, is_reduce_only, position_side):
+        return {
+            'reduce_only': is_reduce_only,
+        }
+
+    def order_from_ccxt(self, order):
+        return gate_order_from_ccxt(order)
+
+    async def position_sizes(self):
+        positions = await self.rest.fetch_positions(params={'settle': 'usdt', 'type': 'swap'})
+        sizes = {}
+        for position in positions:
+            _add_position(sizes, position['symbol'], position.get('side'), position.get('contracts', 0))
+        return sizes
+
+    def _generate_sign(self, message):
+        """生成 HMAC-SHA512 签名"""
+        return hmac.new(self.exchange.secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha512).hexdigest()
+
+    def subscribe_message(self, channel, payload):
+        current_time = int(time.time())
+        message = f"channel={channel}&event=subscribe&time={current_time}"
+        return {
+            "time": current_time,
+            "channel": channel,
+            "event": "subscribe",
+            "payload": payload,
+            "auth": {
+                "method": "api_key",
+                "KEY": self.exchange.apiKey,
+                "SIGN": self._generate_sign(message),
+            },
+        }
+
+    def heartbeat(self):
+        return json.dumps({"time": int(time.time()), "channel": "futures.ping"})
+
+    async def stream(self, dispatcher, ws_symbols):
+        """一条连接订阅成交价、最优价、持仓、挂单和余额，每个频道一条消息带上全部交易对"""
+        async with websockets.connect(self.STREAM_URL) as websocket:
+            for channel in ("futures.tickers", "futures.positions", "futures.orders", "futures.book_ticker"):
+                await websocket.send(json.dumps(self.subscribe_message(channel, list(ws_symbols))))
+            await websocket.send(json.dumps(self.subscribe_message("futures.balances", ["USDT"])))
+            logger.info(f"已发送订阅请求: {ws_symbols}")
+            await self.pump(websocket, dispatcher)
+
+    async def public_stream(self, dispatcher, ws_symbols, link):
+        async with websockets.connect(link.url) as websocket:
+            for channel in ("futures.tickers", "futures.book_ticker"):
+                await websocket.send(json.dumps({"time": int(time.time()), "channel": channel, "event": "subscribe",
+                                                 "payload": list(ws_symbols)}))
+            logger.info(f"热备行情已订阅: {ws_symbols}")
+            await self.pump(websocket, dispatcher, link)
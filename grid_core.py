@@ -0,0 +1,803 @@
+"""
+网格策略核心：三个交易所脚本共用的 GridTradingBot 逻辑。
+
+交易所差异由 exchange_adapters 里的适配器提供（下单参数、快照、推流），状态由 state_engine.GridState 维护，
+下单/撤单走 order_batch.OrderBatcher。缓存、批量、解析之类的优化在这里和公共模块里改一次即对所有交易所生效。
+"""
+import asyncio
+import logging
+import time
+
+import ccxt
+
+import latency
+import metrics
+from grid_ladder import GridLadder
+from loop_watchdog import LoopWatchdog
+from open_orders import new_order
+from order_batch import OrderBatcher, pair_orders
+from snapshot import GRID_FIELDS, SNAPSHOT_INTERVAL, STRATEGY_FIELDS, SnapshotStore, order_from_row, order_to_row
+from state_engine import GridState
+from strategy_scheduler import STRATEGY_MAX_IDLE, CoalescingScheduler
+from ws_events import BalanceUpdate, BookTicker, EventDispatcher, MarketDataDedup, OrderUpdate, PositionUpdate, Ticker
+from ws_supervisor import StreamSupervisor
+
+logger = logging.getLogger()
+
+ACK_TRACK_LIMIT = 256  # 等待推送回执的订单最多记录数
+
+
+class GridCore:
+    """双向网格策略，交易所相关的部分都交给 adapter"""
+
+    def __init__(self, adapter, grid_spacing, initial_quantity, leverage, position_threshold, position_limit,
+                 order_first_time, sync_time, order_sync_time, amend_orders=True, order_cooldown_time=0,
+                 check_account=True, metrics_port=0, loop_watchdog=False):
+        """check_account=False 时跳过账户级检查（多交易对共用账户时只需检查一次）；metrics_port 非 0 时在本机该端口提供指标；
+        loop_watchdog=True 时监控事件循环阻塞并定期输出阻塞调用点排行"""
+        self.adapter = adapter
+        self.exchange = adapter.exchange
+        self.rest = adapter.rest
+        self.coin_name = adapter.coin_name
+        self.contract_type = adapter.contract_type
+        self.ccxt_symbol = adapter.ccxt_symbol
+        self.ws_symbol = adapter.ws_symbol
+        self.grid_spacing = grid_spacing
+        self.initial_quantity = initial_quantity
+        self.leverage = leverage
+        # 策略参数
+        self.position_threshold = position_threshold  # 锁仓阈值
+        self.position_limit = position_limit  # 持仓数量阈值
+        self.order_first_time = order_first_time  # 首单间隔时间
+        self.order_cooldown_time = order_cooldown_time  # 锁仓后的反向挂单冷却时间（秒），0 为不限制
+        self.sync_time = sync_time  # 持仓对账间隔（秒）
+        self.order_sync_time = order_sync_time  # 挂单对账间隔（秒）
+        self.amend_orders = amend_orders  # 网格刷新时优先原地改单
+        self.metrics_port = metrics_port
+        self.loop_watchdog = LoopWatchdog() if loop_watchdog else None
+        self.now = time.time  # 时钟，回测时替换为回放时间
+        self.batcher = OrderBatcher(self.rest)  # 批量下单/撤单
+
+        # tick、step、最小下单数量、最小名义价值、合约乘数，价格和数量都按它对齐
+        self.spec = adapter.market_spec()
+        logger.info(
+            f"最小价格变动: {self.spec.tick}, 数量步长: {self.spec.step}, 最小下单数量: {self.spec.min_amount}, "
+            f"最小名义价值: {self.spec.min_notional}, 合约乘数: {self.spec.contract_size}")
+
+        self.long_initial_quantity = 0  # 多头下单数量
+        self.short_initial_quantity = 0  # 空头下单数量
+        self.last_long_order_time = 0  # 上次多头挂单时间
+        self.last_short_order_time = 0  # 上次空头挂单时间
+        self.latest_price = 0  # 最新价格
+        self.last_price_at = None  # 最近一次行情的时间（monotonic）
+        self.last_private_at = None  # 最近一次私有事件（订单、持仓、余额）的时间（monotonic）
+        self.best_bid_price = None  # 最佳买价
+        self.best_ask_price = None  # 最佳卖价
+        self.balance = {}  # 用于存储合约账户余额
+        self.mid_price_long = 0  # long 中间价
+        self.lower_price_long = 0  # long 网格上
+        self.upper_price_long = 0  # long 网格下
+        self.mid_price_short = 0  # short 中间价
+        self.lower_price_short = 0  # short 网格上
+        self.upper_price_short = 0  # short 网格下
+        self.ladder = None  # 网格价格阶梯，收到第一个价格时以它为第 0 档建立
+        self.price_level = None  # 最新价所在的网格档位
+        self.regime = None  # 持仓所处的阈值区间，变化时触发策略
+        # 策略只在有变化时执行，执行期间的触发合并成一轮
+        self.scheduler = CoalescingScheduler(self.run_strategy, self.next_wakeup_delay)
+        self.lock_hits = {'long': 0, 'short': 0}  # 进入装死分支的次数
+        self.state = GridState()  # 持仓和挂单状态，由推流事件驱动
+        self.snapshots = None  # 状态快照存储，prepare() 时打开（多交易对时由管理器注入共用的）
+        # 下单到订单推送回执的延迟：REST 先返回时按订单号记下发出时间，推送先到时记下到达时间
+        self.ack_pending = {}  # 订单号 -> 下单请求发出时间（perf_counter）
+        self.ack_early = {}  # 订单号 -> REST 返回前就收到推送的时间
+        # ws 帧只解析一次，按事件类型分发
+        self.dispatcher = EventDispatcher(adapter.parser)
+        self.dispatcher.on(BookTicker, self.handle_book_ticker_update)
+        self.dispatcher.on(Ticker, self.handle_ticker_update)
+        self.dispatcher.on(OrderUpdate, self.handle_order_update)
+        self.dispatcher.on(PositionUpdate, self.handle_position_update)
+        self.dispatcher.on(BalanceUpdate, self.handle_balance_update)
+        self.dedup = None  # 有热备行情连接时，同一条行情只用最先到达的
+        if adapter.standby_links:
+            self.dedup = MarketDataDedup()
+            self.dispatcher.filter = self.dedup.accept
+
+        # 检查持仓模式等账户设置，不满足则停止程序
+        if check_account:
+            adapter.check_account()
+
+    # ==================== 状态 ====================
+    # 持仓和挂单数量都从状态引擎读取，只由推流事件和对账修改
+    @property
+    def long_position(self):
+        """多头持仓"""
+        return self.state.positions['long']
+
+    @property
+    def short_position(self):
+        """空头持仓"""
+        return self.state.positions['short']
+
+    @property
+    def buy_long_orders(self):
+        """多头买入剩余挂单数量"""
+        return self.state.open_total('buy', 'long')
+
+    @property
+    def sell_long_orders(self):
+        """多头卖出剩余挂单数量"""
+        return self.state.open_total('sell', 'long')
+
+    @property
+    def sell_short_orders(self):
+        """空头卖出剩余挂单数量"""
+        return self.state.open_total('sell', 'short')
+
+    @property
+    def buy_short_orders(self):
+        """空头买入剩余挂单数量"""
+        return self.state.open_total('buy', 'short')
+
+    # ==================== 对账 ====================
+    async def check_orders_status(self):
+        """用 REST 挂单快照对账本地挂单索引"""
+        since_ms = int(self.now() * 1000)
+        self.state.reconcile_orders(await self.adapter.open_orders(), since_ms)
+
+    def track_order(self, order, side, price, quantity, is_reduce_only, position_side, sent=None):
+        """下单成功后立即记入本地挂单索引，不等推流；sent 为下单请求发出时间，用于统计推送回执延迟"""
+        if order is None or position_side is None:
+            return
+        if sent is not None:
+            self.expect_ack(order['id'], sent)
+        self.state.track_order(new_order(self.ws_symbol, order['id'], side, position_side, is_reduce_only, price,
+                                          quantity, int(self.now() * 1000)))
+
+    def expect_ack(self, order_id, sent):
+        early = self.ack_early.pop(order_id, None)
+        if early is not None:
+            latency.record("ack", early - sent)
+            return
+        self.ack_pending[order_id] = sent
+        if len(self.ack_pending) > ACK_TRACK_LIMIT:
+            del self.ack_pending[next(iter(self.ack_pending))]  # 一直没有推送的订单，丢掉最早的
+
+    def on_ack(self, order_id):
+        """收到订单推送"""
+        sent = self.ack_pending.pop(order_id, None)
+        if sent is not None:
+            latency.record("ack", time.perf_counter() - sent)
+            return
+        self.ack_early[order_id] = time.perf_counter()
+        if len(self.ack_early) > ACK_TRACK_LIMIT:
+            del self.ack_early[next(iter(self.ack_early))]  # 不是本进程下的单，丢掉最早的
+
+    def apply_position_sizes(self, sizes, since_ms):
+        """用 adapter.position_sizes() 的结果修正本交易对的持仓"""
+        size = sizes.get(self.ccxt_symbol, {'long': 0, 'short': 0})
+        if self.state.reconcile_positions(size['long'], size['short'], since_ms):
+            self.check_regime()
+
+    async def reconcile_positions(self):
+        """REST 持仓快照与状态引擎求差，只修正漂移"""
+        since_ms = int(self.now() * 1000)
+        self.apply_position_sizes(await self.adapter.position_sizes(), since_ms)
+
+    async def reconcile_state(self):
+        """后台对账任务：持仓每 sync_time 秒、挂单每 order_sync_time 秒，不占用行情处理路径"""
+        last_orders_sync = self.now()
+        while True:
+            await asyncio.sleep(self.sync_time)
+            try:
+                await self.reconcile_positions()
+                if self.now() - last_orders_sync > self.order_sync_time:
+                    await self.check_orders_status()
+                    last_orders_sync = self.now()
+            except Exception as e:
+                logger.error(f"状态对账失败: {e}")
+
+    async def resync(self):
+        """推流重连后的定向对账：断流期间可能漏掉的持仓和挂单变化各用一次 REST 补上，再跑一轮策略"""
+        await asyncio.gather(self.reconcile_positions(), self.check_orders_status())
+        self.scheduler.request("resync")
+
+    async def monitor_orders(self):
+        """监控挂单状态，超过300秒未成交的挂单自动取消"""
+        while True:
+            try:
+                await asyncio.sleep(60)  # 每60秒检查一次
+                current_time = self.now()  # 当前时间（秒）
+
+                if not self.state.orders:
+                    logger.info("当前没有未成交的挂单")
+                    continue
+
+                for order in self.state.orders:
+                    if not order.ts:
+                        logger.warning(f"订单 {order.order_id} 缺少时间戳，无法检查超时")
+                        continue
+
+                    if current_time - order.ts / 1000 > 300:  # 超过300秒未成交
+                        logger.info(f"订单 {order.order_id} 超过300秒未成交，取消挂单")
+                        await self.cancel_order(order.order_id)
+
+            except Exception as e:
+                logger.error(f"监控挂单状态失败: {e}")
+
+    # ==================== 快照 ====================
+    @property
+    def snapshot_key(self):
+        return f"{self.exchange.id}:{self.ws_symbol}"
+
+    def to_snapshot(self):
+        """当前策略状态、持仓和挂单，可直接 JSON 序列化"""
+        return {
+            "grid_spacing": self.grid_spacing,
+            "strategy": {name: getattr(self, name) for name in STRATEGY_FIELDS},
+            "grid": {name: getattr(self, name) for name in GRID_FIELDS},
+            "ladder_anchor": self.ladder.anchor if self.ladder is not None else None,
+            "positions": self.state.positions,
+            "position_ts": self.state.position_ts,
+            "orders": [order_to_row(order) for order in self.state.orders],
+        }
+
+    def restore_snapshot(self, data):
+        """恢复快照；网格间距改过时不恢复中间价和网格阶梯，等第一轮策略按新间距重建"""
+        for name in STRATEGY_FIELDS:
+            setattr(self, name, data["strategy"][name])
+        if data["grid_spacing"] == self.grid_spacing:
+            for name in GRID_FIELDS:
+                setattr(self, name, data["grid"][name])
+            if data["ladder_anchor"]:
+                # 沿用原来的锚点，档位价格和快照里的挂单价格一致
+                self.ladder = GridLadder(self.spec.tick, self.grid_spacing, data["ladder_anchor"])
+        else:
+            logger.info(f"网格间距已从 {data['grid_spacing']} 改为 {self.grid_spacing}，不恢复网格价格")
+        for side in ('long', 'short'):
+            self.state.positions[side] = data["positions"][side]
+            self.state.position_ts[side] = data["position_ts"][side]
+        for row in data["orders"]:
+            self.state.track_order(order_from_row(row))
+
+    async def save_snapshot(self):
+        """在事件循环里取状态，写盘在快照存储的后台线程里做"""
+        try:
+            await self.snapshots.save_async(self.snapshot_key, self.to_snapshot())
+        except Exception as e:
+            logger.error(f"保存快照失败: {e}")
+
+    async def snapshot_loop(self):
+        """定期保存状态快照"""
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            await self.save_snapshot()
+
+    # ==================== 运行 ====================
+    async def prepare(self):
+        """初始化持仓和挂单状态：有快照时先恢复快照，再用 REST 只对账差量"""
+        if self.snapshots is None:
+            self.snapshots = SnapshotStore()
+        snapshot = self.snapshots.load(self.snapshot_key)
+        if snapshot is not None:
+            saved_at, data = snapshot
+            self.restore_snapshot(data)
+            # 停机期间的成交和撤单由对账补上，状态引擎只修正差量并记录漂移
+            await asyncio.gather(self.reconcile_positions(), self.check_orders_status())
+            logger.info(
+                f"从 {self.now() - saved_at:.0f} 秒前的快照恢复: 多头 {self.long_position} 张, 空头 {self.short_position} 张, "
+                f"挂单 {len(self.state.orders)} 个")
+            return
+
+        # 初始化时获取一次持仓数据
+        await self.reconcile_positions()
+        logger.info(f"初始化持仓: 多头 {self.long_position} 张, 空头 {self.short_position} 张")
+
+        # 等待状态同步完成
+        await asyncio.sleep(5)  # 等待 5 秒
+
+        # 初始化时获取一次挂单状态
+        await self.check_orders_status()
+        logger.info(
+            f"初始化挂单状态: 多头开仓={self.buy_long_orders}, 多头止盈={self.sell_long_orders}, 空头开仓={self.sell_short_orders}, 空头止盈={self.buy_short_orders}")
+
+    async def run(self):
+        """启动 WebSocket 监听"""
+        await self.prepare()
+
+        # 启动挂单监控任务
+        # asyncio.create_task(self.monitor_orders())
+        # 启动后台对账任务
+        asyncio.create_task(self.reconcile_state())
+        asyncio.create_task(self.snapshot_loop())
+        asyncio.create_task(latency.recorder.report_loop())
+        if self.loop_watchdog is not None:
+            asyncio.create_task(self.loop_watchdog.run())
+        if self.metrics_port:
+            await self.start_metrics()
+        for task in self.adapter.background_tasks():
+            asyncio.create_task(task)
+
+        # 热备行情连接各自独立重连
+        for link in self.adapter.standby_links:
+            asyncio.create_task(StreamSupervisor(self.adapter, self.dispatcher, [self.ws_symbol], link=link).run())
+        # 断线重连、心跳和假死检测由 StreamSupervisor 负责
+        await StreamSupervisor(self.adapter, self.dispatcher, [self.ws_symbol], self.resync).run()
+
+    # ==================== 推流事件 ====================
+    async def handle_book_ticker_update(self, ticker):
+        """处理最优买卖价更新：每一笔都更新盘口，只有跨过网格档位时才触发策略"""
+        if ticker.symbol != self.ws_symbol:
+            return
+        self.best_bid_price = ticker.bid  # 最佳买价
+        self.best_ask_price = ticker.ask  # 最佳卖价
+        if self.adapter.price_from_ticker:
+            return  # 策略由成交价 ticker 驱动
+        self.on_price((self.best_bid_price + self.best_ask_price) / 2)
+
+    async def handle_ticker_update(self, ticker):
+        """处理成交价 ticker 更新"""
+        if ticker.symbol != self.ws_symbol or not self.adapter.price_from_ticker:
+            return
+        self.on_price(ticker.last)
+
+    def on_price(self, price):
+        self.latest_price = price  # 最新价格
+        self.last_price_at = time.monotonic()
+        if price <= 0:
+            self.scheduler.skip()
+            return
+        level = self.grid_ladder(price).index(price)
+        if level == self.price_level:
+            self.scheduler.skip()
+            return
+        self.price_level = level
+        self.scheduler.request("price")
+
+    def grid_ladder(self, price):
+        """网格价格阶梯（按 grid_spacing 等比划分、对齐到 tick），第一次调用时以 price 为第 0 档"""
+        if self.ladder is None:
+            self.ladder = GridLadder(self.spec.tick, self.grid_spacing, price)
+        return self.ladder
+
+    def inventory_regime(self):
+        """持仓相对各个阈值的位置，决定开仓/止盈数量、是否装死、是否双向减仓"""
+        long_position, short_position = self.long_position, self.short_position
+        reduce_threshold = self.position_threshold * 0.8
+        return (long_position == 0, short_position == 0,
+                long_position > self.position_limit, short_position > self.position_limit,
+                long_position >= self.position_threshold, short_position >= self.position_threshold,
+                long_position >= reduce_threshold and short_position >= reduce_threshold)
+
+    def check_regime(self):
+        """持仓跨过阈值时触发策略"""
+        regime = self.inventory_regime()
+        if regime != self.regime:
+            self.regime = regime
+            self.scheduler.request("inventory")
+
+    def next_wakeup_delay(self):
+        """下一次纯时间条件到期的秒数：空仓方向的首单间隔、锁仓冷却，最长 STRATEGY_MAX_IDLE
+
+        已经过去的到期时间不算：刚执行完的一轮已经处理过它，没有推进挂单时间（如锁仓后一直没下单）时
+        再按它唤醒只会反复空转。
+        """
+        if not self.latest_price:
+            return STRATEGY_MAX_IDLE  # 还没收到行情，策略不会执行，第一笔行情到达时会触发
+        now = self.now()
+        deadlines = [now + STRATEGY_MAX_IDLE]
+        if self.long_position == 0:
+            deadlines.append(self.last_long_order_time + self.order_first_time)
+        if self.short_position == 0:
+            deadlines.append(self.last_short_order_time + self.order_first_time)
+        if self.order_cooldown_time:
+            if self.long_position > self.position_threshold:
+                deadlines.append(self.last_long_order_time + self.order_cooldown_time)
+            if self.short_position > self.position_threshold:
+                deadlines.append(self.last_short_order_time + self.order_cooldown_time)
+        return min(deadline for deadline in deadlines if deadline > now) - now
+
+    def strategy_stats(self):
+        """策略执行统计：实际执行、被合并、被跳过的次数"""
+        return self.scheduler.stats()
+
+    def rate_limit_stats(self):
+        """本地限速：各桶剩余预算、延后的读请求、收到的 429 次数；没有限速时为 None"""
+        return self.rest.limiter.stats() if self.rest.limiter is not None else None
+
+    def latency_stats(self):
+        """行情到下单链路各环节的延迟分位数（毫秒），进程内所有交易对共用"""
+        return latency.recorder.summary()
+
+    def metric_samples(self):
+        """抓取指标时读取的策略状态，按交易对打标签"""
+        now = time.monotonic()
+        symbol = {"symbol": self.ws_symbol}
+        orders = {"buy_long": self.buy_long_orders, "sell_long": self.sell_long_orders,
+                  "sell_short": self.sell_short_orders, "buy_short": self.buy_short_orders}
+        return [
+            ("grid_position", "gauge", "持仓数量",
+             [("grid_position", dict(symbol, side=side), self.state.positions[side]) for side in ('long', 'short')]),
+            ("grid_open_orders", "gauge", "剩余挂单数量",
+             [("grid_open_orders", dict(symbol, kind=kind), total) for kind, total in orders.items()]),
+            ("grid_latest_price", "gauge", "最新价格", [("grid_latest_price", symbol, self.latest_price)]),
+            ("grid_seconds_since_ticker", "gauge", "距最近一次行情的秒数",
+             [("grid_seconds_since_ticker", symbol, None if self.last_price_at is None else now - self.last_price_at)]),
+            ("grid_seconds_since_private_event", "gauge", "距最近一次订单/持仓/余额推送的秒数",
+             [("grid_seconds_since_private_event", symbol,
+               None if self.last_private_at is None else now - self.last_private_at)]),
+            ("grid_strategy_runs_total", "counter", "策略执行轮数",
+             [("grid_strategy_runs_total", symbol, self.scheduler.triggered)]),
+        ]
+
+    async def start_metrics(self):
+        """注册指标并在 metrics_port 上提供 /metrics"""
+        metrics.registry.register(self.metric_samples)
+        metrics.registry.register(metrics.stream_samples(self.adapter))
+        if self.loop_watchdog is None:
+            asyncio.create_task(metrics.loop_lag_probe())  # 开了 loop_watchdog 时由它更新循环延迟
+        await metrics.MetricsServer(metrics.registry, self.metrics_port).start()
+
+    def stream_stats(self):
+        """推流连接统计：重连次数、断流时长、最大消息间隔、交易所特有的健康指标（如距上次私有事件的秒数）；
+        有热备行情连接时附带每条连接和去重统计"""
+        stats = self.adapter.stream_stats.as_dict()
+        stats.update(self.adapter.health())
+        if self.dedup is not None:
+            stats["standby"] = {link.url: link.stream_stats.as_dict() for link in self.adapter.standby_links}
+            stats["dedup"] = self.dedup.stats()
+        return stats
+
+    async def run_strategy(self):
+        """执行一轮网格策略（状态由推流维护，对账在后台任务里做）"""
+        if not self.latest_price:
+            return  # 还没收到行情
+        started = time.perf_counter()
+        try:
+            await self.adjust_grid_strategy()
+        except Exception as e:
+            logger.error(f"执行网格策略失败: {e}")
+        latency.record("strategy", time.perf_counter() - started)
+
+    async def handle_order_update(self, order):
+        """处理订单更新：挂单簿和成交带来的持仓变化统一交给状态引擎，成交或撤单时触发策略"""
+        if order.symbol != self.ws_symbol:  # 匹配交易对
+            return
+        self.last_private_at = time.monotonic()
+        if order.status == 'new':
+            self.on_ack(order.order_id)
+        if self.state.apply_order(order) and order.status != 'new':
+            self.scheduler.request(order.status)
+        self.check_regime()
+
+    async def handle_position_update(self, position):
+        """处理持仓推送"""
+        if position.symbol != self.ws_symbol:
+            return
+        self.last_private_at = time.monotonic()
+        if self.state.apply_position(position):
+            self.check_regime()
+
+    async def handle_balance_update(self, balance):
+        """处理余额更新"""
+        self.last_private_at = time.monotonic()
+        self.balance[balance.currency] = {
+            "balance": balance.balance,
+            "change": balance.change,
+            "time_ms": balance.ts,
+        }
+
+    # ==================== 下单 ====================
+    def side_orders(self, position_side):
+        """某个方向的全部挂单（开仓单和止盈单）"""
+        if position_side == 'long':
+            # 多头开仓单：买单且 reduceOnly 为 False；多头止盈单：卖单且 reduceOnly 为 True
+            return self.state.orders.find('buy', 'long', False) + self.state.orders.find('sell', 'long', True)
+        # 空头开仓单：卖单且 reduceOnly 为 False；空头止盈单：买单且 reduceOnly 为 True
+        return self.state.orders.find('sell', 'short', False) + self.state.orders.find('buy', 'short', True)
+
+    async def cancel_orders_for_side(self, position_side):
+        """撤销某个方向的所有挂单（开仓单和止盈单），走批量撤单"""
+        orders = self.side_orders(position_side)
+        if len(orders) == 0:
+            logger.info("没有找到挂单")
+            return
+        canceled, _ = await self.batcher.cancel(self.ccxt_symbol, [order.order_id for order in orders])
+        for order_id in canceled:
+            self.state.orders.remove(order_id)
+
+    async def replace_side_orders(self, position_side, orders):
+        """把某个方向的挂单刷新为 orders，orders 为 (side, price, quantity, is_reduce_only) 列表
+
+        amend_orders 开启时已有挂单直接改价，否则撤单、下单各一次批量请求；失败时回滚，不会留下只挂了一半的网格。
+        """
+        requests = [self.order_request(side, price, quantity, is_reduce_only, position_side)
+                    for side, price, quantity, is_reduce_only in orders]
+        current = self.side_orders(position_side)
+        sent = time.perf_counter()
+        if self.amend_orders:
+            # 同类挂单原地改价，保留排队位置
+            paired, leftover = pair_orders(current, [(side, is_reduce_only) for side, _, _, is_reduce_only in orders])
+            result = await self.batcher.amend_or_replace(self.ccxt_symbol, paired,
+                                                         [order.order_id for order in leftover], requests)
+        else:
+            result = await self.batcher.replace(self.ccxt_symbol, [order.order_id for order in current], requests)
+        for order_id in result.canceled:
+            self.state.orders.remove(order_id)
+        for request, (side, _, _, is_reduce_only), order in zip(requests, orders, result.created):
+            self.track_order(order, side, request['price'], request['amount'], is_reduce_only, position_side, sent)
+        return result.ok
+
+    async def cancel_order(self, order_id):
+        """撤单"""
+        try:
+            await self.rest.cancel_order(order_id, self.ccxt_symbol)
+            self.state.orders.remove(order_id)
+        except ccxt.OrderNotFound as e:
+            logger.warning(f"订单 {order_id} 不存在，无需撤销: {e}")
+            self.state.orders.remove(order_id)
+        except ccxt.BaseError as e:
+            logger.error(f"撤单失败: {e}")
+
+    def round_price(self, price):
+        """对齐到 tick"""
+        return self.spec.round_price(price)
+
+    def round_quantity(self, quantity, price=None):
+        """对齐到 step 并确保不低于最小下单数量；给出价格时同时满足最小名义价值"""
+        return self.spec.round_amount(quantity, price)
+
+    def order_request(self, side, price, quantity, is_reduce_only, position_side):
+        """构造批量下单用的限价单请求，参数与 place_order 一致"""
+        price = self.round_price(price)
+        return {
+            'symbol': self.ccxt_symbol,
+            'type': 'limit',
+            'side': side,
+            'amount': self.round_quantity(quantity, price),
+            'price': price,
+            'params': self.adapter.order_params(is_reduce_only, position_side),
+        }
+
+    async def place_order(self, side, price, quantity, is_reduce_only=False, position_side=None, order_type='limit'):
+        """挂单函数，增加双向持仓支持"""
+        try:
+            quantity = self.round_quantity(quantity, price)
+            params = self.adapter.order_params(is_reduce_only, position_side)
+            # 如果是市价单，不需要价格参数
+            if order_type == 'market':
+                return await self.rest.create_order(self.ccxt_symbol, 'market', side, quantity, params=params)
+
+            # 检查 price 是否为 None
+            if price is None:
+                logger.error("限价单必须提供 price 参数")
+                return None
+            price = self.round_price(price)
+            sent = time.perf_counter()
+            order = await self.rest.create_order(self.ccxt_symbol, 'limit', side, quantity, price, params)
+            self.track_order(order, side, price, quantity, is_reduce_only, position_side, sent)
+            return order
+        except ccxt.BaseError as e:
+            logger.error(f"下单报错: {e}")
+            return None
+
+    async def place_take_profit_order(self, ccxt_symbol, side, price, quantity):
+        """挂止盈单（双仓模式）"""
+        # 检查本地挂单索引中是否已有相同价格的止盈单
+        if self.state.orders.has_price('sell' if side == 'long' else 'buy', side, True, self.round_price(price)):
+            logger.info(f"已存在相同价格的 {side} 止盈单，跳过挂单")
+            return
+        # 检查持仓
+        if side == 'long' and self.long_position <= 0:
+            logger.warning("没有多头持仓，跳过挂出多头止盈单")
+            return
+        elif side == 'short' and self.short_position <= 0:
+            logger.warning("没有空头持仓，跳过挂出空头止盈单")
+            return
+        price = self.round_price(price)
+        quantity = self.round_quantity(quantity, price)
+        try:
+            # 卖出平多 / 买入平空
+            order_side = 'sell' if side == 'long' else 'buy'
+            sent = time.perf_counter()
+            order = await self.rest.create_order(ccxt_symbol, 'limit', order_side, quantity, price,
+                                                 self.adapter.order_params(True, side))
+            self.track_order(order, order_side, price, quantity, True, side, sent)
+            logger.info(f"成功挂 {side} 止盈单: {order_side} {quantity} {ccxt_symbol} @ {price}")
+        except ccxt.BaseError as e:
+            logger.error(f"挂止盈单失败: {e}")
+
+    # ==================== 策略逻辑 ====================
+    def get_take_profit_quantity(self, position, side):
+        """调整止盈单的交易数量"""
+        if side == 'long':
+            if position > self.position_limit:
+                self.long_initial_quantity = self.initial_quantity * 2
+
+            # 如果 short 锁仓 long 两倍
+            elif self.short_position >= self.position_threshold:
+                self.long_initial_quantity = self.initial_quantity * 2
+            else:
+                self.long_initial_quantity = self.initial_quantity
+
+        elif side == 'short':
+            if position > self.position_limit:
+                self.short_initial_quantity = self.initial_quantity * 2
+
+            # 如果 long 锁仓 short 两倍
+            elif self.long_position >= self.position_threshold:
+                self.short_initial_quantity = self.initial_quantity * 2
+            else:
+                self.short_initial_quantity = self.initial_quantity
+
+    def lock_take_profit_ratio(self, position, other_position):
+        """装死时止盈价相对最新价的倍数"""
+        return float((position / other_position) / 100 + 1)
+
+    def opening_price(self, side):
+        """开仓单挂在己方最优价"""
+        return self.best_bid_price if side == 'buy' else self.best_ask_price
+
+    async def initialize_long_orders(self):
+        # 检查上次挂单时间，确保 order_first_time 秒内不重复挂单
+        current_time = self.now()
+        if current_time - self.last_long_order_time < self.order_first_time:
+            logger.info(f"距离上次多头挂单时间不足 {self.order_first_time} 秒，跳过本次挂单")
+            return
+
+        await self.cancel_orders_for_side('long')
+
+        # 挂出多头开仓单
+        await self.place_order('buy', self.opening_price('buy'), self.initial_quantity, False, 'long')
+        logger.info(f"挂出多头开仓单: 买入 @ {self.latest_price}")
+
+        # 更新上次多头挂单时间
+        self.last_long_order_time = self.now()
+        logger.info("初始化多头挂单完成")
+
+    async def initialize_short_orders(self):
+        # 检查上次挂单时间，确保 order_first_time 秒内不重复挂单
+        current_time = self.now()
+        if current_time - self.last_short_order_time < self.order_first_time:
+            logger.info(f"距离上次空头挂单时间不足 {self.order_first_time} 秒，跳过本次挂单")
+            return
+
+        # 撤销所有空头挂单
+        await self.cancel_orders_for_side('short')
+
+        # 挂出空头开仓单
+        await self.place_order('sell', self.opening_price('sell'), self.initial_quantity, False, 'short')
+        logger.info(f"挂出空头开仓单: 卖出 @ {self.latest_price}")
+
+        # 更新上次空头挂单时间
+        self.last_short_order_time = self.now()
+        logger.info("初始化空头挂单完成")
+
+    async def place_long_orders(self, latest_price):
+        """挂多头订单"""
+        try:
+            self.get_take_profit_quantity(self.long_position, 'long')
+            if self.long_position > 0:
+                # 检查持仓是否超过阈值
+                if self.long_position > self.position_threshold:
+                    logger.info(f"持仓{self.long_position}超过极限阈值 {self.position_threshold}，long装死")
+                    self.lock_hits['long'] += 1
+                    if self.sell_long_orders <= 0:
+                        r = self.lock_take_profit_ratio(self.long_position, self.short_position)
+                        await self.place_take_profit_order(self.ccxt_symbol, 'long', self.latest_price * r,
+                                                           self.long_initial_quantity)  # 挂止盈
+                else:
+                    # 更新中间价
+                    self.update_mid_price('long', latest_price)
+                    # 撤旧单、挂止盈和补仓合并成批量请求
+                    await self.replace_side_orders('long', [
+                        ('sell', self.upper_price_long, self.long_initial_quantity, True),  # 挂止盈
+                        ('buy', self.lower_price_long, self.long_initial_quantity, False),  # 挂补仓
+                    ])
+                    logger.info("挂多头止盈，挂多头补仓")
+
+        except Exception as e:
+            logger.error(f"挂多头订单失败: {e}")
+
+    async def place_short_orders(self, latest_price):
+        """挂空头订单"""
+        try:
+            self.get_take_profit_quantity(self.short_position, 'short')
+            if self.short_position > 0:
+                # 检查持仓是否超过阈值
+                if self.short_position > self.position_threshold:
+                    logger.info(f"持仓{self.short_position}超过极限阈值 {self.position_threshold}，short 装死")
+                    self.lock_hits['short'] += 1
+                    if self.buy_short_orders <= 0:
+                        r = self.lock_take_profit_ratio(self.short_position, self.long_position)
+                        logger.info("发现多头止盈单缺失。。需要补止盈单")
+                        await self.place_take_profit_order(self.ccxt_symbol, 'short', self.latest_price * r,
+                                                           self.short_initial_quantity)  # 挂止盈
+
+                else:
+                    # 更新中间价
+                    self.update_mid_price('short', latest_price)
+                    # 撤旧单、挂止盈和补仓合并成批量请求
+                    await self.replace_side_orders('short', [
+                        ('buy', self.lower_price_short, self.short_initial_quantity, True),  # 挂止盈
+                        ('sell', self.upper_price_short, self.short_initial_quantity, False),  # 挂补仓
+                    ])
+                    logger.info("挂空头止盈，挂空头补仓")
+
+        except Exception as e:
+            logger.error(f"挂空头订单失败: {e}")
+
+    async def check_and_reduce_positions(self):
+        """检查持仓并减少库存风险"""
+
+        # 设置持仓阈值
+        local_position_threshold = self.position_threshold * 0.8  # 阈值的 80%
+
+        # 设置平仓数量
+        quantity = self.position_threshold * 0.1  # 阈值的 10%
+
+        if self.long_position >= local_position_threshold and self.short_position >= local_position_threshold:
+            logger.info(f"多头和空头持仓均超过阈值 {local_position_threshold}，开始双向平仓，减少库存风险")
+            # 平仓多头（使用市价单）
+            if self.long_position > 0:
+                await self.place_order('sell', price=self.best_ask_price, quantity=quantity, is_reduce_only=True,
+                                       position_side='long', order_type='market')
+                logger.info(f"市价平仓多头 {quantity} 个")
+
+            # 平仓空头（使用市价单）
+            if self.short_position > 0:
+                await self.place_order('buy', price=self.best_bid_price, quantity=quantity, is_reduce_only=True,
+                                       position_side='short', order_type='market')
+                logger.info(f"市价平仓空头 {quantity} 个")
+
+    def update_mid_price(self, side, price):
+        """更新中间价：取离价格最近的网格档位，上下网格为相邻档位（已对齐到 tick）"""
+        lower, mid, upper = self.grid_ladder(price).around(price)
+        if side == 'long':
+            self.mid_price_long = mid  # 更新多头中间价
+            self.upper_price_long = upper
+            self.lower_price_long = lower
+            logger.debug("更新 long 中间价")
+
+        elif side == 'short':
+            self.mid_price_short = mid  # 更新空头中间价
+            self.upper_price_short = upper
+            self.lower_price_short = lower
+            logger.debug("更新 short 中间价")
+
+    def in_cooldown(self, position, last_order_time, current_time):
+        """锁仓后 order_cooldown_time 秒内不重复挂单"""
+        return position > self.position_threshold and current_time - last_order_time < self.order_cooldown_time
+
+    async def adjust_grid_strategy(self):
+        """根据最新价格和持仓调整网格策略"""
+        # 检查双向仓位库存，如果同时达到，就统一部分平仓减少库存风险，提高保证金使用率
+        await self.check_and_reduce_positions()
+
+        current_time = self.now()
+        # 检测多头持仓
+        if self.long_position == 0:
+            logger.info(f"检测到没有多头持仓{self.long_position}，初始化多头挂单@ ticker")
+            await self.initialize_long_orders()
+        else:
+            # 挂单数量来自本地挂单索引，不再用 REST 二次确认
+            orders_valid = not (0 < self.buy_long_orders <= self.long_initial_quantity) or \
+                           not (0 < self.sell_long_orders <= self.long_initial_quantity)
+            if orders_valid:
+                if self.in_cooldown(self.long_position, self.last_long_order_time, current_time):
+                    logger.info(f"距离上次 long 挂止盈时间不足 {self.order_cooldown_time} 秒，跳过本次 long 挂单@ ticker")
+                else:
+                    await self.place_long_orders(self.latest_price)
+
+        # 检测空头持仓
+        if self.short_position == 0:
+            await self.initialize_short_orders()
+        else:
+            # 检查订单数量是否在合理范围内
+            orders_valid = not (0 < self.sell_short_orders <= self.short_initial_quantity) or \
+                           not (0 < self.buy_short_orders <= self.short_initial_quantity)
+            if orders_valid:
+                if self.in_cooldown(self.short_position, self.last_short_order_time, current_time):
+                    logger.info(f"距离上次 short 挂止盈时间不足 {self.order_cooldown_time} 秒，跳过本次 short 挂单@ ticker")
+                else:
+                    await self.place_short_orders(self.latest_price)
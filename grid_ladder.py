@@ -0,0 +1,98 @@
+"""
+网格价格阶梯：按 grid_spacing 等比划分、对齐到最小价格变动（tick）的价格档位。
+
+第 k 档价格 = anchor * (1 + grid_spacing) ** k，取整到 tick 后以整数 tick 存在 array('q') 里（numpy 批量计算，
+查找时按下标取值，避开 numpy 标量的开销）。
+数组只保存当前价格附近的一个窗口，价格走出窗口时平移窗口，只计算新进入窗口的档位。
+"""
+import math
+from array import array
+
+import numpy as np
+
+from quantize import tick_digits
+
+LADDER_SIZE = 64  # 窗口内的档位数
+LADDER_MARGIN = 4  # 价格离窗口边缘少于这么多档时平移窗口
+
+
+class GridLadder:
+    """等比网格档位，支持 O(1) 查找价格所在档位"""
+
+    def __init__(self, tick, spacing, anchor_price, size=LADDER_SIZE):
+        self.tick = tick
+        self.digits = tick_digits(tick)
+        self.spacing = spacing
+        self.log_step = math.log1p(spacing)
+        self.anchor = anchor_price  # 第 0 档的价格
+        self.size = size
+        self.first = -(size // 2)  # 窗口第一个档位的编号
+        self.ticks = self._levels(self.first, self.first + size)  # 窗口内各档的整数 tick
+        self.shifts = 0  # 窗口平移次数
+
+    def _levels(self, start, stop):
+        k = np.arange(start, stop, dtype=np.float64)
+        return array('q', np.rint(self.anchor * np.exp(k * self.log_step) / self.tick).astype(np.int64).tobytes())
+
+    def _shift(self, first):
+        """把窗口平移到从 first 档开始，重叠部分直接复用"""
+        last = self.first + self.size
+        new_last = first + self.size
+        if first >= last or new_last <= self.first:
+            ticks = self._levels(first, new_last)
+        elif first > self.first:
+            ticks = self.ticks[first - self.first:] + self._levels(last, new_last)
+        else:
+            ticks = self._levels(first, self.first) + self.ticks[:new_last - self.first]
+        self.first = first
+        self.ticks = ticks
+        self.shifts += 1
+
+    def _ensure(self, k):
+        if k - LADDER_MARGIN < self.first or k + LADDER_MARGIN >= self.first + self.size:
+            self._shift(k - self.size // 2)
+
+    def index(self, price):
+        """价格所在档位编号 k，满足 level(k) <= price < level(k + 1)"""
+        k = math.floor(math.log(price / self.anchor) / self.log_step)
+        target = price / self.tick
+        while True:
+            self._ensure(k)
+            ticks = self.ticks
+            i = k - self.first
+            # 取整到 tick 后边界可能和估计差几档，就近修正；走到窗口边缘时平移窗口继续找
+            while i > 0 and ticks[i] > target:
+                i -= 1
+            while i + 1 < self.size and ticks[i + 1] <= target:
+                i += 1
+            if 0 < i < self.size - 1:
+                return self.first + i
+            k = self.first + i
+
+    def nearest(self, price):
+        """离价格最近的档位编号"""
+        k = self.index(price)
+        return k + 1 if self.price(k + 1) - price < price - self.price(k) else k
+
+    def level_ticks(self, k):
+        """第 k 档的整数 tick"""
+        self._ensure(k)
+        return self.ticks[k - self.first]
+
+    def price(self, k):
+        """第 k 档价格（对齐到 tick）"""
+        return self.to_price(self.level_ticks(k))
+
+    def to_price(self, ticks):
+        return round(ticks * self.tick, self.digits)
+
+    def around(self, price):
+        """(下一档, 最近档, 上一档) 价格，网格以最近档为中间价挂单
+
+        间距小于 1 tick 时相邻档位会取整到同一价格，此时上下网格至少离中间价 1 tick。
+        """
+        k = self.nearest(price)
+        mid = self.level_ticks(k)
+        lower = min(self.level_ticks(k - 1), mid - 1)
+        upper = max(self.level_ticks(k + 1), mid + 1)
+        return self.to_price(lower), self.to_price(mid), self.to_price(upper)
@@ -0,0 +1,132 @@
+"""
+行情到下单链路的延迟统计：收帧处理、解析、策略决策、每种 REST 调用、下单到订单推送回执，各自记入一个直方图。
+
+直方图按 HDR 的方式分桶：小于 2**SUB_BUCKET_BITS 微秒逐个记录，更大的值每翻一倍分 2**(SUB_BUCKET_BITS-1) 个桶，
+相对误差不超过 1/2**(SUB_BUCKET_BITS-1)。记录一次只是整数移位和列表计数，可以常开。
+分位数每 LATENCY_REPORT_INTERVAL 秒写一次日志并清零，每个周期看到的是这个周期内的分布；
+清零前的次数和总和累加到 LatencyRecorder.cumulative，指标里的 _count/_sum 按累计值导出，不会倒退。
+
+用法::
+
+    started = time.perf_counter()
+    ...
+    latency.record("strategy", time.perf_counter() - started)
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger()
+
+SUB_BUCKET_BITS = 7  # 每个数量级的精度：2**6 = 64 个桶，相对误差 < 1.6%
+MAX_VALUE_BITS = 36  # 可记录的最大值 2**36 微秒（约 19 小时），更大的值记到最后一个桶
+LATENCY_REPORT_INTERVAL = 60  # 分位数输出间隔（秒）
+REPORT_PERCENTILES = (50, 99, 99.9)
+
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+_SIZE = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 2) * _HALF
+
+
+def bucket_index(value):
+    """微秒值 -> 桶下标：shift 为超出精度的位数，下标为 shift * _HALF + (value >> shift)"""
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return min(shift * _HALF + (value >> shift), _SIZE - 1)
+
+
+def bucket_value(index):
+    """桶下标 -> 桶内最大值（微秒），分位数按它报告，不会低估"""
+    if index < 2 * _HALF:
+        return index
+    shift = index // _HALF - 1
+    return ((index - shift * _HALF + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """一个环节的延迟分布（微秒）"""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * _SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds):
+        value = int(seconds * 1e6)
+        if value < 0:
+            value = 0
+        # 内联 bucket_index，热路径上少一次函数调用
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        self.counts[value if shift <= 0 else min(shift * _HALF + (value >> shift), _SIZE - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """第 percent 百分位（微秒）"""
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * percent / 100 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """次数、平均和各分位数（毫秒）"""
+        summary = {"count": self.count, "mean": self.total / self.count / 1000 if self.count else 0}
+        for percent in REPORT_PERCENTILES:
+            summary[f"p{percent:g}"] = self.percentile(percent) / 1000
+        summary["max"] = self.max / 1000
+        return summary
+
+    def reset(self):
+        self.counts = [0] * _SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+class LatencyRecorder:
+    """按环节名称分组的直方图，一个进程共用一个（见 recorder）"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.cumulative = {}  # 环节 -> [之前各周期的次数, 之前各周期的总和（微秒）]
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def summary(self):
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items()) if histogram.count}
+
+    def totals(self, name):
+        """启动以来的 (次数, 总和微秒)"""
+        histogram = self.histograms[name]
+        count, total = self.cumulative.get(name, (0, 0))
+        return count + histogram.count, total + histogram.total
+
+    def reset(self):
+        for name, histogram in self.histograms.items():
+            self.cumulative[name] = list(self.totals(name))
+            histogram.reset()
+
+    async def report_loop(self, interval=LATENCY_REPORT_INTERVAL):
+        """定期输出分位数并清零"""
+        while True:
+            await asyncio.sleep(interval)
+            for name, s in self.summary().items():
+                logger.info(f"延迟 {name}: n={s['count']} p50={s['p50']:.2f}ms p99={s['p99']:.2f}ms "
+                            f"p999={s['p99.9']:.2f}ms max={s['max']:.2f}ms")
+            self.reset()
+
+
+recorder = LatencyRecorder()  # 进程内共用
+record = recorder.record
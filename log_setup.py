@@ -0,0 +1,223 @@
+"""
+非阻塞日志：调用方只把日志记录放进有界队列，格式化后的写盘和控制台输出都在后台线程里做，磁盘慢时不会卡住事件循环。
+
+- 文件里每行一条 JSON（时间、级别、消息、调用位置，extra 里的 category 和 fields 原样带上），控制台保持原来的文本格式；
+- 按类别限速：类别取 extra={"category": ...}，没给时按调用位置（文件:行号）算，每个类别每秒最多 LOG_RATE 条、
+  突发 LOG_BURST 条，超出的丢弃并计数，下一条放行的记录带上 suppressed 条数；
+- 队列满时直接丢弃并计数，不等待；
+- 日志文件超过 LOG_MAX_BYTES 或跨过 LOG_ROTATE_WHEN 的时间边界时轮转，保留 LOG_BACKUP_COUNT 个旧文件。
+
+用法（脚本开头调用一次，重复调用直接返回已有的）::
+
+    setup_logging(script_name)
+    logger.info("网格刷新", extra={"category": "order", "fields": {"side": "long", "price": 0.5}})
+
+后台线程在 fork 出的子进程里不存在，spawn 的子进程又会各自打开同一个日志文件互相轮转。进程池里用
+start_worker_listener / setup_worker_logging：子进程只把记录放进 multiprocessing 队列，由父进程统一写出。
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import time
+
+LOG_DIR = "log"  # 日志目录
+LOG_QUEUE_SIZE = 10000  # 待写日志队列长度，满了直接丢弃
+LOG_RATE = 20  # 每个类别每秒最多放行的日志条数
+LOG_BURST = 50  # 每个类别的突发上限
+LOG_MAX_BYTES = 50 * 1024 * 1024  # 单个日志文件上限（字节）
+LOG_ROTATE_WHEN = 86400  # 按时间轮转的周期（秒），0 为不按时间轮转
+LOG_BACKUP_COUNT = 7  # 保留的旧日志文件数
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None  # 已启动的后台写日志线程
+_queue_handler = None  # 根 logger 上的队列 handler
+_listener_pid = None  # 启动后台线程的进程
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "where": f"{record.module}:{record.lineno}",
+        }
+        category = getattr(record, "category", None)
+        if category is not None:
+            data["category"] = category
+        fields = getattr(record, "fields", None)
+        if fields:
+            data.update(fields)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """按类别的令牌桶，在调用方线程里执行，被限速的记录不进队列"""
+
+    def __init__(self, rate=LOG_RATE, burst=LOG_BURST):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # 类别 -> [令牌数, 上次补充时间, 被丢弃条数]
+        self.suppressed = 0  # 累计被限速丢弃的条数
+
+    def filter(self, record):
+        category = getattr(record, "category", None) or (record.pathname, record.lineno)
+        now = record.created
+        bucket = self.buckets.get(category)
+        if bucket is None:
+            bucket = self.buckets[category] = [self.burst, now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃记录而不是等待"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0  # 因队列满丢弃的条数
+
+    def prepare(self, record):
+        """在调用方线程里只拼好消息文本，异常堆栈单独放在 exc_text，不做其他格式化"""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """按大小或时间轮转，先到的条件触发"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, interval=LOG_ROTATE_WHEN, backup_count=LOG_BACKUP_COUNT):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.interval = interval
+        self.rollover_at = self.next_rollover(time.time())
+
+    def next_rollover(self, now):
+        if not self.interval:
+            return float("inf")
+        return now - now % self.interval + self.interval  # 对齐到周期边界（UTC）
+
+    def shouldRollover(self, record):
+        if record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self.next_rollover(time.time())
+
+
+class _ForwardHandler(logging.Handler):
+    """把子进程发来的记录交给本进程的根 logger（经过限速和本进程的队列写出）"""
+
+    def handle(self, record):
+        logging.getLogger().handle(record)
+        return True
+
+
+def setup_logging(name, log_dir=LOG_DIR, level=logging.INFO, json_file=True, console=True):
+    """给根 logger 装上队列和后台写日志线程，日志文件为 {log_dir}/{name}.log"""
+    global _listener, _queue_handler, _listener_pid
+    if _listener is not None:
+        return _listener
+    os.makedirs(log_dir, exist_ok=True)
+    handlers = []
+    file_handler = RotatingFileHandler(os.path.join(log_dir, f"{name}.log"))
+    file_handler.setFormatter(JsonFormatter() if json_file else logging.Formatter(TEXT_FORMAT))
+    handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(console_handler)
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """写完队列里剩下的日志并停止后台线程（退出时自动调用）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_stats():
+    """被限速和队列满丢弃的日志条数"""
+    if _queue_handler is None:
+        return {}
+    return {"rate_limited": _queue_handler.filters[0].suppressed, "queue_dropped": _queue_handler.dropped,
+            "queued": _queue_handler.queue.qsize()}
+
+
+def start_worker_listener():
+    """父进程：启动接收进程池子进程日志的线程，返回 (队列, listener)，队列作为 initializer 参数传给子进程"""
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, _ForwardHandler())
+    listener.start()
+    return log_queue, listener
+
+
+def setup_worker_logging(log_queue, level=logging.INFO):
+    """子进程（进程池 initializer 里调用）：停掉继承来的或导入时创建的日志线程，记录全部发给父进程"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        if _listener_pid == os.getpid():
+            _listener.stop()  # spawn：导入脚本模块时在本进程里启动的
+        for handler in _listener.handlers:
+            handler.close()  # fork 时线程已经不在，只关掉从父进程继承来的文件
+        _listener = None
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter())
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
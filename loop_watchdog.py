@@ -0,0 +1,152 @@
+"""
+事件循环延迟监控和阻塞调用定位。
+
+事件循环里每 LOOP_TICK 秒醒来一次，实际醒来比预期晚的部分就是循环被占用的时长，记入 latency 的 loop_lag 直方图
+并更新指标。另有一个后台线程盯着心跳：超过 BLOCK_THRESHOLD 没有心跳时，抓取事件循环线程当时的调用栈，
+按项目代码里的调用链（如 grid_core.cancel_orders_for_side → async_exchange.run）归类。循环恢复后按这次阻塞的
+时长累计到该调用点，定期输出阻塞总时长最多的调用点排行。
+
+只有真正阻塞时才抓栈，平时的开销是一个定时协程和一个低频轮询的线程。
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+import latency
+import metrics
+
+logger = logging.getLogger()
+
+LOOP_TICK = 0.05  # 心跳间隔（秒）
+BLOCK_THRESHOLD = 0.1  # 循环超过这么久没有心跳视为阻塞，抓取调用栈（秒）
+CHECK_INTERVAL = 0.02  # 后台线程检查心跳的间隔（秒）
+LOOP_REPORT_INTERVAL = 300  # 阻塞调用点排行的输出间隔（秒）
+REPORT_TOP = 10  # 排行输出前几名
+SITE_DEPTH = 4  # 调用点取最内层的几帧项目代码
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def call_site(frames):
+    """调用栈 -> 调用点：最内层 SITE_DEPTH 帧项目代码，加上最内层的库函数（真正耗时的地方）"""
+    project = [frame for frame in frames
+               if frame.filename.startswith(PROJECT_DIR) and not frame.filename.endswith("loop_watchdog.py")]
+    chain = " → ".join(f"{os.path.splitext(os.path.basename(frame.filename))[0]}.{frame.name}"
+                       for frame in project[-SITE_DEPTH:])
+    innermost = frames[-1] if frames else None
+    if innermost is None or (project and innermost is project[-1]):
+        return chain or "?"
+    leaf = f"{os.path.basename(innermost.filename)}:{innermost.lineno} {innermost.name}"
+    return f"{chain} | {leaf}" if chain else leaf
+
+
+class BlockingSite:
+    """一个调用点的阻塞统计"""
+    __slots__ = ("site", "count", "total", "max", "stack")
+
+    def __init__(self, site, stack):
+        self.site = site
+        self.count = 0
+        self.total = 0.0  # 累计阻塞时长（秒）
+        self.max = 0.0
+        self.stack = stack  # 最近一次抓到的完整调用栈
+
+    def add(self, blocked):
+        self.count += 1
+        self.total += blocked
+        self.max = max(self.max, blocked)
+
+
+class LoopWatchdog:
+    """事件循环延迟直方图和阻塞调用点排行"""
+
+    def __init__(self, tick=LOOP_TICK, threshold=BLOCK_THRESHOLD):
+        self.tick = tick
+        self.threshold = threshold
+        self.beat = time.perf_counter()  # 最近一次心跳（循环线程写，监控线程读）
+        self.loop_thread = None
+        self.captured = None  # 监控线程抓到的 (心跳, 调用点, 调用栈)，循环恢复后结算
+        self.sites = {}  # 调用点 -> BlockingSite
+        self.blocks = 0  # 阻塞次数
+        self.max_lag = 0.0
+        self.running = False
+
+    # ==================== 事件循环侧 ====================
+    async def run(self):
+        """在事件循环里运行：心跳、记录延迟、结算阻塞"""
+        self.loop_thread = threading.get_ident()
+        self.running = True
+        threading.Thread(target=self.watch, name="loop-watchdog", daemon=True).start()
+        last_report = time.perf_counter()
+        try:
+            while True:
+                started = time.perf_counter()
+                self.beat = started
+                await asyncio.sleep(self.tick)
+                now = time.perf_counter()
+                self.beat = now
+                lag = max(0.0, now - started - self.tick)
+                latency.record("loop_lag", lag)
+                metrics.LOOP_LAG.set(lag)
+                if lag > self.max_lag:
+                    self.max_lag = lag
+                    metrics.LOOP_LAG_MAX.set(lag)
+                if self.captured is not None:
+                    self.settle(lag)
+                if now - last_report > LOOP_REPORT_INTERVAL:
+                    self.log_report()
+                    last_report = now
+        finally:
+            self.running = False
+            self.log_report()
+
+    def settle(self, lag):
+        captured, self.captured = self.captured, None
+        _, site, stack = captured
+        entry = self.sites.get(site)
+        if entry is None:
+            entry = self.sites[site] = BlockingSite(site, stack)
+        entry.stack = stack
+        entry.add(lag)
+        self.blocks += 1
+        logger.warning(f"事件循环阻塞 {lag * 1000:.0f}ms: {site}", extra={"category": "loop_block"})
+
+    # ==================== 监控线程 ====================
+    def watch(self):
+        while self.running:
+            time.sleep(CHECK_INTERVAL)
+            beat = self.beat
+            if time.perf_counter() - beat < self.threshold + self.tick:
+                continue
+            if self.captured is not None and self.captured[0] == beat:
+                continue  # 这次阻塞已经抓过
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is None:
+                continue
+            frames = traceback.extract_stack(frame)
+            if self.beat != beat:
+                continue  # 抓栈期间循环已经恢复，栈里已不是阻塞的那段代码
+            self.captured = (beat, call_site(frames), "".join(traceback.format_list(frames)))
+
+    # ==================== 报告 ====================
+    def report(self, top=REPORT_TOP):
+        """按累计阻塞时长排序的调用点：[(调用点, 次数, 累计秒, 最长秒)]"""
+        ranked = sorted(self.sites.values(), key=lambda entry: entry.total, reverse=True)[:top]
+        return [(entry.site, entry.count, entry.total, entry.max) for entry in ranked]
+
+    def log_report(self):
+        if not self.sites:
+            return
+        lines = [f"{i}. {site}  {count} 次, 累计 {total * 1000:.0f}ms, 最长 {longest * 1000:.0f}ms"
+                 for i, (site, count, total, longest) in enumerate(self.report(), 1)]
+        logger.warning(f"事件循环阻塞排行（共 {self.blocks} 次，最大延迟 {self.max_lag * 1000:.0f}ms）:\n"
+                       + "\n".join(lines))
+
+    def stats(self):
+        return {"blocks": self.blocks, "max_lag": self.max_lag,
+                "top": [{"site": site, "count": count, "total": total, "max": longest}
+                        for site, count, total, longest in self.report()]}
@@ -0,0 +1,114 @@
+"""
+市场元数据磁盘缓存：启动时直接用本地 JSON 里的市场数据（精度、限制、合约乘数），不在启动路径上下载全部合约。
+
+缓存按交易所和合约类型分文件，记录格式版本和 ccxt 版本，任一不符都当作没有缓存（ccxt 升级可能改变市场结构）。
+超过 MARKET_CACHE_TTL 的缓存照常使用，同时在后台线程里用独立的 ccxt 实例重新下载，写回磁盘后替换内存中的市场数据；
+没有缓存或缓存损坏时才同步下载。
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import ccxt
+
+logger = logging.getLogger()
+
+MARKET_CACHE_DIR = "cache"  # 缓存目录
+MARKET_CACHE_TTL = 6 * 3600  # 缓存有效期（秒），过期后后台刷新
+CACHE_VERSION = 1  # 缓存文件格式版本
+
+_refreshing = set()  # 正在后台刷新的缓存文件
+
+
+def cache_path(exchange, cache_dir=MARKET_CACHE_DIR):
+    """缓存文件路径：markets_{交易所}_{合约类型}.json"""
+    market_type = exchange.options.get("defaultType") or "default"
+    return os.path.join(cache_dir, f"markets_{exchange.id}_{market_type}.json")
+
+
+def read_cache(path):
+    """读取缓存，文件不存在、损坏或版本不符时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"市场数据缓存 {path} 读取失败，重新下载: {e}")
+        return None
+    if data.get("version") != CACHE_VERSION or data.get("ccxt") != ccxt.__version__ or not data.get("markets"):
+        logger.info(f"市场数据缓存 {path} 版本不符，重新下载")
+        return None
+    return data
+
+
+def write_cache(path, exchange):
+    """先写临时文件再替换，崩溃时不会留下半个文件"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = {
+        "version": CACHE_VERSION,
+        "ccxt": ccxt.__version__,
+        "exchange": exchange.id,
+        "saved_at": time.time(),
+        "markets": list(exchange.markets.values()),
+        "currencies": exchange.currencies or None,
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_markets(exchange, cache_dir=MARKET_CACHE_DIR, ttl=MARKET_CACHE_TTL):
+    """用磁盘缓存初始化 exchange 的市场数据，代替 exchange.load_markets()"""
+    if exchange.markets:
+        return exchange.markets
+    path = cache_path(exchange, cache_dir)
+    data = read_cache(path)
+    if data is None:
+        started = time.time()
+        exchange.load_markets()
+        logger.info(f"下载市场数据: {len(exchange.markets)} 个交易对，耗时 {time.time() - started:.2f} 秒")
+        try:
+            write_cache(path, exchange)
+        except OSError as e:
+            logger.warning(f"市场数据缓存写入失败: {e}")
+        return exchange.markets
+
+    exchange.set_markets(data["markets"], data["currencies"])
+    age = time.time() - data["saved_at"]
+    logger.info(f"使用市场数据缓存: {len(exchange.markets)} 个交易对，缓存时间 {age / 3600:.1f} 小时前")
+    if age > ttl:
+        refresh_in_background(exchange, path)
+    return exchange.markets
+
+
+def refresh_in_background(exchange, path):
+    """后台线程重新下载市场数据，写回缓存并替换 exchange 的市场数据"""
+    if path in _refreshing:
+        return
+    _refreshing.add(path)
+    threading.Thread(target=_refresh, args=(exchange, path), name="market-cache-refresh", daemon=True).start()
+
+
+def _refresh(exchange, path):
+    try:
+        # 用独立实例下载，不和交易线程共用连接和限速，也不会在 set_markets 填充一半时被读到
+        config = {"apiKey": exchange.apiKey, "secret": exchange.secret, "password": exchange.password}
+        if exchange.options.get("defaultType"):
+            config["options"] = {"defaultType": exchange.options["defaultType"]}
+        fresh = type(exchange)(config)
+        fresh.load_markets()
+        write_cache(path, fresh)
+        exchange.markets_by_id = fresh.markets_by_id
+        exchange.symbols = fresh.symbols
+        exchange.ids = fresh.ids
+        exchange.currencies = fresh.currencies
+        exchange.markets = fresh.markets
+        logger.info(f"市场数据缓存已刷新: {len(fresh.markets)} 个交易对")
+    except Exception as e:
+        logger.warning(f"市场数据后台刷新失败，继续使用缓存: {e}")
+    finally:
+        _refreshing.discard(path)
@@ -0,0 +1,214 @@
+"""
+进程内指标：Prometheus 文本格式，从本地 HTTP 端口 /metrics 抓取。
+
+- Counter / Gauge 在热路径上更新，一次只是按标签取值的字典加法；
+- 持仓、挂单、最新价这类本来就在机器人身上的状态不重复记录，抓取时由注册的 collector 现读；
+- 延迟分位数来自 latency.recorder（当前统计周期内的分布）。
+
+用法::
+
+    REST_REQUESTS.inc("create_order", "ok")
+    registry.register(bot.metric_samples)
+    await MetricsServer(registry, port).start()
+"""
+import asyncio
+import logging
+import time
+
+import latency
+
+logger = logging.getLogger()
+
+METRICS_HOST = "127.0.0.1"  # 只在本机暴露
+LOOP_LAG_INTERVAL = 0.5  # 事件循环延迟采样间隔（秒）
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """一个指标名下按标签值区分的一组数值"""
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # 标签值元组 -> 数值
+
+    def samples(self):
+        for values, value in self.values.items():
+            yield self.name, dict(zip(self.labels, values)), value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        values = self.values
+        values[label_values] = values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, *label_values):
+        self.values[label_values] = value
+
+
+class Registry:
+    """指标和抓取时调用的 collector"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []  # 抓取时调用的函数
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def register(self, collect):
+        """collect() 返回 [(指标名, 类型, 说明, [(样本名, 标签 dict, 数值)])]，每次抓取时调用"""
+        self.collectors.append(collect)
+
+    def unregister(self, collect):
+        self.collectors.remove(collect)
+
+    def render(self):
+        """Prometheus 文本格式（0.0.4）"""
+        families = {}  # 指标名 -> (类型, 说明, [(样本名, 标签 dict, 数值)])
+        for metric in self.metrics.values():
+            families[metric.name] = (metric.kind, metric.help, list(metric.samples()))
+        for collect in self.collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                logger.warning(f"指标采集失败: {e}")
+                continue
+            for name, kind, help_text, samples in collected:
+                families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                if value is None:
+                    continue
+                names = tuple(labels)
+                lines.append(f"{sample_name}{_format_labels(names, [labels[n] for n in names])} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()  # 进程内共用
+
+REST_REQUESTS = registry.counter("grid_rest_requests_total", "REST 调用次数", ("method", "result"))
+ORDER_REJECTS = registry.counter("grid_order_rejects_total", "被交易所拒绝的下单/改单", ("method", "reason"))
+READS_SHARED = registry.counter("grid_rest_reads_shared_total", "与并发或刚完成的相同读请求共用结果的次数",
+                                ("method",))
+LOOP_LAG = registry.gauge("grid_event_loop_lag_seconds", "事件循环调度延迟（最近一次采样）")
+LOOP_LAG_MAX = registry.gauge("grid_event_loop_lag_max_seconds", "事件循环调度延迟（启动以来最大）")
+
+
+def latency_samples():
+    """按 Prometheus summary 导出：分位数是 latency.recorder 当前统计周期的，_count/_sum 是启动以来累计的"""
+    name = "grid_latency_seconds"
+    recorder = latency.recorder
+    samples = []
+    for stage, histogram in sorted(recorder.histograms.items()):
+        if histogram.count:
+            for percent in latency.REPORT_PERCENTILES:
+                samples.append((name, {"stage": stage, "quantile": f"{percent / 100:g}"},
+                                histogram.percentile(percent) / 1e6))
+        count, total = recorder.totals(stage)
+        samples.append((name + "_count", {"stage": stage}, count))
+        samples.append((name + "_sum", {"stage": stage}, total / 1e6))
+    return [(name, "summary", "行情到下单链路各环节的延迟", samples)]
+
+
+registry.register(latency_samples)
+
+
+def stream_samples(adapter):
+    """推流连接统计（重连次数、断流时长），一个适配器注册一次"""
+    def collect():
+        links = [("primary", adapter.stream_stats)]
+        links += [(link.url, link.stream_stats) for link in adapter.standby_links]
+        families = []
+        for name, attr, help_text in (("grid_stream_reconnects_total", "disconnects", "推流断开重连次数"),
+                                      ("grid_stream_stale_closes_total", "stale_closes", "因假死主动断开的次数"),
+                                      ("grid_stream_downtime_seconds_total", "downtime", "累计断流时长")):
+            samples = [(name, {"exchange": adapter.exchange.id, "link": link}, getattr(stats, attr))
+                       for link, stats in links]
+            families.append((name, "counter", help_text, samples))
+        return families
+    return collect
+
+
+async def loop_lag_probe(interval=LOOP_LAG_INTERVAL):
+    """定时 sleep，实际醒来比预期晚多少就是事件循环被占用的时长"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        LOOP_LAG.set(lag)
+        if lag > LOOP_LAG_MAX.values.get((), 0):
+            LOOP_LAG_MAX.set(lag)
+
+
+class MetricsServer:
+    """最小的 HTTP 服务：GET /metrics 返回 registry.render()"""
+
+    def __init__(self, registry, port, host=METRICS_HOST):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.server = None
+
+    async def start(self):
+        try:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        except OSError as e:
+            logger.warning(f"指标端口 {self.host}:{self.port} 监听失败，不提供指标: {e}")
+            return None
+        self.port = self.server.sockets[0].getsockname()[1]  # port=0 时取实际分配的端口
+        logger.info(f"指标地址: http://{self.host}:{self.port}/metrics")
+        return self.server
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # 忽略请求头
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"指标请求处理失败: {e}")
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
@@ -0,0 +1,185 @@
+"""
+多交易对网格：一个进程、一个事件循环同时跑同一交易所的多个币种。
+
+所有交易对共用一个 ccxt 实例（市场数据只加载一次）、一个 REST 连接池和一组推流连接：Binance 用一条组合流
+（/stream?streams=a@bookTicker/b@bookTicker/<listenKey>），OKX 一条订阅消息带多个 instId，Gate 每个频道
+一条订阅消息带多个合约。推流事件按交易对分发给各自的机器人，每个交易对只多占一份策略状态。
+
+运行: python multi_grid.py（交易所和交易对在下面配置，API Key 等沿用对应单币种脚本的配置）
+"""
+import asyncio
+import importlib
+import logging
+import time
+
+import latency
+import metrics
+from log_setup import setup_logging
+from loop_watchdog import LoopWatchdog
+from snapshot import SNAPSHOT_INTERVAL, SnapshotStore
+from ws_events import BalanceUpdate, BookTicker, EventDispatcher, MarketDataDedup, OrderUpdate, PositionUpdate, Ticker
+from ws_supervisor import StreamSupervisor
+
+logger = logging.getLogger()
+
+# ==================== 配置 ====================
+EXCHANGE = "binance"  # binance / okx / gate
+# (交易币种, 网格间距, 初始交易数量)
+SYMBOLS = [
+    ("XRP", 0.001, 3),
+    ("DOGE", 0.002, 50),
+]
+METRICS_PORT = 0  # 本地指标端口（Prometheus 格式，http://127.0.0.1:端口/metrics），0 为不开启
+LOOP_WATCHDOG = False  # 监控事件循环阻塞，定期在日志里输出阻塞最久的调用点排行
+SCRIPTS = {"binance": "grid_BN_XRP", "okx": "grid_OK_XRP", "gate": "grid_188_ws4_X"}  # 各交易所的单币种脚本
+
+
+def new_bot(exchange_name, coin_name, grid_spacing, initial_quantity, **shared):
+    """用单币种脚本的配置创建一个交易对的机器人，shared 为共用的 exchange / rest"""
+    script = importlib.import_module(SCRIPTS[exchange_name])
+    if exchange_name == "okx":
+        return script.GridTradingBot(script.API_KEY, script.API_SECRET, script.PASSPHRASE, coin_name,
+                                     script.CONTRACT_TYPE, grid_spacing, initial_quantity, script.LEVERAGE, **shared)
+    if exchange_name == "gate":
+        return script.GridTradingBot(script.API_KEY, script.API_SECRET, coin_name, grid_spacing, initial_quantity,
+                                     script.LEVERAGE, **shared)
+    return script.GridTradingBot(script.API_KEY, script.API_SECRET, coin_name, script.CONTRACT_TYPE, grid_spacing,
+                                 initial_quantity, script.LEVERAGE, **shared)
+
+
+class MultiGridManager:
+    """在一组共享推流连接上驱动多个 GridCore"""
+
+    def __init__(self, bots):
+        """bots 为共用同一个 exchange / rest 的机器人，第一个机器人的适配器负责推流连接"""
+        self.bots = {bot.ws_symbol: bot for bot in bots}  # ws 交易对 -> 机器人
+        lead = bots[0]
+        self.adapter = lead.adapter
+        self.rest = lead.rest
+        self.sync_time = lead.sync_time
+        self.order_sync_time = lead.order_sync_time
+        self.snapshots = SnapshotStore()  # 所有交易对共用一个快照文件，每个交易对一行
+        for bot in bots:
+            bot.snapshots = self.snapshots
+
+        # 帧只解析一次，按事件里的交易对路由到对应机器人
+        self.dispatcher = EventDispatcher(self.adapter.parser)
+        self.dispatcher.on(BookTicker, self.route('handle_book_ticker_update'))
+        self.dispatcher.on(Ticker, self.route('handle_ticker_update'))
+        self.dispatcher.on(OrderUpdate, self.route('handle_order_update'))
+        self.dispatcher.on(PositionUpdate, self.route('handle_position_update'))
+        self.dispatcher.on(BalanceUpdate, self.broadcast_balance)
+        self.dedup = None  # 有热备行情连接时，同一条行情只用最先到达的
+        if self.adapter.standby_links:
+            self.dedup = MarketDataDedup()
+            self.dispatcher.filter = self.dedup.accept
+        self.loop_watchdog = LoopWatchdog() if LOOP_WATCHDOG else None
+        self.routed = 0  # 已分发的事件数
+        self.unrouted = 0  # 不属于任何已配置交易对的事件数
+
+    @classmethod
+    def from_config(cls, exchange_name, symbols):
+        """symbols 为 [(coin_name, grid_spacing, initial_quantity)]，第一个机器人创建交易所实例并做账户检查"""
+        lead = new_bot(exchange_name, *symbols[0])
+        bots = [lead] + [new_bot(exchange_name, *symbol, exchange=lead.exchange, rest=lead.rest)
+                         for symbol in symbols[1:]]
+        return cls(bots)
+
+    def route(self, handler_name):
+        async def handler(event):
+            bot = self.bots.get(event.symbol)
+            if bot is None:
+                self.unrouted += 1
+                return
+            self.routed += 1
+            await getattr(bot, handler_name)(event)
+        return handler
+
+    async def broadcast_balance(self, balance):
+        # 余额是账户级的，每个机器人都记一份
+        for bot in self.bots.values():
+            await bot.handle_balance_update(balance)
+
+    # ==================== 对账 ====================
+    async def reconcile_positions(self):
+        """一次持仓请求对账所有交易对"""
+        since_ms = int(time.time() * 1000)
+        sizes = await self.adapter.position_sizes()
+        for bot in self.bots.values():
+            bot.apply_position_sizes(sizes, since_ms)
+
+    async def resync(self):
+        """推流重连后对账所有交易对，再各跑一轮策略"""
+        await asyncio.gather(self.reconcile_positions(), *(bot.check_orders_status() for bot in self.bots.values()))
+        for bot in self.bots.values():
+            bot.scheduler.request("resync")
+
+    async def reconcile_state(self):
+        """后台对账：持仓每 sync_time 秒一次请求覆盖全部交易对，挂单每 order_sync_time 秒按交易对并发请求"""
+        last_orders_sync = time.time()
+        while True:
+            await asyncio.sleep(self.sync_time)
+            try:
+                await self.reconcile_positions()
+                if time.time() - last_orders_sync > self.order_sync_time:
+                    await asyncio.gather(*(bot.check_orders_status() for bot in self.bots.values()))
+                    last_orders_sync = time.time()
+            except Exception as e:
+                logger.error(f"状态对账失败: {e}")
+
+    async def snapshot_loop(self):
+        """定期保存所有交易对的状态快照"""
+        while True:
+            await asyncio.sleep(SNAPSHOT_INTERVAL)
+            for bot in self.bots.values():
+                await bot.save_snapshot()
+
+    # ==================== 运行 ====================
+    async def run(self):
+        await asyncio.gather(*(bot.prepare() for bot in self.bots.values()))
+        logger.info(f"多交易对网格启动: {list(self.bots)}")
+        asyncio.create_task(self.reconcile_state())
+        asyncio.create_task(self.snapshot_loop())
+        asyncio.create_task(latency.recorder.report_loop())
+        if self.loop_watchdog is not None:
+            asyncio.create_task(self.loop_watchdog.run())
+        if METRICS_PORT:
+            await self.start_metrics()
+        for task in self.adapter.background_tasks():
+            asyncio.create_task(task)
+
+        for link in self.adapter.standby_links:
+            asyncio.create_task(StreamSupervisor(self.adapter, self.dispatcher, list(self.bots), link=link).run())
+        await StreamSupervisor(self.adapter, self.dispatcher, list(self.bots), self.resync).run()
+
+    async def start_metrics(self):
+        """每个交易对一组策略指标，推流指标只注册一次"""
+        for bot in self.bots.values():
+            metrics.registry.register(bot.metric_samples)
+        metrics.registry.register(metrics.stream_samples(self.adapter))
+        if self.loop_watchdog is None:
+            asyncio.create_task(metrics.loop_lag_probe())  # 开了 loop_watchdog 时由它更新循环延迟
+        await metrics.MetricsServer(metrics.registry, METRICS_PORT).start()
+
+    def stats(self):
+        return {
+            "symbols": len(self.bots),
+            "routed": self.routed,
+            "unrouted": self.unrouted,
+            "round_trips": sum(bot.batcher.round_trips for bot in self.bots.values()),
+            "stream": dict(self.adapter.stream_stats.as_dict(), **self.adapter.health()),
+            "dedup": self.dedup.stats() if self.dedup is not None else None,
+            "latency": latency.recorder.summary(),
+            "rate_limit": self.rest.limiter.stats() if self.rest.limiter is not None else None,
+            "reads": {"sent": self.rest.reads_sent, "shared": self.rest.reads_shared},
+        }
+
+
+async def main():
+    manager = MultiGridManager.from_config(EXCHANGE, SYMBOLS)
+    await manager.run()
+
+
+if __name__ == "__main__":
+    setup_logging("multi_grid")
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+本地挂单索引：由私有订单推流维护，REST 只做低频对账，策略直接查询本地索引。
+"""
+from collections import OrderedDict
+
+from ws_events import OrderUpdate
+
+CLOSED_IDS_CAPACITY = 1000  # 记住最近结束的订单 id，丢弃迟到的 NEW 推送
+TERMINAL_STATUS = ("filled", "canceled")
+
+
+class OpenOrderBook:
+    """按订单 id 和 (side, position_side, reduce_only, price) 索引的挂单簿"""
+
+    def __init__(self):
+        self.orders = {}  # order_id -> OrderUpdate
+        self.by_key = {}  # (side, position_side, reduce_only, price) -> {order_id: OrderUpdate}
+        self.closed = OrderedDict()  # 最近结束的订单 id
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(list(self.orders.values()))
+
+    def get(self, order_id):
+        return self.orders.get(order_id)
+
+    @staticmethod
+    def _key(order):
+        return order.side, order.position_side, order.reduce_only, order.price
+
+    def _add(self, order):
+        old = self.orders.get(order.order_id)
+        if old is not None:
+            self._discard(old)
+        self.orders[order.order_id] = order
+        self.by_key.setdefault(self._key(order), {})[order.order_id] = order
+
+    def _discard(self, order):
+        self.orders.pop(order.order_id, None)
+        key = self._key(order)
+        bucket = self.by_key.get(key)
+        if bucket is not None:
+            bucket.pop(order.order_id, None)
+            if not bucket:
+                del self.by_key[key]
+
+    def _mark_closed(self, order_id):
+        self.closed[order_id] = None
+        if len(self.closed) > CLOSED_IDS_CAPACITY:
+            self.closed.popitem(last=False)
+
+    def apply(self, order):
+        """应用一条订单更新（推流、下单回执或撤单回执）"""
+        if order.status in TERMINAL_STATUS:
+            old = self.orders.get(order.order_id)
+            if old is not None:
+                self._discard(old)
+            self._mark_closed(order.order_id)
+        elif order.order_id not in self.closed:
+            self._add(order)
+
+    def remove(self, order_id):
+        """撤单成功或订单已不存在时移除"""
+        order = self.orders.get(order_id)
+        if order is not None:
+            self._discard(order)
+        self._mark_closed(order_id)
+
+    def replace_all(self, orders, since_ms=0):
+        """用 REST 快照覆盖本地索引，返回 (新增数, 移除数)
+
+        快照请求发出后才出现的本地挂单（ts >= since_ms）保留，避免和推流赛跑时误删。
+        """
+        snapshot = {order.order_id: order for order in orders if order.order_id not in self.closed}
+        removed = 0
+        for order in list(self.orders.values()):
+            if order.order_id not in snapshot and order.ts < since_ms:
+                self._discard(order)
+                removed += 1
+        added = sum(1 for order_id in snapshot if order_id not in self.orders)
+        for order in snapshot.values():
+            self._add(order)
+        return added, removed
+
+    def find(self, side, position_side, reduce_only=None):
+        """查询某一类挂单"""
+        return [order for order in self.orders.values()
+                if order.side == side and order.position_side == position_side
+                and (reduce_only is None or order.reduce_only == reduce_only)]
+
+    def has_price(self, side, position_side, reduce_only, price):
+        """是否已有相同价格的挂单"""
+        return (side, position_side, reduce_only, price) in self.by_key
+
+    def remaining(self, side, position_side):
+        """某一类挂单的剩余数量合计"""
+        return sum(order.amount - order.filled for order in self.orders.values()
+                   if order.side == side and order.position_side == position_side)
+
+
+def new_order(symbol, order_id, side, position_side, reduce_only, price, amount, ts):
+    """根据下单参数构造一条 NEW 状态的订单记录（下单回执字段不全时使用）"""
+    return OrderUpdate(symbol, str(order_id), side, position_side, reduce_only, "new", price, amount, 0.0, ts)
@@ -0,0 +1,257 @@
+"""
+批量下单/撤单：优先使用交易所原生批量接口，没有时并发逐单调用；撤旧挂新失败时回滚，网格不留半更新状态。
+支持改单的交易所优先原地改价，保留排队位置。
+"""
+import asyncio
+import logging
+
+import ccxt
+
+from metrics import ORDER_REJECTS
+
+logger = logging.getLogger()
+
+# 单次批量请求的订单数上限: exchange.id -> (下单, 撤单)
+BATCH_LIMITS = {
+    "binance": (5, 10),  # POST/DELETE /fapi/v1/batchOrders
+    "okx": (20, 20),  # batch-orders / cancel-batch-orders
+    "gate": (10, 20),  # /futures/{settle}/batch_orders
+}
+DEFAULT_BATCH_LIMIT = (1, 1)
+
+# 批量撤单里表示“订单已成交或已撤销”的错误码，等同于撤单成功
+ORDER_GONE_CODES = {
+    "-2011",  # Binance: Unknown order sent
+    "51400", "51401", "51402",  # OKX: 订单不存在 / 已撤销 / 已完成
+    "ORDER_NOT_FOUND", "ORDER_FINISHED",  # Gate
+}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _accepted(order):
+    """批量接口部分失败时，失败项被 ccxt 解析成 status=rejected 且没有 id"""
+    return bool(order and order.get("id")) and order.get("status") != "rejected"
+
+
+def pair_orders(current, targets):
+    """按 (side, reduce_only) 把现有挂单和目标挂单一一配对
+
+    返回 (与 targets 对齐的现有订单或 None, 没配上的现有订单)。
+    部分成交的订单不参与配对：各交易所改单数量的语义不一致，直接撤掉重挂。
+    """
+    pool = [order for order in current if not order.filled]
+    leftover = [order for order in current if order.filled]
+    paired = []
+    for side, reduce_only in targets:
+        match = next((order for order in pool if order.side == side and order.reduce_only == reduce_only), None)
+        if match is not None:
+            pool.remove(match)
+        paired.append(match)
+    return paired, leftover + pool
+
+
+def _error_code(order):
+    info = (order or {}).get("info") or {}
+    code = info.get("code") or info.get("sCode") or info.get("label")
+    return None if code is None else str(code)
+
+
+class ReplaceResult:
+    """撤旧挂新的结果
+
+    canceled: 已确认撤掉（或已不存在）的订单 id
+    created: 与下单请求一一对应的 ccxt 订单（新挂出或改单后的），失败、被回滚或无需改动的为 None
+    ok: 撤单全部成功且新单全部挂上
+    """
+    __slots__ = ("canceled", "created", "ok")
+
+    def __init__(self, canceled, created, ok):
+        self.canceled = canceled
+        self.created = created
+        self.ok = ok
+
+
+class OrderBatcher:
+    """基于 AsyncExchange 的批量下单/撤单
+
+    下单请求沿用 ccxt create_orders 的格式: {symbol, type, side, amount, price, params}
+    """
+
+    def __init__(self, rest):
+        self.rest = rest
+        exchange = rest.exchange
+        self.create_limit, self.cancel_limit = BATCH_LIMITS.get(exchange.id, DEFAULT_BATCH_LIMIT)
+        self.native_create = bool(exchange.has.get("createOrders")) and self.create_limit > 1
+        self.native_cancel = bool(exchange.has.get("cancelOrders")) and self.cancel_limit > 1
+        self.native_amend = bool(exchange.has.get("editOrder"))
+        self.round_trips = 0  # 累计 REST 往返次数，观察批量效果用
+        # 改单统计：按订单计的请求数，和逐单撤单重挂相比
+        self.amend_steps = 0  # 走改单的网格刷新次数
+        self.replace_steps = 0  # 走撤单重挂的网格刷新次数
+        self.requests_saved = 0  # 累计少发的请求数
+        self.last_requests_saved = 0  # 最近一次网格刷新少发的请求数
+
+    async def create(self, requests):
+        """批量下单，返回与 requests 对齐的订单列表，失败项为 None"""
+        if not requests:
+            return []
+        if self.native_create and len(requests) > 1:
+            chunks = list(_chunks(requests, self.create_limit))
+            results = await asyncio.gather(*(self._create_chunk(chunk) for chunk in chunks))
+            return [order for chunk in results for order in chunk]
+        results = await asyncio.gather(*(self._create_one(request) for request in requests))
+        return list(results)
+
+    async def _create_chunk(self, chunk):
+        self.round_trips += 1
+        try:
+            orders = await self.rest.create_orders(chunk)
+        except ccxt.BaseError as e:
+            # 整批失败（含超时）：状态未知的订单交给定时对账处理
+            logger.error(f"批量下单失败: {e}")
+            return [None] * len(chunk)
+        created = []
+        for request, order in zip(chunk, orders):
+            if _accepted(order):
+                created.append(order)
+            else:
+                logger.error(f"批量下单部分失败: {request['side']} {request['amount']} @ {request['price']}, "
+                             f"{(order or {}).get('info')}")
+                ORDER_REJECTS.inc("create_orders", _error_code(order) or "rejected")
+                created.append(None)
+        return created
+
+    async def _create_one(self, request):
+        self.round_trips += 1
+        try:
+            return await self.rest.create_order(request["symbol"], request["type"], request["side"],
+                                                request["amount"], request["price"], request.get("params", {}))
+        except ccxt.BaseError as e:
+            logger.error(f"下单报错: {e}")
+            return None
+
+    async def cancel(self, symbol, order_ids):
+        """批量撤单，返回 (已撤掉或已不存在的 id 列表, 撤单失败的 id 列表)"""
+        if not order_ids:
+            return [], []
+        if self.native_cancel and len(order_ids) > 1:
+            chunks = list(_chunks(order_ids, self.cancel_limit))
+            results = await asyncio.gather(*(self._cancel_chunk(symbol, chunk) for chunk in chunks))
+        else:
+            results = await asyncio.gather(*(self._cancel_one(symbol, order_id) for order_id in order_ids))
+        gone, failed = [], []
+        for chunk_gone, chunk_failed in results:
+            gone.extend(chunk_gone)
+            failed.extend(chunk_failed)
+        return gone, failed
+
+    async def _cancel_chunk(self, symbol, chunk):
+        self.round_trips += 1
+        try:
+            orders = await self.rest.cancel_orders(chunk, symbol)
+        except ccxt.BaseError as e:
+            logger.error(f"批量撤单失败: {e}")
+            return [], list(chunk)
+        gone, failed = [], []
+        for order_id, order in zip(chunk, orders):
+            if _accepted(order) or _error_code(order) in ORDER_GONE_CODES:
+                gone.append(order_id)
+            else:
+                logger.error(f"撤单失败: {order_id}, {(order or {}).get('info')}")
+                failed.append(order_id)
+        return gone, failed
+
+    async def _cancel_one(self, symbol, order_id):
+        self.round_trips += 1
+        try:
+            await self.rest.cancel_order(order_id, symbol)
+        except ccxt.OrderNotFound:
+            pass
+        except ccxt.BaseError as e:
+            logger.error(f"撤单失败: {order_id}, {e}")
+            return [], [order_id]
+        return [order_id], []
+
+    async def replace(self, symbol, cancel_ids, requests):
+        """撤掉 cancel_ids 后挂出 requests
+
+        撤单有失败时不再挂新单，避免同一方向叠加两套挂单；新单部分失败时撤回已挂上的，
+        让这一侧整体回到“无挂单”，由下一次策略循环重新铺单。
+        """
+        canceled, failed = await self.cancel(symbol, cancel_ids)
+        if failed:
+            return ReplaceResult(canceled, [None] * len(requests), False)
+
+        created = await self.create(requests)
+        if all(order is not None for order in created):
+            return ReplaceResult(canceled, created, True)
+
+        placed = [order["id"] for order in created if order is not None]
+        if placed:
+            logger.warning(f"新挂单部分失败，回滚已挂出的 {len(placed)} 个订单")
+            rolled_back, stuck = await self.cancel(symbol, placed)
+            rolled_back = set(rolled_back)
+            canceled.extend(rolled_back)
+            created = [order if order is not None and order["id"] not in rolled_back else None
+                       for order in created]
+            if stuck:
+                logger.error(f"回滚撤单失败，订单 {stuck} 仍在挂单，等待对账处理")
+        return ReplaceResult(canceled, created, False)
+
+    async def amend(self, symbol, order_id, request):
+        """原地修改订单价格和数量，失败返回 None"""
+        self.round_trips += 1
+        try:
+            order = await self.rest.edit_order(order_id, symbol, request["type"], request["side"],
+                                               request["amount"], request["price"])
+        except ccxt.BaseError as e:
+            logger.warning(f"改单失败: {order_id}, {e}")
+            return None
+        if not order.get("id"):
+            order["id"] = order_id
+        return order
+
+    async def amend_or_replace(self, symbol, paired, leftover_ids, requests):
+        """网格刷新：配上对的挂单原地改价，其余撤单/新挂
+
+        paired 为与 requests 对齐的现有订单（OrderUpdate）或 None，leftover_ids 为需要撤掉的多余挂单。
+        任一改单失败时退回整侧撤单重挂，保证这一侧不会一半新价一半旧价。
+        """
+        paired_ids = [order.order_id for order in paired if order is not None]
+        baseline = len(paired_ids) + len(leftover_ids) + len(requests)  # 逐单撤掉再挂的请求数
+        if not self.native_amend or not paired_ids:
+            result = await self.replace(symbol, paired_ids + leftover_ids, requests)
+            self._record_step(False, baseline, baseline)
+            return result
+
+        jobs = [(i, order, request) for i, (order, request) in enumerate(zip(paired, requests))
+                if order is not None and (order.price != request["price"] or order.amount != request["amount"])]
+        amended = await asyncio.gather(*(self.amend(symbol, order.order_id, request) for _, order, request in jobs))
+        if any(order is None for order in amended):
+            result = await self.replace(symbol, paired_ids + leftover_ids, requests)
+            self._record_step(False, baseline, len(jobs) + baseline)
+            return result
+
+        fresh = [request for order, request in zip(paired, requests) if order is None]
+        result = await self.replace(symbol, leftover_ids, fresh)
+        created = iter(result.created)
+        merged = [None if order is not None else next(created) for order in paired]
+        for (i, _, _), order in zip(jobs, amended):
+            merged[i] = order
+        self._record_step(True, baseline, len(jobs) + len(leftover_ids) + len(fresh))
+        return ReplaceResult(result.canceled, merged, result.ok)
+
+    def _record_step(self, amended, baseline, sent):
+        saved = baseline - sent
+        if amended:
+            self.amend_steps += 1
+        else:
+            self.replace_steps += 1
+        self.last_requests_saved = saved
+        self.requests_saved += saved
+        logger.info(f"网格刷新: {'改单' if amended else '撤单重挂'}, 请求 {sent} 次, 比撤单重挂少 {saved} 次"
+                    f"（累计少 {self.requests_saved} 次, 改单 {self.amend_steps} 次/重挂 {self.replace_steps} 次）")
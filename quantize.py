@@ -0,0 +1,146 @@
+"""
+价格/数量量化：按交易所规格（tick、step、最小下单量、最小名义价值、合约乘数）把价格和数量对齐成交易所接受的值。
+
+价格和数量在内部换成整数 tick / step 计算，取整方向明确，不受 round(x, 小数位) 的两个问题影响：
+tick 不是 10 的整数次幂（如 0.0005）时按小数位取整会得到无效价格；Gate 这类按张下单的合约，
+最小名义价值要乘上合约乘数才能判断。每个交易对的规格从 ccxt 市场数据解析一次后缓存。
+"""
+import math
+from decimal import Decimal
+
+from ccxt.base.decimal_to_precision import DECIMAL_PLACES, TICK_SIZE
+
+EPSILON = 1e-9  # 浮点除法的尾差容忍（以 tick / step 为单位）
+
+_specs = {}  # (交易所 id, 交易对) -> MarketSpec
+
+
+def tick_digits(tick):
+    """tick 的小数位数（0.0005 -> 4），用于把 tick 整数倍换回不带浮点尾差的 float"""
+    return max(0, -Decimal(repr(float(tick))).normalize().as_tuple().exponent)
+
+
+def precision_step(precision, precision_mode=None):
+    """ccxt 的精度转成最小变动：TICK_SIZE 模式下原样返回，DECIMAL_PLACES 模式下小数位数 4 转成 0.0001
+
+    不知道精度模式时按类型猜：float 当作最小变动，int 当作小数位数。
+    """
+    if precision is None:
+        raise ValueError("市场数据缺少精度")
+    if precision_mode == TICK_SIZE:
+        return float(precision)
+    if precision_mode == DECIMAL_PLACES or isinstance(precision, int):
+        return 10.0 ** -int(precision)
+    if isinstance(precision, float):
+        return precision
+    raise ValueError(f"未知的精度类型: {precision}")
+
+
+class MarketSpec:
+    """一个交易对的下单规格，价格以 tick、数量以 step 为单位做整数运算"""
+    __slots__ = ("symbol", "tick", "step", "min_amount", "min_notional", "contract_size", "price_digits",
+                 "amount_digits", "min_amount_steps")
+
+    def __init__(self, symbol, tick, step, min_amount=None, min_notional=None, contract_size=1.0):
+        self.symbol = symbol
+        self.tick = tick  # 价格最小变动
+        self.step = step  # 数量最小变动（合约为张数步长）
+        self.min_amount = min_amount or 0.0  # 最小下单数量
+        self.min_notional = min_notional or 0.0  # 最小名义价值（计价货币）
+        self.contract_size = contract_size or 1.0  # 合约乘数：1 张对应的币数
+        self.price_digits = tick_digits(tick)
+        self.amount_digits = tick_digits(step)
+        self.min_amount_steps = max(1, math.ceil(self.min_amount / step - EPSILON))  # 最小下单数量对应的 step 数
+
+    @classmethod
+    def from_market(cls, market, precision_mode=None):
+        """从 ccxt 市场数据解析
+
+        Binance 的 ccxt 精度是小数位数（tickSize 0.0005 会变成 4 位），有原始 filters 时以 filters 为准。
+        """
+        limits = market.get("limits") or {}
+        tick = precision_step(market["precision"]["price"], precision_mode)
+        step = precision_step(market["precision"]["amount"], precision_mode)
+        min_amount = (limits.get("amount") or {}).get("min")
+        min_notional = (limits.get("cost") or {}).get("min")
+        filters = {f.get("filterType"): f for f in (market.get("info") or {}).get("filters") or ()}
+        if "PRICE_FILTER" in filters:
+            tick = float(filters["PRICE_FILTER"]["tickSize"])
+        if "LOT_SIZE" in filters:
+            step = float(filters["LOT_SIZE"]["stepSize"])
+            min_amount = float(filters["LOT_SIZE"]["minQty"])
+        notional = filters.get("MIN_NOTIONAL") or filters.get("NOTIONAL") or {}
+        if notional.get("notional") or notional.get("minNotional"):
+            min_notional = float(notional.get("notional") or notional.get("minNotional"))
+        return cls(market.get("symbol"), tick, step, min_amount, min_notional, market.get("contractSize"))
+
+    def __repr__(self):
+        return (f"MarketSpec({self.symbol}, tick={self.tick}, step={self.step}, min_amount={self.min_amount}, "
+                f"min_notional={self.min_notional}, contract_size={self.contract_size})")
+
+    # ==================== 价格 ====================
+    def price_to_ticks(self, price, rounding='nearest'):
+        """价格 -> 整数 tick，rounding 为 nearest / down / up"""
+        x = price / self.tick
+        if rounding == 'down':
+            return math.floor(x + EPSILON)
+        if rounding == 'up':
+            return math.ceil(x - EPSILON)
+        return math.floor(x + 0.5)
+
+    def ticks_to_price(self, ticks):
+        return round(ticks * self.tick, self.price_digits)
+
+    def round_price(self, price, rounding='nearest'):
+        """对齐到 tick 的价格"""
+        if rounding == 'nearest':  # 下单热路径，省掉两次方法调用
+            return round(math.floor(price / self.tick + 0.5) * self.tick, self.price_digits)
+        return self.ticks_to_price(self.price_to_ticks(price, rounding))
+
+    def on_tick(self, price):
+        """价格是否正好落在 tick 上"""
+        x = price / self.tick
+        return abs(x - round(x)) < EPSILON * max(1.0, abs(x))
+
+    # ==================== 数量 ====================
+    def amount_to_steps(self, amount, rounding='nearest'):
+        """数量 -> 整数 step，rounding 为 nearest / down / up"""
+        x = amount / self.step
+        if rounding == 'down':
+            return math.floor(x + EPSILON)
+        if rounding == 'up':
+            return math.ceil(x - EPSILON)
+        return math.floor(x + 0.5)
+
+    def steps_to_amount(self, steps):
+        return round(steps * self.step, self.amount_digits)
+
+    def min_steps(self, price=None):
+        """满足最小下单数量和（给出价格时）最小名义价值的最少 step 数"""
+        steps = self.min_amount_steps
+        if price and self.min_notional:
+            steps = max(steps, math.ceil(self.min_notional / (price * self.contract_size * self.step) - EPSILON))
+        return steps
+
+    def round_amount(self, amount, price=None):
+        """对齐到 step 并确保不低于最小下单数量 / 最小名义价值"""
+        steps = max(math.floor(amount / self.step + 0.5), self.min_steps(price))
+        return round(steps * self.step, self.amount_digits)
+
+    def on_step(self, amount):
+        """数量是否正好是 step 的整数倍"""
+        x = amount / self.step
+        return abs(x - round(x)) < EPSILON * max(1.0, abs(x))
+
+    def notional(self, price, amount):
+        """名义价值（计价货币）"""
+        return price * amount * self.contract_size
+
+
+def market_spec(exchange, market):
+    """交易对规格，每个交易所的每个交易对只解析一次"""
+    key = (exchange.id, market["symbol"])
+    spec = _specs.get(key)
+    if spec is None:
+        spec = _specs[key] = MarketSpec.from_market(market, getattr(exchange, "precisionMode", None))
+    return spec
@@ -0,0 +1,204 @@
+"""
+客户端限速：按交易所公布的权重/频率限制给每种 REST 调用记账，超预算前在本地排队，而不是等交易所回 429 或封 IP。
+
+- 每个交易所若干令牌桶（容量, 窗口秒），每个方法在一个或多个桶上扣令牌；批量接口按订单数扣；
+- 下单、撤单、改单是高优先级，读接口（挂单、持仓、余额等）是低优先级：低优先级只能用到桶里超出
+  LOW_PRIORITY_RESERVE 的部分，预算紧张时读请求延后，留给下单撤单；
+- 收到 429/418（ccxt.RateLimitExceeded / DDoSProtection）时只清空这次请求扣费的那些桶，之后用到这些桶的请求
+  等令牌按正常速度补回再发；交易所给了 Retry-After 时，这些桶在这段时间内完全不放行。读请求被限速不影响
+  下单撤单专用的桶（如 Binance 的下单数、OKX 的撤单）；
+- 各桶剩余令牌作为指标导出。
+
+限额按交易所文档取了保守值，多个进程共用同一个 IP 或账户时需要按进程数调小。
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger()
+
+LOW_PRIORITY_RESERVE = 0.2  # 每个桶留给下单撤单的比例，读请求不能用
+HIGH_PRIORITY_METHODS = {"create_order", "create_orders", "cancel_order", "cancel_orders", "edit_order"}
+PER_ORDER = None  # 扣令牌数等于这次请求里的订单数（批量接口）
+
+# exchange.id -> {"buckets": {桶: (容量, 窗口秒)}, "costs": {方法: {桶: 令牌数}}, "default": {桶: 令牌数}}
+RATE_LIMITS = {
+    # U 本位合约：IP 权重 2400/分钟，下单数 300/10 秒、1200/分钟（账户）
+    "binance": {
+        "buckets": {"weight": (2400, 60), "orders_10s": (300, 10), "orders_1m": (1200, 60)},
+        "costs": {
+            "create_order": {"weight": 1, "orders_10s": 1, "orders_1m": 1},
+            "create_orders": {"weight": 5, "orders_10s": PER_ORDER, "orders_1m": PER_ORDER},
+            "edit_order": {"weight": 1, "orders_10s": 1, "orders_1m": 1},
+            "cancel_order": {"weight": 1},
+            "cancel_orders": {"weight": 1},
+            "fetch_open_orders": {"weight": 1},  # 带交易对时权重 1
+            "fetch_positions": {"weight": 5},
+            "fetch_balance": {"weight": 5},
+            "fapiPrivatePostListenKey": {"weight": 1},
+            "fapiPrivatePutListenKey": {"weight": 1},
+        },
+        "default": {"weight": 5},
+    },
+    # OKX 按接口限速（每个 UID，2 秒窗口），批量接口按订单数
+    "okx": {
+        "buckets": {"order": (60, 2), "batch_orders": (300, 2), "cancel": (60, 2), "batch_cancel": (300, 2),
+                    "amend": (60, 2), "pending": (60, 2), "positions": (10, 2), "balance": (10, 2),
+                    "other": (10, 2)},
+        "costs": {
+            "create_order": {"order": 1},
+            "create_orders": {"batch_orders": PER_ORDER},
+            "edit_order": {"amend": 1},
+            "cancel_order": {"cancel": 1},
+            "cancel_orders": {"batch_cancel": PER_ORDER},
+            "fetch_open_orders": {"pending": 1},
+            "fetch_positions": {"positions": 1},
+            "fetch_balance": {"balance": 1},
+        },
+        "default": {"other": 1},
+    },
+    # Gate 合约：下单/撤单/改单 100 次/秒（用户），其他私有接口 150 次/10 秒
+    "gate": {
+        "buckets": {"orders": (100, 1), "private": (150, 10)},
+        "costs": {
+            "create_order": {"orders": 1},
+            "create_orders": {"orders": PER_ORDER},
+            "edit_order": {"orders": 1},
+            "cancel_order": {"orders": 1},
+            "cancel_orders": {"orders": PER_ORDER},
+        },
+        "default": {"private": 1},
+    },
+}
+
+
+def order_count(method, args):
+    """批量接口这次请求的订单数：create_orders(orders) / cancel_orders(ids, symbol)"""
+    if method in ("create_orders", "cancel_orders") and args:
+        return max(1, len(args[0]))
+    return 1
+
+
+def retry_after(headers):
+    """429/418 响应头里的 Retry-After（秒），没有或不是秒数时返回 None"""
+    if not headers:
+        return None
+    for name, value in headers.items():
+        if name.lower() == "retry-after":
+            try:
+                return max(0.0, float(value))
+            except (TypeError, ValueError):
+                return None  # HTTP 日期格式，按令牌补充速度等待
+    return None
+
+
+class TokenBucket:
+    """容量 capacity、每 window 秒补满的令牌桶"""
+    __slots__ = ("capacity", "rate", "tokens", "updated", "blocked_until")
+
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.rate = capacity / window  # 每秒补充的令牌
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # 交易所要求的 Retry-After 到期时间（monotonic）
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, reserve, now):
+        """扣 amount 个令牌、扣完至少剩 reserve 个还需要等多久（秒），0 为可以立即扣"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.refill(now)
+        short = amount + reserve - self.tokens
+        return short / self.rate if short > 0 else 0.0
+
+
+class RateLimiter:
+    """一个交易所（一个 ccxt 实例）的本地限速"""
+
+    def __init__(self, exchange_id, limits=None):
+        limits = limits or RATE_LIMITS[exchange_id]
+        self.exchange_id = exchange_id
+        self.buckets = {name: TokenBucket(capacity, window) for name, (capacity, window) in limits["buckets"].items()}
+        self.costs = limits["costs"]
+        self.default = limits["default"]
+        # 统计
+        self.deferred = 0  # 因预算不足延后的低优先级请求
+        self.delayed = 0  # 等待过的高优先级请求
+        self.wait_time = 0.0  # 累计排队时长（秒）
+        self.rate_limited = 0  # 收到的 429/418
+
+    def cost(self, method, args):
+        """[(桶, 令牌数)]，令牌数不超过桶容量"""
+        count = None
+        result = []
+        for name, amount in self.costs.get(method, self.default).items():
+            if amount is PER_ORDER:
+                count = count or order_count(method, args)
+                amount = count
+            bucket = self.buckets[name]
+            result.append((bucket, min(amount, bucket.capacity)))
+        return result
+
+    async def acquire(self, method, args=()):
+        """等到预算足够后扣掉这次请求的令牌；低优先级请求不使用保留给下单撤单的部分"""
+        high = method in HIGH_PRIORITY_METHODS
+        cost = self.cost(method, args)
+        started = None
+        while True:
+            now = time.monotonic()
+            wait = max(bucket.wait_time(amount, 0 if high else bucket.capacity * LOW_PRIORITY_RESERVE, now)
+                       for bucket, amount in cost)
+            if wait <= 0:
+                break
+            if started is None:
+                started = now
+                if high:
+                    self.delayed += 1
+                else:
+                    self.deferred += 1
+            await asyncio.sleep(wait)
+        for bucket, amount in cost:
+            bucket.tokens -= amount
+        if started is not None:
+            self.wait_time += time.monotonic() - started
+
+    def on_rate_limited(self, method, wait=None, error=None):
+        """交易所已经限速：清空这次请求扣费的桶，用到这些桶的请求等令牌补回来；wait 为 Retry-After 秒数"""
+        self.rate_limited += 1
+        now = time.monotonic()
+        names = list(self.costs.get(method, self.default))
+        for name in names:
+            bucket = self.buckets[name]
+            bucket.refill(now)
+            bucket.tokens = 0
+            if wait:
+                bucket.blocked_until = max(bucket.blocked_until, now + wait)
+        pause = f"暂停 {wait:g} 秒" if wait else "等待预算恢复"
+        logger.warning(f"{self.exchange_id} 限速（{method}）: {error}，{'/'.join(names)} {pause}")
+
+    def remaining(self):
+        """各桶当前剩余令牌"""
+        now = time.monotonic()
+        for bucket in self.buckets.values():
+            bucket.refill(now)
+        return {name: bucket.tokens for name, bucket in self.buckets.items()}
+
+    def stats(self):
+        return {"remaining": self.remaining(), "deferred": self.deferred, "delayed": self.delayed,
+                "wait_time": self.wait_time, "rate_limited": self.rate_limited}
+
+    def metric_samples(self):
+        labels = {"exchange": self.exchange_id}
+        remaining = [("grid_rate_limit_remaining", dict(labels, bucket=name), tokens)
+                     for name, tokens in self.remaining().items()]
+        return [
+            ("grid_rate_limit_remaining", "gauge", "限速桶剩余令牌", remaining),
+            ("grid_rate_limit_deferred_total", "counter", "因预算不足延后的读请求",
+             [("grid_rate_limit_deferred_total", labels, self.deferred)]),
+            ("grid_rate_limit_hits_total", "counter", "收到交易所 429/418 的次数",
+             [("grid_rate_limit_hits_total", labels, self.rate_limited)]),
+        ]
@@ -0,0 +1,119 @@
+"""
+策略状态快照：定期把每个交易对的策略状态写进本地 SQLite，重启时先恢复快照，再用 REST 只对账差量。
+
+快照包含中间价和上下网格、上次挂单时间（首单间隔和锁仓冷却据此计算）、网格阶梯的锚点、持仓和本地挂单索引。
+每个交易对一行，整行在一个事务里替换，崩溃时读到的要么是旧快照要么是新快照。内容没变化时不重写内容，
+只每 SNAPSHOT_TOUCH_INTERVAL 秒刷新一次保存时间，长时间没有成交的快照不会因为过期被丢弃。
+运行中由 save_async 在事件循环里序列化，写盘和提交放到专用的单线程里做，磁盘慢时不会卡住事件循环。
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ws_events import OrderUpdate
+
+logger = logging.getLogger()
+
+SNAPSHOT_PATH = "cache/snapshot.sqlite3"  # 快照文件
+SNAPSHOT_INTERVAL = 2  # 快照间隔（秒）
+SNAPSHOT_MAX_AGE = 3600  # 超过这个时间的快照不恢复，按冷启动处理（秒）
+SNAPSHOT_TOUCH_INTERVAL = 60  # 内容没变化时，最多隔这么久刷新一次保存时间（秒）
+SNAPSHOT_VERSION = 1  # 快照格式版本
+
+# 恢复时原样写回 GridCore 的字段：挂单时间和下单数量总是恢复，网格价格只在网格间距没改时恢复
+STRATEGY_FIELDS = ("last_long_order_time", "last_short_order_time", "long_initial_quantity", "short_initial_quantity")
+GRID_FIELDS = ("mid_price_long", "lower_price_long", "upper_price_long",
+               "mid_price_short", "lower_price_short", "upper_price_short")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    saved_at REAL NOT NULL,
+    data TEXT NOT NULL
+)
+"""
+
+
+def order_to_row(order):
+    return [getattr(order, name) for name in OrderUpdate.__slots__]
+
+
+def order_from_row(row):
+    return OrderUpdate(*row)
+
+
+class SnapshotStore:
+    """SQLite 快照存储，key 为 交易所:交易对"""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # 启动时的 load 在事件循环线程里，运行中的写盘在 executor 线程里，连接由 lock 串行使用
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+        self.db.execute("PRAGMA journal_mode=WAL")  # 写快照不阻塞读，单次提交只追加 WAL
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(SCHEMA)
+        self.db.commit()
+        self.last = {}  # key -> 上次写入的内容
+        self.saved_at = {}  # key -> 上次写入或刷新保存时间的时间
+        self.writes = 0  # 实际写盘次数
+        self.unchanged = 0  # 内容没变化跳过的次数
+
+    def save(self, key, snapshot):
+        """写入一个交易对的快照，内容和上次相同时只按 SNAPSHOT_TOUCH_INTERVAL 刷新保存时间，返回是否写了内容"""
+        return self.write(key, json.dumps(snapshot, sort_keys=True, separators=(",", ":")))
+
+    async def save_async(self, key, snapshot):
+        """在调用方（事件循环）里序列化，保证快照是同一时刻的状态；写盘交给 executor 线程"""
+        data = json.dumps(snapshot, sort_keys=True, separators=(",", ":"))
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.write, key, data)
+
+    def write(self, key, data):
+        """写入已序列化的快照（可以在任意线程调用）"""
+        now = time.time()
+        with self.lock:
+            if self.last.get(key) == data:
+                self.unchanged += 1
+                if now - self.saved_at[key] >= SNAPSHOT_TOUCH_INTERVAL:
+                    with self.db:
+                        self.db.execute("UPDATE snapshots SET saved_at = ? WHERE key = ?", (now, key))
+                    self.saved_at[key] = now
+                return False
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO snapshots (key, version, saved_at, data) VALUES (?, ?, ?, ?)",
+                                (key, SNAPSHOT_VERSION, now, data))
+            self.last[key] = data
+            self.saved_at[key] = now
+            self.writes += 1
+            return True
+
+    def load(self, key, max_age=SNAPSHOT_MAX_AGE):
+        """读取快照，返回 (保存时间, 内容)；不存在、过期或版本不符时返回 None"""
+        with self.lock:
+            row = self.db.execute("SELECT version, saved_at, data FROM snapshots WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        version, saved_at, data = row
+        if version != SNAPSHOT_VERSION:
+            logger.info(f"快照 {key} 版本不符，按冷启动处理")
+            return None
+        if time.time() - saved_at > max_age:
+            logger.info(f"快照 {key} 已超过 {max_age} 秒，按冷启动处理")
+            return None
+        try:
+            return saved_at, json.loads(data)
+        except ValueError as e:
+            logger.warning(f"快照 {key} 损坏，按冷启动处理: {e}")
+            return None
+
+    def close(self):
+        self.executor.shutdown(wait=True)  # 等在途的写盘完成
+        self.db.close()
@@ -0,0 +1,133 @@
+"""
+事件驱动的状态引擎：持仓和挂单统一由推流事件按顺序更新，REST 只做低频差量对账并记录漂移。
+"""
+import logging
+from collections import OrderedDict
+
+from open_orders import CLOSED_IDS_CAPACITY, OpenOrderBook
+
+logger = logging.getLogger()
+
+POSITION_EPSILON = 1e-9  # 持仓比较容差
+
+
+class GridState:
+    """单个交易对的持仓 + 挂单状态
+
+    排序依据是交易所给出的更新时间和订单累计成交量（两者都单调递增）：
+    时间更早或累计成交更少的事件视为过期，完全相同的视为重复，直接丢弃。
+    """
+
+    def __init__(self):
+        self.orders = OpenOrderBook()
+        self.positions = {"long": 0.0, "short": 0.0}
+        self.position_ts = {"long": 0, "short": 0}  # 最近一次持仓变动的时间（毫秒）
+        self.pushed_ts = {"long": 0, "short": 0}  # 最近一次持仓推送（绝对数量）的时间（毫秒）
+        self.progress = OrderedDict()  # order_id -> (ts, filled, status)，最近见过的订单进度
+        # 统计
+        self.stale_events = 0  # 丢弃的过期事件
+        self.duplicate_events = 0  # 丢弃的重复事件
+        self.reconciles = 0  # 对账次数
+        self.position_drifts = 0  # 对账发现的持仓偏差次数
+        self.order_drifts = 0  # 对账补充/移除的挂单数
+
+    # ==================== 查询 ====================
+    def open_total(self, side, position_side):
+        """某一类挂单的剩余数量"""
+        return self.orders.remaining(side, position_side)
+
+    # ==================== 推流事件 ====================
+    def apply_order(self, order):
+        """应用订单推送：更新挂单簿，按累计成交的增量调整持仓，返回是否被采纳"""
+        prev = self.progress.get(order.order_id)
+        prev_filled = 0.0
+        if prev is not None:
+            prev_ts, prev_filled, prev_status = prev
+            if order.ts < prev_ts or order.filled < prev_filled:
+                self.stale_events += 1
+                return False
+            if order.ts == prev_ts and order.filled == prev_filled and order.status == prev_status:
+                self.duplicate_events += 1
+                return False
+        self._remember(order.order_id, (order.ts, order.filled, order.status))
+
+        delta = order.filled - prev_filled
+        side = order.position_side
+        # 同一笔成交的持仓推送可能先到（Binance 先推 ACCOUNT_UPDATE 再推 ORDER_TRADE_UPDATE，时间相同），
+        # 绝对数量已经包含这次成交，不再叠加增量
+        if delta > 0 and self.pushed_ts[side] < order.ts:
+            # 买入开多、卖出开空增加持仓，反方向为平仓
+            opening = (order.side == "buy") == (order.position_side == "long")
+            size = self.positions[side] + delta if opening else max(0.0, self.positions[side] - delta)
+            self.positions[side] = size
+            self.position_ts[side] = max(self.position_ts[side], order.ts)
+
+        self.orders.apply(order)
+        return True
+
+    def apply_position(self, position):
+        """应用持仓推送（交易所给出的是绝对数量，比成交增量更权威）"""
+        side = position.position_side
+        if side not in self.positions:
+            return False
+        if position.ts < self.position_ts[side]:
+            self.stale_events += 1
+            return False
+        if position.ts == self.position_ts[side] and abs(position.size - self.positions[side]) < POSITION_EPSILON:
+            self.duplicate_events += 1
+            return False
+        self.positions[side] = position.size
+        self.position_ts[side] = position.ts
+        self.pushed_ts[side] = position.ts
+        return True
+
+    def track_order(self, order):
+        """本地下单回执：直接记入挂单簿，不参与推流排序（本地时钟和交易所时钟不可比）"""
+        self.orders.apply(order)
+
+    def _remember(self, order_id, progress):
+        self.progress[order_id] = progress
+        self.progress.move_to_end(order_id)
+        if len(self.progress) > CLOSED_IDS_CAPACITY:
+            self.progress.popitem(last=False)
+
+    # ==================== REST 对账 ====================
+    def reconcile_positions(self, long_size, short_size, since_ms):
+        """用 REST 持仓快照修正本地持仓，返回 {方向: 偏差}
+
+        快照请求发出后（ts >= since_ms）已有推流更新的方向以推流为准，不做修正。
+        """
+        self.reconciles += 1
+        drift = {}
+        for side, size in (("long", long_size), ("short", short_size)):
+            if self.position_ts[side] >= since_ms:
+                continue
+            local = self.positions[side]
+            if abs(local - size) > POSITION_EPSILON:
+                drift[side] = size - local
+                self.positions[side] = size
+                self.position_drifts += 1
+        if drift:
+            logger.warning(f"持仓漂移: {drift}（累计 {self.position_drifts} 次 / 对账 {self.reconciles} 次）")
+        return drift
+
+    def reconcile_orders(self, orders, since_ms):
+        """用 REST 挂单快照修正挂单簿，返回 (补充数, 移除数)"""
+        for order in orders:
+            if order.order_id not in self.progress:
+                self._remember(order.order_id, (order.ts, order.filled, order.status))
+        added, removed = self.orders.replace_all(orders, since_ms)
+        if added or removed:
+            self.order_drifts += added + removed
+            logger.warning(f"挂单漂移: 补充 {added} 个, 移除 {removed} 个（累计 {self.order_drifts} 个）")
+        return added, removed
+
+    def stats(self):
+        """状态引擎统计，用于评估推流状态的准确度"""
+        return {
+            "stale_events": self.stale_events,
+            "duplicate_events": self.duplicate_events,
+            "reconciles": self.reconciles,
+            "position_drifts": self.position_drifts,
+            "order_drifts": self.order_drifts,
+        }
@@ -0,0 +1,69 @@
+"""
+策略调度：只在有变化时执行策略，并把执行期间到达的触发合并成最多一轮待执行。
+
+行情推送不再按时间限速丢弃，最新盘口总是写入机器人；是否需要跑策略由调用方判断（价格跨过网格档位、
+成交/撤单、持仓跨过阈值、定时条件到期），触发交给 CoalescingScheduler.request。
+"""
+import asyncio
+import logging
+from collections import Counter
+
+logger = logging.getLogger()
+
+STRATEGY_MAX_IDLE = 30  # 没有任何触发时最长多久兜底执行一次策略（秒）
+MIN_WAKE_DELAY = 0.1  # 定时唤醒的最小间隔（秒）
+
+
+class CoalescingScheduler:
+    """同一时间最多一轮策略在执行、一轮在等待
+
+    执行期间到达的触发只把“待执行”标记置位，多次触发合并成一轮；这一轮结束后立即用最新状态再执行一次。
+    每轮结束后按 next_delay() 设一个定时唤醒，用于首单间隔、冷却时间这类纯时间条件。
+    """
+
+    def __init__(self, evaluate, next_delay=None):
+        self.evaluate = evaluate  # 执行一轮策略的协程函数
+        self.next_delay = next_delay  # 返回下一次定时唤醒的秒数
+        self.task = None
+        self.pending = False
+        self.timer = None
+        # 统计
+        self.triggered = 0  # 实际执行的轮数
+        self.coalesced = 0  # 被合并掉的触发
+        self.skipped = 0  # 无需执行策略的行情推送
+        self.reasons = Counter()  # 触发原因 -> 次数
+
+    def request(self, reason):
+        """请求执行一轮策略"""
+        self.reasons[reason] += 1
+        if self.task is not None and not self.task.done():
+            if self.pending:
+                self.coalesced += 1
+            self.pending = True
+            return
+        self.pending = True
+        self.task = asyncio.create_task(self._drain())
+
+    def skip(self):
+        """记录一次没有触发策略的行情推送"""
+        self.skipped += 1
+
+    async def _drain(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        while self.pending:
+            self.pending = False
+            self.triggered += 1
+            await self.evaluate()
+        if self.next_delay is not None:
+            delay = max(self.next_delay(), MIN_WAKE_DELAY)
+            self.timer = asyncio.get_running_loop().call_later(delay, self.request, "timer")
+
+    def stats(self):
+        return {
+            "triggered": self.triggered,
+            "coalesced": self.coalesced,
+            "skipped": self.skipped,
+            "reasons": dict(self.reasons),
+        }
@@ -0,0 +1,136 @@
+"""
+参数扫描：在多个进程里并行回测 GRID_SPACING / INITIAL_QUANTITY / POSITION_LIMIT / POSITION_THRESHOLD /
+ORDER_FIRST_TIME 的所有组合，结果写成 CSV（或 Parquet）表。
+
+运行:
+    python sweep.py XRP=ticks/xrp.csv DOGE=ticks/doge.csv \\
+        --spacing 0.001,0.002,0.003 --quantity 3,5 --limit 50,100 --threshold 300,500 --first-time 10 \\
+        --out sweep.csv --workers 8
+
+每个组合仍然驱动真实的策略代码（见 backtest.py），而不是另写一份向量化的近似策略，
+保证扫描结果和实盘逻辑一致；并行度来自进程池，每个进程只加载一次 tick 数据。
+"""
+import argparse
+import csv
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import backtest
+import grid_BN_XRP as grid
+from log_setup import setup_logging, setup_worker_logging, start_worker_listener
+
+logger = logging.getLogger()
+
+PARAM_NAMES = ("coin", "grid_spacing", "initial_quantity", "position_limit", "position_threshold", "order_first_time")
+RESULT_NAMES = ("pnl", "max_drawdown", "fills", "maker_fills", "taker_fills", "fees", "funding", "volume",
+                "peak_long", "peak_short", "peak_net", "lock_hits_long", "lock_hits_short", "elapsed")
+
+_ticks = {}  # 进程内的 tick 缓存: 路径 -> (ts, bid, ask)
+
+
+def _load(path):
+    if path not in _ticks:
+        _ticks[path] = backtest.load_ticks(path)
+    return _ticks[path]
+
+
+def _init_worker(paths, log_queue):
+    """子进程启动时把日志转给父进程，加载一次 tick 数据（fork 启动时直接继承父进程已加载的数据）"""
+    setup_worker_logging(log_queue)
+    for path in paths:
+        _load(path)
+
+
+def run_one(job):
+    """回测一个参数组合，返回一行结果"""
+    coin, path, spacing, quantity, limit, threshold, first_time = job
+    # 策略阈值是模块级配置，每个组合运行前覆盖（进程内串行执行，不会互相干扰）
+    grid.POSITION_LIMIT = limit
+    grid.POSITION_THRESHOLD = threshold
+    grid.ORDER_FIRST_TIME = first_time
+    ts, bid, ask = _load(path)
+    report = backtest.Backtest(ts, bid, ask, coin_name=coin, grid_spacing=spacing, initial_quantity=quantity).run()
+    row = dict(zip(PARAM_NAMES, (coin, spacing, quantity, limit, threshold, first_time)))
+    row.update((name, report[name]) for name in RESULT_NAMES)
+    return row
+
+
+def run_chunk(jobs):
+    """一个子进程任务里依次回测一批组合，减少进程间往返"""
+    return [run_one(job) for job in jobs]
+
+
+def build_jobs(datasets, spacings, quantities, limits, thresholds, first_times):
+    """datasets 为 [(coin, path)]，返回所有参数组合"""
+    return [(coin, path) + combo for coin, path in datasets
+            for combo in itertools.product(spacings, quantities, limits, thresholds, first_times)]
+
+
+def sweep(jobs, workers=None):
+    """并行执行所有组合，按完成顺序返回结果行"""
+    paths = sorted({job[1] for job in jobs})
+    for path in paths:
+        _load(path)  # 先在父进程加载：fork 的子进程直接共享，顺便提前发现坏文件
+    chunksize = max(1, len(jobs) // ((workers or os.cpu_count()) * 4))
+    rows = []
+    started = time.perf_counter()
+    log_queue, log_listener = start_worker_listener()  # 子进程的日志由父进程写出
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(paths, log_queue)) as pool:
+            futures = [pool.submit(run_chunk, jobs[i:i + chunksize]) for i in range(0, len(jobs), chunksize)]
+            reported = 0
+            for future in as_completed(futures):
+                rows.extend(future.result())
+                if len(rows) - reported >= 10 or len(rows) == len(jobs):
+                    reported = len(rows)
+                    logger.info(f"参数扫描进度: {len(rows)}/{len(jobs)}, 用时 {time.perf_counter() - started:.1f}s")
+    finally:
+        log_listener.stop()
+    return rows
+
+
+def write_results(rows, path):
+    """写结果表：.parquet 结尾时用 pandas 写 Parquet，否则写 CSV"""
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ValueError("写 Parquet 需要安装 pandas 和 pyarrow，或者改用 .csv 输出")
+        pd.DataFrame(rows, columns=PARAM_NAMES + RESULT_NAMES).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PARAM_NAMES + RESULT_NAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _floats(text):
+    return [float(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网格参数并行扫描")
+    parser.add_argument("datasets", nargs="+", help="COIN=tick 文件，省略 COIN= 时使用 COIN_NAME")
+    parser.add_argument("--spacing", type=_floats, default=[grid.GRID_SPACING])
+    parser.add_argument("--quantity", type=_floats, default=[grid.INITIAL_QUANTITY])
+    parser.add_argument("--limit", type=_floats, default=[grid.POSITION_LIMIT])
+    parser.add_argument("--threshold", type=_floats, default=[grid.POSITION_THRESHOLD])
+    parser.add_argument("--first-time", type=_floats, default=[grid.ORDER_FIRST_TIME])
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--out", default="sweep.csv", help="结果文件（.csv 或 .parquet）")
+    args = parser.parse_args()
+    setup_logging("sweep")
+
+    datasets = [tuple(item.split("=", 1)) if "=" in item else (grid.COIN_NAME, item) for item in args.datasets]
+    jobs = build_jobs(datasets, args.spacing, args.quantity, args.limit, args.threshold, args.first_time)
+    rows = sweep(jobs, args.workers)
+    rows.sort(key=lambda row: row["pnl"], reverse=True)
+    write_results(rows, args.out)
+    print(f"{len(rows)} 个组合已写入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from async_exchange import AsyncExchange
+
+
+class FakeSession:
+    def mount(self, prefix, adapter):
+        pass
+
+
+class FakeExchange:
+    id = "fake"
+
+    def __init__(self):
+        self.session = FakeSession()
+        self.calls = []
+        self.release = threading.Event()
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        self.calls.append(symbol)
+        self.release.wait(1)
+        return [{"symbol": symbol}]
+
+
+def test_equivalent_reads_share_one_request():
+    async def run():
+        exchange = FakeExchange()
+        rest = AsyncExchange(exchange, max_workers=2, rate_limit=False)
+        try:
+            reads = [
+                asyncio.create_task(rest.fetch_open_orders("XRP/USDT")),
+                asyncio.create_task(rest.fetch_open_orders(symbol="XRP/USDT")),
+                asyncio.create_task(rest.fetch_open_orders("XRP/USDT", None, params={})),
+                asyncio.create_task(rest.fetch_open_orders("DOGE/USDT")),
+            ]
+            await asyncio.sleep(0.05)
+            exchange.release.set()
+            results = await asyncio.gather(*reads)
+        finally:
+            rest.executor.shutdown()
+        assert sorted(exchange.calls) == ["DOGE/USDT", "XRP/USDT"]
+        assert results[0] is results[1] is results[2]
+        assert rest.reads_sent == 2 and rest.reads_shared == 2
+    asyncio.run(run())
+
+
+def test_unbindable_arguments_fall_back_to_raw_key():
+    rest = AsyncExchange(FakeExchange(), max_workers=0)
+    key = rest.read_key("fetch_open_orders", ("XRP/USDT",), {"unknown": 1})
+    assert key == ("fetch_open_orders", "('XRP/USDT',)", "{'unknown': 1}")
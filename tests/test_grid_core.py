@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+from grid_core import GridCore
+from strategy_scheduler import STRATEGY_MAX_IDLE
+
+NOW = 100000.0
+
+
+def bot(**state):
+    defaults = dict(latest_price=0.5, now=lambda: NOW, long_position=0, short_position=0,
+                    last_long_order_time=NOW, last_short_order_time=NOW, order_first_time=10,
+                    order_cooldown_time=0, position_threshold=500)
+    defaults.update(state)
+    return SimpleNamespace(**defaults)
+
+
+def test_next_wakeup_uses_upcoming_first_order_deadline():
+    assert GridCore.next_wakeup_delay(bot(last_long_order_time=NOW - 4)) == 6
+
+
+def test_next_wakeup_ignores_past_deadlines():
+    # Gate 锁仓冷却 60 秒，锁仓方向很久没有下单：过去的冷却时间不能让策略 10 Hz 空转
+    locked = bot(long_position=600, short_position=10, order_cooldown_time=60, last_long_order_time=NOW - 3600)
+    assert GridCore.next_wakeup_delay(locked) == STRATEGY_MAX_IDLE
+    flat = bot(last_long_order_time=NOW - 3600, last_short_order_time=NOW - 3600)
+    assert GridCore.next_wakeup_delay(flat) == STRATEGY_MAX_IDLE
+
+
+def test_next_wakeup_before_first_price():
+    assert GridCore.next_wakeup_delay(bot(latest_price=0, last_long_order_time=0)) == STRATEGY_MAX_IDLE
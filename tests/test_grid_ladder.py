@@ -0,0 +1,23 @@
+from grid_ladder import LADDER_SIZE, GridLadder
+
+
+def test_levels_are_tick_aligned_and_bracket_the_price():
+    ladder = GridLadder(0.0001, 0.002, 0.5)
+    for price in (0.5, 0.50049, 0.5011, 0.4987, 0.61, 0.41):
+        k = ladder.index(price)
+        assert ladder.price(k) <= price < ladder.price(k + 1)
+        assert abs(ladder.price(k) / 0.0001 - round(ladder.price(k) / 0.0001)) < 1e-6
+
+
+def test_window_shift_keeps_levels_stable():
+    ladder = GridLadder(0.0001, 0.002, 0.5)
+    before = [ladder.price(k) for k in range(-5, 6)]
+    ladder.index(0.5 * 1.002 ** (LADDER_SIZE * 3))  # 远离窗口，触发平移
+    assert ladder.shifts > 0
+    assert [ladder.price(k) for k in range(-5, 6)] == before
+
+
+def test_around_keeps_one_tick_when_spacing_below_tick():
+    lower, mid, upper = GridLadder(0.01, 0.0001, 1.0).around(1.0)
+    assert lower < mid < upper
+    assert round(mid - lower, 2) == 0.01 and round(upper - mid, 2) == 0.01
@@ -0,0 +1,62 @@
+import asyncio
+
+import latency
+import metrics
+from metrics import LOOP_LAG, REST_REQUESTS, MetricsServer
+
+
+async def http_get(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return head.decode("latin-1").split("\r\n")[0], body.decode("utf-8")
+
+
+async def scrape(paths):
+    server = MetricsServer(metrics.registry, 0)
+    assert await server.start() is not None
+    try:
+        return [await http_get(server.port, path) for path in paths]
+    finally:
+        server.close()
+
+
+def test_metrics_endpoint():
+    before = REST_REQUESTS.values.get(("create_order", "ok"), 0)
+    REST_REQUESTS.inc("create_order", "ok")
+    REST_REQUESTS.inc("create_order", "ok")
+    LOOP_LAG.set(0.25)
+
+    (status, body), (missing_status, _) = asyncio.run(scrape(["/metrics", "/other"]))
+
+    assert status == "HTTP/1.1 200 OK"
+    lines = body.splitlines()
+    assert "# TYPE grid_rest_requests_total counter" in lines
+    assert "# TYPE grid_event_loop_lag_seconds gauge" in lines
+    assert f'grid_rest_requests_total{{method="create_order",result="ok"}} {float(before + 2)!r}' in lines
+    assert "grid_event_loop_lag_seconds 0.25" in lines
+    assert missing_status == "HTTP/1.1 404 Not Found"
+
+
+def test_latency_summary_count_and_sum_are_cumulative():
+    recorder = latency.recorder
+    for _ in range(3):
+        recorder.record("test_stage", 0.002)
+
+    def exported():
+        return {(sample, labels.get("quantile")): value
+                for sample, labels, value in metrics.latency_samples()[0][3] if labels["stage"] == "test_stage"}
+
+    before = exported()
+    assert before[("grid_latency_seconds_count", None)] == 3
+    assert ("grid_latency_seconds", "0.5") in before
+    recorder.reset()  # 周期结束，分位数清零
+    after = exported()
+    assert after[("grid_latency_seconds_count", None)] == 3
+    assert after[("grid_latency_seconds_sum", None)] == before[("grid_latency_seconds_sum", None)]
+    assert ("grid_latency_seconds", "0.5") not in after
+    recorder.record("test_stage", 0.001)
+    assert exported()[("grid_latency_seconds_count", None)] == 4
@@ -0,0 +1,78 @@
+import asyncio
+
+import ccxt
+
+from order_batch import OrderBatcher
+
+
+class FakeExchange:
+    id = "binance"
+    has = {"createOrders": True, "cancelOrders": True, "editOrder": True}
+
+
+class FakeRest:
+    """create_orders 里 price 为 None 的请求被拒绝；cancel_fails 里的订单撤不掉"""
+
+    def __init__(self, cancel_fails=()):
+        self.exchange = FakeExchange()
+        self.cancel_fails = set(cancel_fails)
+        self.open = set()
+        self.next_id = 0
+
+    async def create_orders(self, chunk):
+        result = []
+        for request in chunk:
+            if request["price"] is None:
+                result.append({"id": None, "status": "rejected", "info": {"code": "-4016"}})
+                continue
+            self.next_id += 1
+            order_id = str(self.next_id)
+            self.open.add(order_id)
+            result.append({"id": order_id, "status": "open"})
+        return result
+
+    async def cancel_orders(self, ids, symbol):
+        result = []
+        for order_id in ids:
+            if order_id in self.cancel_fails:
+                result.append({"id": None, "status": "rejected", "info": {"code": "-1001"}})
+            else:
+                self.open.discard(order_id)
+                result.append({"id": order_id, "status": "canceled"})
+        return result
+
+    async def cancel_order(self, order_id, symbol):
+        if order_id in self.cancel_fails:
+            raise ccxt.NetworkError("timeout")
+        self.open.discard(order_id)
+
+
+def request(price):
+    return {"symbol": "XRP/USDC:USDC", "type": "limit", "side": "buy", "amount": 3, "price": price, "params": {}}
+
+
+def test_replace_rolls_back_partial_placement():
+    rest = FakeRest()
+    rest.open.update({"old1", "old2"})
+    result = asyncio.run(OrderBatcher(rest).replace("XRP/USDC:USDC", ["old1", "old2"],
+                                                    [request(0.50), request(None), request(0.49)]))
+    assert not result.ok
+    assert result.created == [None, None, None]
+    assert sorted(result.canceled) == ["1", "2", "old1", "old2"]
+    assert rest.open == set()  # 这一侧回到无挂单
+
+
+def test_replace_keeps_orders_whose_rollback_failed():
+    rest = FakeRest(cancel_fails={"1"})
+    result = asyncio.run(OrderBatcher(rest).replace("XRP/USDC:USDC", [], [request(0.50), request(None)]))
+    assert not result.ok
+    assert [order and order["id"] for order in result.created] == ["1", None]  # 撤不掉的仍按已挂单记录
+    assert rest.open == {"1"}
+
+
+def test_replace_does_not_place_when_cancel_fails():
+    rest = FakeRest(cancel_fails={"old1", "old2"})
+    rest.open.update({"old1", "old2"})
+    result = asyncio.run(OrderBatcher(rest).replace("XRP/USDC:USDC", ["old1", "old2"], [request(0.50)]))
+    assert not result.ok and result.created == [None] and result.canceled == []
+    assert rest.next_id == 0
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from rate_limit import LOW_PRIORITY_RESERVE, PER_ORDER, RateLimiter, retry_after
+
+LIMITS = {
+    "buckets": {"weight": (10, 1), "orders": (10, 1)},
+    "costs": {
+        "create_order": {"weight": 1, "orders": 1},
+        "cancel_orders": {"weight": 1, "orders": PER_ORDER},
+        "fetch_balance": {"weight": 1},
+    },
+    "default": {"weight": 1},
+}
+
+
+def limiter():
+    return RateLimiter("test", LIMITS)
+
+
+def test_reads_leave_reserve_for_orders():
+    async def run():
+        rl = limiter()
+        reserve = int(10 * LOW_PRIORITY_RESERVE)
+        for _ in range(10 - reserve):
+            await rl.acquire("fetch_balance")
+        assert rl.deferred == 0
+        # 只剩保留部分：下单立即放行，读请求要等
+        started = time.monotonic()
+        await rl.acquire("create_order")
+        assert time.monotonic() - started < 0.01 and rl.delayed == 0
+        read = asyncio.create_task(rl.acquire("fetch_balance"))
+        await asyncio.sleep(0.01)
+        assert not read.done() and rl.deferred == 1
+        await read
+    asyncio.run(run())
+
+
+def test_batch_cost_counts_orders():
+    rl = limiter()
+    asyncio.run(rl.acquire("cancel_orders", (["1", "2", "3"], "XRP/USDC:USDC")))
+    remaining = rl.remaining()
+    assert round(remaining["orders"]) == 7 and round(remaining["weight"]) == 9
+
+
+def test_rate_limited_read_does_not_block_orders():
+    async def run():
+        rl = limiter()
+        rl.on_rate_limited("fetch_balance", error="429")
+        assert rl.remaining()["orders"] > 9  # 只清空读请求扣费的桶
+        assert rl.buckets["weight"].tokens < 1
+        assert rl.rate_limited == 1
+    asyncio.run(run())
+
+
+def test_retry_after_blocks_charged_buckets():
+    rl = limiter()
+    rl.on_rate_limited("create_order", wait=5, error="418")
+    now = time.monotonic()
+    assert rl.buckets["orders"].wait_time(1, 0, now) > 4.9
+    assert rl.buckets["weight"].wait_time(1, 0, now) > 4.9
+
+
+def test_retry_after_header():
+    assert retry_after({"Retry-After": "7"}) == 7
+    assert retry_after({"retry-after": "1.5", "X-Other": "x"}) == 1.5
+    assert retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) is None
+    assert retry_after(None) is None
@@ -0,0 +1,43 @@
+from state_engine import GridState
+from ws_events import OrderUpdate, PositionUpdate
+
+
+def order(order_id, status, filled, ts, side="buy", position_side="long", amount=3.0):
+    return OrderUpdate("XRPUSDC", order_id, side, position_side, False, status, 0.5, amount, filled, ts)
+
+
+def test_position_push_before_fill_is_not_double_counted():
+    # Binance：同一笔成交先推 ACCOUNT_UPDATE（绝对持仓），再推 ORDER_TRADE_UPDATE，两者 T 相同
+    state = GridState()
+    state.apply_order(order("1", "new", 0.0, 1000))
+    assert state.apply_position(PositionUpdate("XRPUSDC", "long", 3.0, 2000))
+    assert state.apply_order(order("1", "filled", 3.0, 2000))
+    assert state.positions["long"] == 3.0
+    assert state.open_total("buy", "long") == 0
+
+
+def test_fill_before_position_push():
+    state = GridState()
+    state.apply_order(order("1", "new", 0.0, 1000))
+    state.apply_order(order("1", "filled", 3.0, 2000))
+    assert state.positions["long"] == 3.0
+    assert not state.apply_position(PositionUpdate("XRPUSDC", "long", 3.0, 2000))  # 同一笔成交，重复
+    assert state.positions["long"] == 3.0
+
+
+def test_later_fill_after_position_push_is_applied():
+    state = GridState()
+    state.apply_position(PositionUpdate("XRPUSDC", "long", 3.0, 2000))
+    state.apply_order(order("2", "partially_filled", 1.0, 3000))
+    assert state.positions["long"] == 4.0
+    state.apply_order(order("3", "filled", 2.0, 4000, side="sell", amount=2.0))  # 平多
+    assert state.positions["long"] == 2.0
+
+
+def test_stale_and_duplicate_order_events():
+    state = GridState()
+    state.apply_order(order("1", "partially_filled", 1.0, 2000))
+    assert not state.apply_order(order("1", "partially_filled", 1.0, 2000))
+    assert not state.apply_order(order("1", "new", 0.0, 1000))
+    assert state.positions["long"] == 1.0
+    assert state.stats()["duplicate_events"] == 1 and state.stats()["stale_events"] == 1
@@ -0,0 +1,44 @@
+from ws_events import DEDUP_RESET_GAP, DEDUP_RESET_MS, BookTicker, MarketDataDedup, OrderUpdate, Ticker
+
+
+def book(update_id):
+    return BookTicker("XRPUSDC", 0.5, 0.51, 100, 100, update_id, 0)
+
+
+def tick(ts, price):
+    return Ticker("XRP_USDT", price, ts)
+
+
+def test_book_ticker_first_arrival_wins():
+    dedup = MarketDataDedup()
+    assert dedup.accept(book(5_000_000))
+    assert not dedup.accept(book(5_000_000))  # 另一条连接送来的同一条
+    assert not dedup.accept(book(4_999_999))  # 过期
+    assert dedup.accept(book(5_000_001))
+    assert dedup.stats() == {"accepted": 2, "dropped": 2, "resets": 0}
+
+
+def test_same_millisecond_ticks_with_different_prices():
+    dedup = MarketDataDedup()
+    assert dedup.accept(tick(1000, 0.50))
+    assert dedup.accept(tick(1000, 0.51))  # 同一毫秒的另一笔成交
+    assert not dedup.accept(tick(1000, 0.50))
+    assert not dedup.accept(tick(1000, 0.51))
+    assert not dedup.accept(tick(999, 0.52))
+    assert dedup.accept(tick(1001, 0.50))
+
+
+def test_sequence_reset_is_accepted():
+    dedup = MarketDataDedup()
+    assert dedup.accept(book(DEDUP_RESET_GAP * 5))
+    assert dedup.accept(book(3))  # 交易所重置了序号
+    assert dedup.accept(book(4)) and not dedup.accept(book(4))
+    assert dedup.accept(tick(DEDUP_RESET_MS * 10, 0.5))
+    assert dedup.accept(tick(1000, 0.5)) and not dedup.accept(tick(1000, 0.5))
+    assert dedup.stats()["resets"] == 2
+
+
+def test_private_events_pass_through():
+    dedup = MarketDataDedup()
+    order = OrderUpdate("XRPUSDC", "1", "buy", "long", False, "new", 0.5, 3, 0, 1000)
+    assert dedup.accept(order) and dedup.accept(order)
@@ -0,0 +1,204 @@
+"""
+盘口行情录制：把 bookTicker / OKX tickers / Gate futures.book_ticker 的每一次最优价更新写成定长二进制记录，
+按 UTC 日期切分文件，回测和分析时可以直接 memmap 成 NumPy 数组，不用解析 JSON。
+
+录制: python tick_recorder.py binance XRPUSDC DOGEUSDC
+      python tick_recorder.py okx XRP-USDT-SWAP
+      python tick_recorder.py gate X_USDT
+文件: {TICK_ROOT}/{exchange}/{symbol}/{YYYYMMDD}.tick，64 字节文件头 + 每条 32 字节记录。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import websockets
+
+from ws_events import BookTicker, EventDispatcher, parse_binance, parse_gate, parse_okx
+
+logger = logging.getLogger()
+
+TICK_ROOT = "ticks"  # 录制文件根目录
+FLUSH_RECORDS = 4096  # 缓冲多少条记录写一次盘
+FLUSH_INTERVAL = 1.0  # 最长多久写一次盘（秒）
+
+TICK_DTYPE = np.dtype([
+    ("ts", "<i8"),  # 交易所时间（毫秒）
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("bid_qty", "<f4"),
+    ("ask_qty", "<f4"),
+])
+TICK_MAGIC = b"GRIDTICK"
+TICK_VERSION = 1
+HEADER = struct.Struct("<8sHH32s20x")  # magic, 版本, 记录长度, 交易对; 共 64 字节
+DAY_MS = 86400 * 1000
+
+WEBSOCKET_URLS = {
+    "binance": "wss://fstream.binance.com/ws",
+    "okx": "wss://ws.okx.com:8443/ws/v5/public",
+    "gate": "wss://fx-ws.gateio.ws/v4/ws/usdt",
+}
+PARSERS = {"binance": parse_binance, "okx": parse_okx, "gate": parse_gate}
+
+
+def tick_path(root, exchange, symbol, day):
+    return os.path.join(root, exchange, symbol, f"{day}.tick")
+
+
+def _day(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y%m%d")
+
+
+class TickWriter:
+    """单个交易对的追加写入器，按 UTC 日期切换文件"""
+
+    def __init__(self, root, exchange, symbol):
+        self.root = root
+        self.exchange = exchange
+        self.symbol = symbol
+        self.buffer = np.zeros(FLUSH_RECORDS, dtype=TICK_DTYPE)
+        self.count = 0
+        self.file = None
+        self.day = None
+        self.day_end = 0  # 当前文件对应日期的结束时间（毫秒）
+        self.last_flush = time.monotonic()
+        self.records = 0  # 累计写入条数
+
+    def append(self, ts, bid, ask, bid_qty, ask_qty):
+        if ts >= self.day_end:
+            self.flush()
+            self._open(ts)
+        self.buffer[self.count] = (ts, bid, ask, bid_qty, ask_qty)
+        self.count += 1
+        if self.count == FLUSH_RECORDS or time.monotonic() - self.last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def _open(self, ts):
+        if self.file is not None:
+            self.file.close()
+        self.day = _day(ts)
+        self.day_end = (ts // DAY_MS + 1) * DAY_MS
+        path = tick_path(self.root, self.exchange, self.symbol, self.day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) < HEADER.size
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.truncate(0)
+            self.file.write(HEADER.pack(TICK_MAGIC, TICK_VERSION, TICK_DTYPE.itemsize, self.symbol.encode()[:32]))
+        else:
+            # 上次异常退出可能留下半条记录，截掉后再续写
+            size = os.path.getsize(path)
+            tail = (size - HEADER.size) % TICK_DTYPE.itemsize
+            if tail:
+                self.file.truncate(size - tail)
+        logger.info(f"录制文件: {path}")
+
+    def flush(self):
+        if self.count and self.file is not None:
+            self.file.write(self.buffer[:self.count].tobytes())
+            self.file.flush()
+            self.records += self.count
+        self.count = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_ticks(path):
+    """只读 memmap 一个 tick 文件，返回结构化数组（按列取 arr['bid'] 不复制数据）"""
+    with open(path, "rb") as f:
+        magic, version, record_size, symbol = HEADER.unpack(f.read(HEADER.size))
+    if magic != TICK_MAGIC or record_size != TICK_DTYPE.itemsize:
+        raise ValueError(f"不是 tick 文件或版本不兼容: {path}")
+    count = (os.path.getsize(path) - HEADER.size) // TICK_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def load_days(root, exchange, symbol, start_day=None, end_day=None):
+    """拼接 [start_day, end_day] 之间的每日文件（YYYYMMDD），返回一个连续数组"""
+    directory = os.path.join(root, exchange, symbol)
+    days = sorted(name[:-5] for name in os.listdir(directory) if name.endswith(".tick"))
+    days = [day for day in days if (start_day is None or day >= start_day) and (end_day is None or day <= end_day)]
+    parts = [read_ticks(os.path.join(directory, f"{day}.tick")) for day in days]
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=TICK_DTYPE)
+
+
+# ==================== 录制 ====================
+def subscribe_message(exchange, symbols):
+    """一条消息订阅多个交易对的最优价"""
+    if exchange == "binance":
+        return {"method": "SUBSCRIBE", "params": [f"{symbol.lower()}@bookTicker" for symbol in symbols], "id": 1}
+    if exchange == "okx":
+        return {"op": "subscribe", "args": [{"channel": "tickers", "instId": symbol} for symbol in symbols]}
+    return {"time": int(time.time()), "channel": "futures.book_ticker", "event": "subscribe", "payload": symbols}
+
+
+class TickRecorder:
+    """订阅公共盘口推流并写入 TickWriter"""
+
+    def __init__(self, exchange, symbols, root=TICK_ROOT):
+        self.exchange = exchange
+        self.symbols = symbols
+        self.writers = {symbol: TickWriter(root, exchange, symbol) for symbol in symbols}
+        self.dispatcher = EventDispatcher(PARSERS[exchange])
+        self.dispatcher.on(BookTicker, self.handle_book_ticker)
+
+    async def handle_book_ticker(self, ticker):
+        writer = self.writers.get(ticker.symbol)
+        if writer is not None:
+            writer.append(ticker.ts, ticker.bid, ticker.ask, ticker.bid_qty, ticker.ask_qty)
+
+    async def run(self):
+        while True:
+            try:
+                async with websockets.connect(WEBSOCKET_URLS[self.exchange]) as websocket:
+                    await websocket.send(json.dumps(subscribe_message(self.exchange, self.symbols)))
+                    logger.info(f"开始录制 {self.exchange}: {self.symbols}")
+                    while True:
+                        await self.dispatcher.dispatch(await websocket.recv())
+            except Exception as e:
+                logger.error(f"录制连接断开: {e}")
+                for writer in self.writers.values():
+                    writer.flush()
+                await asyncio.sleep(5)  # 等待 5 秒后重连
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制盘口最优价")
+    parser.add_argument("exchange", choices=sorted(WEBSOCKET_URLS))
+    parser.add_argument("symbols", nargs="+", help="交易所原始交易对，如 XRPUSDC / XRP-USDT-SWAP / X_USDT")
+    parser.add_argument("--root", default=TICK_ROOT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    # Binance 推送里的交易对是大写
+    symbols = [symbol.upper() for symbol in args.symbols] if args.exchange == "binance" else args.symbols
+    recorder = TickRecorder(args.exchange, symbols, args.root)
+    try:
+        asyncio.run(recorder.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Binance 用户数据流管理：listenKey 的获取、定时续期、过期处理和更换。
+
+listenKey 超过 60 分钟没有续期就会失效，交易所推一条 listenKeyExpired 之后不再推订单和持仓，而连接本身不断，
+机器人会在过期的挂单计数上继续交易。UserStreamManager 负责：
+- 每 KEEPALIVE_INTERVAL 秒续期一次，续期失败（key 已不存在等）立即换 key；
+- 收到 listenKeyExpired 立即换 key；
+- 换 key 时先拿到新 key，再在已打开的组合流上 SUBSCRIBE 新 key、UNSUBSCRIBE 旧 key，行情不中断；
+  发送失败就断开连接，由 StreamSupervisor 用新 key 重连。换 key 期间可能漏掉私有事件，换完后触发一次对账；
+- 记录最近一次私有事件的时间，private_event_age() 作为健康指标。
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+
+logger = logging.getLogger()
+
+KEEPALIVE_INTERVAL = 1800  # listenKey 续期间隔（秒），交易所 60 分钟不续期即失效
+
+
+class UserStreamManager:
+    """一个 Binance 账户的 listenKey 生命周期"""
+
+    def __init__(self, adapter):
+        self.adapter = adapter  # 用它的 rest、exchange、当前推流连接和 on_gap 回调
+        self.listen_key = None  # 当前 listenKey，第一次连接推流时获取
+        self.lock = asyncio.Lock()  # 续期失败和过期推送可能同时触发换 key
+        self.request_ids = itertools.count(1)
+        self.subscribed_at = None  # 当前 key 开始订阅的时间（monotonic）
+        self.last_event = None  # 最近一次私有事件的时间（monotonic）
+        # 统计
+        self.keepalives = 0  # 成功续期次数
+        self.keepalive_failures = 0  # 续期失败次数
+        self.expirations = 0  # 收到的 listenKeyExpired 推送
+        self.rotations = 0  # 换 key / 重新订阅次数
+
+    def fetch_key(self):
+        """获取 listenKey（key 仍有效时交易所返回同一个并顺延有效期）"""
+        response = self.adapter.exchange.fapiPrivatePostListenKey()
+        listen_key = response.get("listenKey")
+        if not listen_key:
+            raise ValueError("获取的 listenKey 为空")
+        logger.info(f"成功获取 listenKey: {listen_key}")
+        return listen_key
+
+    async def current_key(self):
+        """建立连接时使用的 listenKey"""
+        async with self.lock:
+            if self.listen_key is None:
+                self.listen_key = await self.adapter.rest.run_as("fapiPrivatePostListenKey", self.fetch_key)
+            self.subscribed_at = time.monotonic()
+            return self.listen_key
+
+    def on_frame(self, data):
+        """收到当前 listenKey 的一帧用户数据"""
+        self.last_event = time.monotonic()
+        if data.get("e") == "listenKeyExpired":
+            self.expirations += 1
+            logger.warning(f"listenKey 已过期: {self.listen_key}")
+            asyncio.create_task(self.rotate("listenKey 过期"))
+
+    async def keepalive_loop(self):
+        """定期续期，失败时换 key"""
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            if self.listen_key is None:
+                continue
+            try:
+                await self.adapter.rest.fapiPrivatePutListenKey()
+                self.keepalives += 1
+            except Exception as e:
+                self.keepalive_failures += 1
+                logger.error(f"listenKey 续期失败: {e}")
+                await self.rotate("续期失败")
+
+    async def rotate(self, reason):
+        """重新获取 listenKey 并在当前连接上换订阅，之后触发对账补上可能漏掉的私有事件"""
+        async with self.lock:
+            old = self.listen_key
+            try:
+                new = await self.adapter.rest.run_as("fapiPrivatePostListenKey", self.fetch_key)
+            except Exception as e:
+                logger.error(f"{reason}，获取新 listenKey 失败，断开推流重连: {e}")
+                self.listen_key = None
+                await self.close_stream()
+                return
+            self.listen_key = new
+            self.rotations += 1
+            logger.info(f"{reason}，重新订阅用户数据: {old} -> {new}")
+            await self.resubscribe(old, new)
+        if self.adapter.on_gap is not None:
+            await self.adapter.on_gap()
+
+    async def resubscribe(self, old, new):
+        """先订阅新 key 再退订旧 key，发送失败时断开连接由 StreamSupervisor 用新 key 重连"""
+        websocket = self.adapter.websocket
+        if websocket is None:
+            return  # 没有连接，下次连接直接用新 key
+        try:
+            # key 没变也重新订阅一次：过期后交易所可能已经停止推送
+            await websocket.send(json.dumps({"method": "SUBSCRIBE", "params": [new], "id": next(self.request_ids)}))
+            if old is not None and old != new:
+                await websocket.send(json.dumps({"method": "UNSUBSCRIBE", "params": [old],
+                                                 "id": next(self.request_ids)}))
+            self.subscribed_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"重新订阅用户数据失败，断开推流重连: {e}")
+            await self.close_stream()
+
+    async def close_stream(self):
+        websocket = self.adapter.websocket
+        if websocket is not None:
+            await websocket.close()
+
+    def private_event_age(self):
+        """距最近一次私有事件的秒数；订阅后还没收到过私有事件时按订阅时间算，未连接时为 None"""
+        since = self.last_event if self.last_event is not None else self.subscribed_at
+        if since is None:
+            return None
+        return time.monotonic() - since
+
+    def stats(self):
+        return {
+            "private_event_age": self.private_event_age(),
+            "keepalives": self.keepalives,
+            "keepalive_failures": self.keepalive_failures,
+            "expirations": self.expirations,
+            "rotations": self.rotations,
+        }
@@ -0,0 +1,317 @@
+"""
+WebSocket 帧解码：每帧只做一次 JSON 解析，转换成紧凑的类型化事件后再分发给处理函数。
+"""
+import json
+import time
+
+import latency
+
+try:
+    import orjson  # 可选的高速 JSON 后端
+except ImportError:
+    orjson = None
+
+
+def get_json_loads(backend=None):
+    """返回 JSON 解析函数，backend 为 None 时优先使用 orjson"""
+    if backend == "json" or (backend is None and orjson is None):
+        return json.loads
+    if orjson is None:
+        raise ValueError("未安装 orjson，无法使用该 JSON 后端")
+    return orjson.loads
+
+
+# ==================== 事件类型 ====================
+class BookTicker:
+    """最优买卖价"""
+    __slots__ = ("symbol", "bid", "ask", "bid_qty", "ask_qty", "update_id", "ts")
+
+    def __init__(self, symbol, bid, ask, bid_qty, ask_qty, update_id, ts):
+        self.symbol = symbol
+        self.bid = bid
+        self.ask = ask
+        self.bid_qty = bid_qty
+        self.ask_qty = ask_qty
+        self.update_id = update_id
+        self.ts = ts  # 毫秒
+
+
+class Ticker:
+    """最新成交价"""
+    __slots__ = ("symbol", "last", "ts")
+
+    def __init__(self, symbol, last, ts):
+        self.symbol = symbol
+        self.last = last
+        self.ts = ts
+
+
+class OrderUpdate:
+    """订单更新，字段已统一为 ccxt 风格的小写取值
+
+    side: buy/sell, position_side: long/short,
+    status: new/partially_filled/filled/canceled
+    """
+    __slots__ = ("symbol", "order_id", "side", "position_side", "reduce_only", "status",
+                 "price", "amount", "filled", "ts")
+
+    def __init__(self, symbol, order_id, side, position_side, reduce_only, status, price, amount, filled, ts):
+        self.symbol = symbol
+        self.order_id = order_id
+        self.side = side
+        self.position_side = position_side
+        self.reduce_only = reduce_only
+        self.status = status
+        self.price = price
+        self.amount = amount
+        self.filled = filled
+        self.ts = ts
+
+    @property
+    def remaining(self):
+        return self.amount - self.filled
+
+
+class PositionUpdate:
+    """单边持仓更新，size 为持仓数量的绝对值"""
+    __slots__ = ("symbol", "position_side", "size", "ts")
+
+    def __init__(self, symbol, position_side, size, ts):
+        self.symbol = symbol
+        self.position_side = position_side
+        self.size = size
+        self.ts = ts
+
+
+class BalanceUpdate:
+    """合约账户余额更新"""
+    __slots__ = ("currency", "balance", "change", "ts")
+
+    def __init__(self, currency, balance, change, ts):
+        self.currency = currency
+        self.balance = balance
+        self.change = change
+        self.ts = ts
+
+
+NO_EVENTS = ()
+
+# ==================== Binance ====================
+BINANCE_ORDER_STATUS = {
+    "NEW": "new",
+    "PARTIALLY_FILLED": "partially_filled",
+    "FILLED": "filled",
+    "CANCELED": "canceled",
+    "EXPIRED": "canceled",
+    "EXPIRED_IN_MATCH": "canceled",
+}
+
+
+def parse_binance(data):
+    """解析 Binance 合约 ws 消息（bookTicker / ORDER_TRADE_UPDATE / ACCOUNT_UPDATE）"""
+    if "stream" in data:  # 组合流 /stream?streams= 的帧包了一层 {"stream", "data"}
+        data = data["data"]
+    event_type = data.get("e")
+    if event_type == "bookTicker":
+        return (BookTicker(data["s"], float(data["b"]), float(data["a"]), float(data["B"]), float(data["A"]),
+                           data["u"], data["T"]),)
+    if event_type == "ORDER_TRADE_UPDATE":
+        o = data["o"]
+        return (OrderUpdate(o["s"], str(o["i"]), o["S"].lower(), o["ps"].lower(), o["R"],
+                            BINANCE_ORDER_STATUS.get(o["X"], "new"), float(o["p"]), float(o["q"]),
+                            float(o["z"]), o["T"]),)
+    if event_type == "ACCOUNT_UPDATE":
+        ts = data["T"]
+        account = data["a"]
+        events = [BalanceUpdate(b["a"], float(b["wb"]), float(b["bc"]), ts) for b in account.get("B", ())]
+        for p in account.get("P", ()):
+            if p["ps"] != "BOTH":
+                events.append(PositionUpdate(p["s"], p["ps"].lower(), abs(float(p["pa"])), ts))
+        return events
+    return NO_EVENTS
+
+
+# ==================== OKX ====================
+OKX_ORDER_STATUS = {
+    "live": "new",
+    "partially_filled": "partially_filled",
+    "filled": "filled",
+    "canceled": "canceled",
+    "mmp_canceled": "canceled",
+}
+
+
+def parse_okx(data):
+    """解析 OKX v5 ws 消息（tickers / orders / positions）"""
+    arg = data.get("arg")
+    if arg is None or "data" not in data:
+        return NO_EVENTS  # 登录、订阅回执等
+    channel = arg["channel"]
+    if channel == "tickers":
+        return [BookTicker(t["instId"], float(t["bidPx"]), float(t["askPx"]), float(t["bidSz"]),
+                           float(t["askSz"]), int(t["ts"]), int(t["ts"])) for t in data["data"]]
+    if channel == "orders":
+        return [OrderUpdate(o["instId"], o["ordId"], o["side"], o["posSide"], o["reduceOnly"] == "true",
+                            OKX_ORDER_STATUS.get(o["state"], "new"), float(o["px"] or 0), float(o["sz"]),
+                            float(o["accFillSz"] or 0), int(o["uTime"])) for o in data["data"]]
+    if channel == "positions":
+        return [PositionUpdate(p["instId"], p["posSide"], abs(float(p["pos"] or 0)), int(p["uTime"]))
+                for p in data["data"]]
+    return NO_EVENTS
+
+
+# ==================== Gate ====================
+def gate_position_side(side, reduce_only):
+    """双仓模式下 Gate 订单不带方向：买入开仓=多头，买入平仓=空头，卖出反之"""
+    if side == "buy":
+        return "short" if reduce_only else "long"
+    return "long" if reduce_only else "short"
+
+
+def _gate_order(o):
+    size = o["size"]
+    amount = abs(size)
+    filled = amount - abs(o["left"])
+    side = "buy" if size > 0 else "sell"
+    reduce_only = o["is_reduce_only"]
+    position_side = gate_position_side(side, reduce_only)
+    if o["status"] == "open":
+        status = "partially_filled" if filled > 0 else "new"
+    else:
+        status = "filled" if o.get("finish_as") == "filled" else "canceled"
+    return OrderUpdate(o["contract"], str(o["id"]), side, position_side, reduce_only, status,
+                       float(o.get("price", 0)), amount, filled, o.get("finish_time_ms") or o.get("create_time_ms", 0))
+
+
+def parse_gate(data):
+    """解析 Gate 合约 ws 消息"""
+    if data.get("event") != "update":
+        return NO_EVENTS  # 订阅回执
+    channel = data["channel"]
+    result = data["result"]
+    if channel == "futures.book_ticker":
+        return (BookTicker(result["s"], float(result["b"]), float(result["a"]), float(result["B"]),
+                           float(result["A"]), result["u"], result["t"]),)
+    if channel == "futures.tickers":
+        return [Ticker(t["contract"], float(t["last"]), data.get("time_ms", 0)) for t in result]
+    if channel == "futures.orders":
+        # 缺少必要字段的订单直接跳过
+        return [_gate_order(o) for o in result if "is_reduce_only" in o and "size" in o]
+    if channel == "futures.positions":
+        return [PositionUpdate(p["contract"], "long" if p.get("mode") == "dual_long" else "short",
+                               abs(float(p.get("size", 0))), p.get("time_ms", 0)) for p in result]
+    if channel == "futures.balances":
+        return [BalanceUpdate(b.get("currency", "UNKNOWN"), float(b.get("balance", 0)), float(b.get("change", 0)),
+                              b.get("time_ms", 0)) for b in result]
+    return NO_EVENTS
+
+
+# ==================== REST 订单 ====================
+# fetch_open_orders 返回的 ccxt 订单统一转换成 OrderUpdate，与推流共用同一种记录
+def _open_status(order):
+    return "partially_filled" if order.get("filled") else "new"
+
+
+def binance_order_from_ccxt(order):
+    info = order["info"]
+    return OrderUpdate(info["symbol"], str(order["id"]), order["side"], info.get("positionSide", "BOTH").lower(),
+                       bool(order.get("reduceOnly")), _open_status(order), float(order["price"] or 0),
+                       float(order["amount"]), float(order.get("filled") or 0), order.get("timestamp") or 0)
+
+
+def okx_order_from_ccxt(order):
+    info = order["info"]
+    return OrderUpdate(info["instId"], str(order["id"]), order["side"], info.get("posSide", "net"),
+                       bool(order.get("reduceOnly")), _open_status(order), float(order["price"] or 0),
+                       float(order["amount"]), float(order.get("filled") or 0), order.get("timestamp") or 0)
+
+
+def gate_order_from_ccxt(order):
+    reduce_only = bool(order.get("reduceOnly"))
+    return OrderUpdate(order["info"]["contract"], str(order["id"]), order["side"],
+                       gate_position_side(order["side"], reduce_only), reduce_only, _open_status(order),
+                       float(order["price"] or 0), float(order["amount"]), float(order.get("filled") or 0),
+                       order.get("timestamp") or 0)
+
+
+# ==================== 分发 ====================
+class EventDispatcher:
+    """解码一次 ws 帧并按事件类型调用对应的处理函数"""
+
+    def __init__(self, parser, json_backend=None):
+        self.parser = parser
+        self.loads = get_json_loads(json_backend)
+        self.handlers = {}
+        self.filter = None  # 返回 False 的事件不分发，多条行情连接时用于去重
+
+    def on(self, event_type, handler):
+        """注册事件处理函数（协程）"""
+        self.handlers[event_type] = handler
+
+    def decode(self, message):
+        """解码原始帧为事件列表"""
+        return self.parser(self.loads(message))
+
+    async def dispatch(self, message):
+        handlers = self.handlers
+        accept = self.filter
+        started = time.perf_counter()
+        events = self.parser(self.loads(message))
+        latency.record("parse", time.perf_counter() - started)
+        for event in events:
+            if accept is not None and not accept(event):
+                continue
+            handler = handlers.get(event.__class__)
+            if handler is not None:
+                await handler(event)
+
+
+DEDUP_RESET_GAP = 1000000  # 更新序号比已见过的小这么多时，视为交易所重置了序号（如交易所重启），从这条重新计数
+DEDUP_RESET_MS = 60000  # 成交价 ticker 的时间戳倒退这么多（毫秒）时同上
+
+
+class MarketDataDedup:
+    """多条行情连接先到先用：同一交易对的行情按更新序号（成交价 ticker 按时间戳）只保留第一次到达的
+
+    序号小于已见过的视为过期，直接丢弃；book ticker 序号相同即重复，成交价 ticker 时间戳相同时再按价格区分，
+    同一毫秒内价格不同的成交都会放行。序号大幅倒退（超过 DEDUP_RESET_GAP / DEDUP_RESET_MS）说明交易所重置了序号，
+    放行并从这条重新计数，否则之后的行情会被一直丢弃。订单、持仓等私有事件只走一条连接，原样通过。
+    """
+
+    def __init__(self):
+        self.last = {}  # (事件类型, 交易对) -> 已分发的最大序号
+        self.prices = {}  # 成交价 ticker 的 (事件类型, 交易对) -> 最大时间戳上已分发的价格
+        self.accepted = 0  # 放行的行情事件
+        self.dropped = 0  # 丢弃的重复/过期行情事件
+        self.resets = 0  # 序号重置次数
+
+    def accept(self, event):
+        cls = event.__class__
+        if cls is BookTicker:
+            seq, reset_gap = event.update_id, DEDUP_RESET_GAP
+        elif cls is Ticker:
+            seq, reset_gap = event.ts, DEDUP_RESET_MS
+        else:
+            return True
+        if not seq:
+            return True  # 没有序号无法去重
+        key = (cls, event.symbol)
+        last = self.last.get(key, 0)
+        if seq <= last:
+            if seq < last - reset_gap:
+                self.resets += 1
+            elif seq < last or cls is BookTicker or event.last in self.prices[key]:
+                self.dropped += 1
+                return False
+            else:
+                self.prices[key].add(event.last)  # 同一毫秒内的另一笔成交
+                self.accepted += 1
+                return True
+        self.last[key] = seq
+        if cls is Ticker:
+            self.prices[key] = {event.last}
+        self.accepted += 1
+        return True
+
+    def stats(self):
+        return {"accepted": self.accepted, "dropped": self.dropped, "resets": self.resets}
@@ -0,0 +1,179 @@
+"""
+推流连接监督：心跳保活、按消息间隔发现假死连接、指数退避加随机抖动重连、重连后触发定向对账，并统计重连次数和断流时长。
+
+适配器的 stream() 负责一次完整的连接和订阅（每次都按交易对列表重新订阅全部频道），断开时返回或抛出异常；
+StreamSupervisor 负责重连。连接内的心跳和假死检测由 ExchangeAdapter.pump 启动的 ConnectionWatchdog 负责：
+任何消息（包括心跳回复）都算活跃，超过 STALE_TIMEOUT 没有消息就主动断开，交给 StreamSupervisor 重连。
+
+热备行情连接（MarketLink）各自由一个 StreamSupervisor 独立重连，任何一条重连时其余连接照常推送行情，
+重复的行情由 ws_events.MarketDataDedup 丢弃。
+"""
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger()
+
+HEARTBEAT_INTERVAL = 15  # 空闲多久发一次应用层心跳（秒），OKX 要求 30 秒内有数据或 ping
+STALE_TIMEOUT = 30  # 超过这么久没有收到任何消息视为假死，主动断开（秒）
+WATCHDOG_TICK = 1  # 假死检查间隔（秒）
+RECONNECT_BASE_DELAY = 1  # 首次重连等待（秒）
+RECONNECT_MAX_DELAY = 60  # 重连等待上限（秒）
+STABLE_AFTER = 60  # 连接保持这么久视为稳定，退避从头计算（秒）
+
+
+class StreamStats:
+    """推流连接统计"""
+    __slots__ = ("connects", "disconnects", "stale_closes", "heartbeats", "max_gap", "downtime", "max_downtime",
+                 "last_error")
+
+    def __init__(self):
+        self.connects = 0  # 发起连接次数
+        self.disconnects = 0  # 断开次数（包括连接失败）
+        self.stale_closes = 0  # 因假死主动断开的次数
+        self.heartbeats = 0  # 发出的应用层心跳
+        self.max_gap = 0.0  # 连接存活期间两条消息的最大间隔（秒）
+        self.downtime = 0.0  # 累计断流时长（秒）
+        self.max_downtime = 0.0  # 单次最长断流时长（秒）
+        self.last_error = None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class MarketLink:
+    """一条只订阅公共行情频道的连接（热备行情，或 OKX 主连接里的公共连接），连接状态独立于主连接"""
+
+    def __init__(self, url, stream_stats=None):
+        self.url = url
+        self.live = asyncio.Event()  # 当前连接已收到消息
+        self.websocket = None  # 当前连接
+        self.stream_stats = stream_stats or StreamStats()
+
+
+class ConnectionWatchdog:
+    """单条连接的心跳与假死检测"""
+
+    def __init__(self, websocket, stats, heartbeat=None, stale_timeout=STALE_TIMEOUT,
+                 heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.websocket = websocket
+        self.stats = stats
+        self.heartbeat = heartbeat  # 返回心跳消息的函数，None 表示只靠协议层 ping
+        self.stale_timeout = stale_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.last_message = time.monotonic()
+        self.last_heartbeat = self.last_message
+
+    def touch(self):
+        """收到一条消息"""
+        now = time.monotonic()
+        gap = now - self.last_message
+        if gap > self.stats.max_gap:
+            self.stats.max_gap = gap
+        self.last_message = now
+
+    async def run(self):
+        """发心跳、检查假死；发送失败（半断开的连接上 send 抛 ConnectionClosed）时断开连接，交给重连处理"""
+        try:
+            while True:
+                await asyncio.sleep(WATCHDOG_TICK)
+                now = time.monotonic()
+                idle = now - self.last_message
+                if idle > self.stale_timeout:
+                    self.stats.stale_closes += 1
+                    logger.warning(f"推流 {idle:.0f} 秒没有消息，判定连接假死，主动断开")
+                    await self.websocket.close()
+                    return
+                if self.heartbeat is not None and idle >= self.heartbeat_interval \
+                        and now - self.last_heartbeat >= self.heartbeat_interval:
+                    self.last_heartbeat = now
+                    self.stats.heartbeats += 1
+                    await self.websocket.send(self.heartbeat())
+        except Exception as e:
+            self.stats.last_error = str(e)
+            logger.warning(f"推流心跳失败，断开连接: {e}")
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass  # 连接已经断了
+
+
+class StreamSupervisor:
+    """反复调用 adapter.stream()，断开后按指数退避加抖动重连，重连成功后调用 on_reconnect 做定向对账
+
+    给出 link 时监督的是一条热备行情连接（adapter.public_stream），不需要对账。
+    """
+
+    def __init__(self, adapter, dispatcher, ws_symbols, on_reconnect=None, link=None):
+        self.adapter = adapter
+        self.dispatcher = dispatcher
+        self.ws_symbols = ws_symbols
+        self.on_reconnect = on_reconnect  # 重连成功（收到第一条消息）后调用的协程函数
+        self.link = link
+        self.live = (link or adapter).live
+        self.stats = (link or adapter).stream_stats
+        self.down_since = None  # 断流开始时间，首次连接不算重连
+        if link is None:
+            adapter.on_gap = on_reconnect  # 连接内换订阅（如 listenKey 更换）后也要对账
+
+    async def run(self):
+        delay = RECONNECT_BASE_DELAY
+        while True:
+            started = time.monotonic()
+            self.stats.connects += 1
+            try:
+                await self.connect_once()
+                logger.warning(f"{self.name} 连接断开")
+            except Exception as e:
+                self.stats.last_error = str(e)
+                logger.error(f"{self.name} 连接失败: {e}")
+            self.stats.disconnects += 1
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+            if time.monotonic() - started > STABLE_AFTER:
+                delay = RECONNECT_BASE_DELAY
+            # 等待时间在 [delay/2, delay] 之间随机，避免多个进程同时重连
+            wait = delay / 2 + random.uniform(0, delay / 2)
+            logger.info(f"{wait:.1f} 秒后重连")
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    @property
+    def name(self):
+        return "推流" if self.link is None else f"热备行情 {self.link.url}"
+
+    async def connect_once(self):
+        """一次连接：收到第一条消息时视为连接恢复，记录断流时长并触发对账"""
+        self.live.clear()
+        if self.link is None:
+            stream = self.adapter.stream(self.dispatcher, self.ws_symbols)
+        else:
+            stream = self.adapter.public_stream(self.dispatcher, self.ws_symbols, self.link)
+        task = asyncio.create_task(stream)
+        live = asyncio.create_task(self.live.wait())
+        try:
+            await asyncio.wait((task, live), return_when=asyncio.FIRST_COMPLETED)
+            if live.done():
+                self.recovered()
+            await task
+        finally:
+            live.cancel()
+            task.cancel()
+
+    def recovered(self):
+        if self.down_since is None:
+            return
+        gap = time.monotonic() - self.down_since
+        self.down_since = None
+        self.stats.downtime += gap
+        self.stats.max_downtime = max(self.stats.max_downtime, gap)
+        logger.info(f"{self.name} 已恢复，断流 {gap:.1f} 秒（第 {self.stats.disconnects} 次断开）")
+        if self.on_reconnect is not None:
+            asyncio.create_task(self.resync())
+
+    async def resync(self):
+        try:
+            await self.on_reconnect()
+        except Exception as e:
+            logger.error(f"重连后对账失败: {e}")